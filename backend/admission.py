@@ -0,0 +1,210 @@
+"""
+Admission control.
+
+Every request is sorted into a route class, and each class admits a fixed
+number of requests at a time:
+
+    auth        POST /api/auth/*            (bcrypt)
+    cloudflare  /api/cloudflare/*           (Cloudflare API calls)
+    stream      .../logs/stream             (long-lived SSE; no queue)
+    export      .../export                  (long-running streamed exports)
+    write       other POST/PUT/PATCH/DELETE
+    read        other GET/HEAD
+
+Requests beyond a class's limit wait in its queue, first come first served,
+for at most ADMISSION_QUEUE_TIMEOUT_SECONDS.  When the queue is full, or the
+wait runs out, the request is answered 503 with a Retry-After estimated
+from the class's recent service time.  Load beyond capacity is therefore
+turned away quickly instead of piling up on the connection pool, where
+every request would time out together.
+
+Limits are per worker process and default to shares of this worker's
+database connection budget (database.pool_limits); override them with
+ADMISSION_<CLASS>_CONCURRENCY and ADMISSION_<CLASS>_QUEUE.  A slot is freed
+when the response is complete, so background tasks do not hold it.  Paths
+in ADMISSION_EXEMPT_PATHS (``/``, ``/api/health``, ``/api/metrics``) are
+never queued or rejected.
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from starlette.responses import JSONResponse
+
+from database import pool_limits
+from metrics import ADMISSION_QUEUE_WAIT, ADMISSION_REJECTED
+from password import PASSWORD_HASH_WORKERS
+
+logger = logging.getLogger("deployx.admission")
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "3"))
+ADMISSION_EXEMPT_PATHS = frozenset(
+    p.strip() for p in os.getenv("ADMISSION_EXEMPT_PATHS", "/,/api/health,/api/metrics").split(",") if p.strip()
+)
+
+_db_budget = sum(pool_limits())
+_DEFAULT_CONCURRENCY = {
+    "auth": PASSWORD_HASH_WORKERS * 2,
+    "cloudflare": max(_db_budget // 4, 1),
+    "stream": 200,
+    # Each export holds a database connection for as long as it streams
+    "export": max(_db_budget // 10, 1),
+    "write": max(_db_budget // 4, 1),
+    "read": max(_db_budget // 2, 1),
+}
+_MAX_RETRY_AFTER = 30
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    """Route class of a request; None if it is exempt from admission control."""
+    if path in ADMISSION_EXEMPT_PATHS:
+        return None
+    if path.startswith("/api/auth/") and method == "POST":
+        return "auth"
+    if path.startswith("/api/cloudflare/"):
+        return "cloudflare"
+    if path.endswith("/logs/stream"):
+        return "stream"
+    if path.endswith("/export") and method in ("GET", "HEAD"):
+        return "export"
+    if method in ("GET", "HEAD"):
+        return "read"
+    return "write"
+
+
+class AdmissionGate:
+    """A concurrency limit with a bounded, deadline-limited FIFO queue.
+
+    A freed slot is handed straight to the oldest waiter, so a new arrival
+    cannot take it ahead of the queue.
+    """
+
+    def __init__(self, name: str, concurrency: int, queue_size: int, queue_timeout: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        # Each resolves True when handed a slot, False when its deadline passes
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Moving average of how long a request holds a slot
+        self._service_time = 0.1
+
+    @classmethod
+    def from_env(cls, name: str) -> "AdmissionGate":
+        prefix = f"ADMISSION_{name.upper()}"
+        concurrency = int(os.getenv(f"{prefix}_CONCURRENCY", str(_DEFAULT_CONCURRENCY[name])))
+        default_queue = 0 if name == "stream" else concurrency * 4
+        return cls(
+            name,
+            concurrency=max(concurrency, 1),
+            queue_size=int(os.getenv(f"{prefix}_QUEUE", str(default_queue))),
+            queue_timeout=ADMISSION_QUEUE_TIMEOUT_SECONDS,
+        )
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> Optional[str]:
+        """Take a slot; returns None on success or the reason for refusing."""
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            return None
+        if len(self._waiters) >= self.queue_size:
+            return "queue_full"
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        deadline = loop.call_later(self.queue_timeout, self._expire, waiter)
+        start = time.perf_counter()
+        try:
+            admitted = await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled() and waiter.result():
+                self._hand_on()  # handed a slot just as the client went away
+            else:
+                self._remove(waiter)
+            raise
+        finally:
+            deadline.cancel()
+            ADMISSION_QUEUE_WAIT.labels(self.name).observe(time.perf_counter() - start)
+        return None if admitted else "deadline"
+
+    def release(self, held: float):
+        self._service_time += 0.2 * (held - self._service_time)
+        self._hand_on()
+
+    def _hand_on(self):
+        """Pass a held slot to the oldest waiter, or free it."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.active -= 1
+
+    def _expire(self, waiter: asyncio.Future):
+        if not waiter.done():
+            self._remove(waiter)
+            waiter.set_result(False)
+
+    def _remove(self, waiter: asyncio.Future):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue should have drained."""
+        drain = self._service_time * (self.waiting + 1) / self.concurrency
+        return min(max(math.ceil(drain), 1), _MAX_RETRY_AFTER)
+
+
+class AdmissionMiddleware:
+    """Applies the route classes' gates to HTTP requests (raw ASGI)."""
+
+    def __init__(self, app, enabled: bool = ADMISSION_ENABLED):
+        self.app = app
+        self.enabled = enabled
+        self.gates: Dict[str, AdmissionGate] = {name: AdmissionGate.from_env(name) for name in _DEFAULT_CONCURRENCY}
+
+    async def __call__(self, scope, receive, send):
+        route_class = classify(scope["method"], scope["path"]) if scope["type"] == "http" and self.enabled else None
+        if route_class is None:
+            return await self.app(scope, receive, send)
+
+        gate = self.gates[route_class]
+        refused = await gate.acquire()
+        if refused:
+            ADMISSION_REJECTED.labels(route_class, refused).inc()
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server busy, please retry"},
+                headers={"Retry-After": str(gate.retry_after())},
+            )
+            return await response(scope, receive, send)
+
+        start = time.perf_counter()
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                gate.release(time.perf_counter() - start)
+
+        async def send_wrapper(message):
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                release()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            release()
@@ -0,0 +1,272 @@
+"""
+Batched background audit-log writer.
+
+Request handlers hand audit events to ``audit_writer.record()``, which only
+enqueues them; a single background task drains the queue and writes the
+events with one multi-row INSERT per batch.  Request latency no longer
+includes an audit commit.
+
+The queue is bounded.  When it is full, AUDIT_OVERFLOW_POLICY decides what
+happens to a new event:
+
+    drop_oldest  evict the oldest queued event to make room (default)
+    drop_newest  discard the new event
+    block        wait up to AUDIT_ENQUEUE_TIMEOUT_SECONDS for room, then discard
+
+``stop()`` flushes everything still queued and is called on shutdown.
+
+The audit_logs table is range-partitioned by month (migration 0006
+converts a table created unpartitioned).  ``maintain_audit_partitions()``
+creates the current and upcoming monthly partitions and, when
+AUDIT_RETENTION_MONTHS is set, drops whole partitions that have aged out
+instead of running a DELETE.  The container runs it once after the
+migrations, before the workers start; each worker then re-runs it every
+AUDIT_MAINTENANCE_INTERVAL_SECONDS, skipping the round if another worker
+holds the maintenance lock.  It can also be run by hand:
+
+    python audit.py
+"""
+import asyncio
+import logging
+import os
+import re
+import uuid
+from datetime import date, datetime, timezone
+from typing import List, Optional
+
+from sqlalchemy import insert, text
+
+from database import AsyncSessionLocal, engine
+from models import AuditLog
+
+logger = logging.getLogger("deployx.audit")
+
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "0.5"))
+AUDIT_OVERFLOW_POLICY = os.getenv("AUDIT_OVERFLOW_POLICY", "drop_oldest")
+AUDIT_ENQUEUE_TIMEOUT_SECONDS = float(os.getenv("AUDIT_ENQUEUE_TIMEOUT_SECONDS", "0.05"))
+_WRITE_ATTEMPTS = 3
+
+AUDIT_RETENTION_MONTHS = int(os.getenv("AUDIT_RETENTION_MONTHS", "0"))  # 0 keeps everything
+AUDIT_PARTITIONS_AHEAD = int(os.getenv("AUDIT_PARTITIONS_AHEAD", "3"))
+AUDIT_MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("AUDIT_MAINTENANCE_INTERVAL_SECONDS", "21600"))
+_PARTITION_LOCK_ID = 0x6175646974  # serializes maintenance across workers
+_PARTITION_NAME = re.compile(r"audit_logs_y(\d{4})m(\d{2})")
+
+
+class AuditWriter:
+    """Queue audit events in memory and persist them in batches."""
+
+    def __init__(
+        self,
+        maxsize: int = AUDIT_QUEUE_SIZE,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        flush_interval: float = AUDIT_FLUSH_INTERVAL_SECONDS,
+        overflow_policy: str = AUDIT_OVERFLOW_POLICY,
+    ):
+        if overflow_policy not in ("drop_oldest", "drop_newest", "block"):
+            raise ValueError(f"Unknown audit overflow policy: {overflow_policy}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.written = 0
+        self.dropped = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        # Set when an event is queued into an empty queue, and by stop()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    # ------------------------------------------------------------------
+    #  Producer side
+    # ------------------------------------------------------------------
+    async def record(
+        self,
+        action: str,
+        user_id=None,
+        resource_type: Optional[str] = None,
+        resource_id: Optional[str] = None,
+        details: Optional[dict] = None,
+        ip_address: Optional[str] = None,
+    ):
+        """Enqueue one audit event; never waits on the database."""
+        event = dict(
+            id=uuid.uuid4(), user_id=user_id, action=action,
+            resource_type=resource_type, resource_id=resource_id,
+            details=details, ip_address=ip_address,
+            # Stamp now, not at flush time, so ordering reflects the request
+            created_at=datetime.now(timezone.utc),
+        )
+        try:
+            self._queue.put_nowait(event)
+            self._wakeup.set()
+            return
+        except asyncio.QueueFull:
+            pass
+
+        if self.overflow_policy == "drop_oldest":
+            self._queue.get_nowait()
+            self._queue.put_nowait(event)
+            self._drop(1)
+        elif self.overflow_policy == "block":
+            try:
+                await asyncio.wait_for(self._queue.put(event), AUDIT_ENQUEUE_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                self._drop(1)
+        else:
+            self._drop(1)
+
+    def _drop(self, n: int):
+        self.dropped += n
+        # Log the first drop and then every 1000th to avoid flooding
+        if self.dropped == n or self.dropped // 1000 != (self.dropped - n) // 1000:
+            logger.warning("Audit buffer overflow: %d event(s) dropped so far", self.dropped)
+
+    # ------------------------------------------------------------------
+    #  Consumer side
+    # ------------------------------------------------------------------
+    async def start(self):
+        self._closed = False
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="audit-writer")
+
+    async def stop(self):
+        """Flush all queued events and stop the background task."""
+        self._closed = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            if batch:
+                await self._write(batch)
+            elif self._closed:
+                return
+
+    async def _next_batch(self) -> List[dict]:
+        loop = asyncio.get_running_loop()
+        if not await self._wait(self.flush_interval) or self._queue.empty():
+            return []
+        batch = [self._queue.get_nowait()]
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0 or self._closed or not await self._wait(remaining):
+                break
+        return batch
+
+    async def _wait(self, timeout: float) -> bool:
+        """Wait until an event is queued or stop() is called; False on timeout."""
+        self._wakeup.clear()
+        if not self._queue.empty() or self._closed:
+            return True
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _write(self, batch: List[dict]):
+        for attempt in range(1, _WRITE_ATTEMPTS + 1):
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(insert(AuditLog).values(batch))
+                    await db.commit()
+                self.written += len(batch)
+                return
+            except Exception:
+                logger.exception("Audit batch write failed (attempt %d/%d)", attempt, _WRITE_ATTEMPTS)
+                if attempt < _WRITE_ATTEMPTS:
+                    await asyncio.sleep(0.5 * attempt)
+        self._drop(len(batch))
+
+
+audit_writer = AuditWriter()
+
+
+# ----------------------------------------------------------------------
+#  Partition maintenance
+# ----------------------------------------------------------------------
+def _add_months(d: date, months: int) -> date:
+    y, m = divmod(d.year * 12 + d.month - 1 + months, 12)
+    return date(y, m + 1, 1)
+
+
+async def maintain_audit_partitions(
+    months_ahead: int = AUDIT_PARTITIONS_AHEAD,
+    retention_months: int = AUDIT_RETENTION_MONTHS,
+    wait: bool = True,
+) -> List[str]:
+    """Create upcoming monthly partitions and drop expired ones.
+
+    Returns the names of the dropped partitions.  With ``wait=False`` it
+    returns at once, doing nothing, if another process is maintaining them.
+    Raises RuntimeError if audit_logs is not partitioned.
+    """
+    this_month = _add_months(datetime.now(timezone.utc).date(), 0)
+    dropped: List[str] = []
+    async with engine.begin() as conn:
+        partitioned = await conn.scalar(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'audit_logs'::regclass)"
+        ))
+        if not partitioned:
+            raise RuntimeError("audit_logs is not partitioned; run `alembic upgrade head` to convert it")
+        if wait:
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _PARTITION_LOCK_ID})
+        elif not await conn.scalar(text("SELECT pg_try_advisory_xact_lock(:k)"), {"k": _PARTITION_LOCK_ID}):
+            return dropped
+        await conn.execute(text("CREATE TABLE IF NOT EXISTS audit_logs_default PARTITION OF audit_logs DEFAULT"))
+
+        for i in range(months_ahead + 1):
+            start = _add_months(this_month, i)
+            end = _add_months(start, 1)
+            name = f"audit_logs_y{start.year:04d}m{start.month:02d}"
+            try:
+                async with conn.begin_nested():
+                    await conn.execute(text(
+                        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF audit_logs "
+                        f"FOR VALUES FROM ('{start.isoformat()} 00:00+00') TO ('{end.isoformat()} 00:00+00')"
+                    ))
+            except Exception:
+                # Typically rows for that month already sit in the default partition
+                logger.exception("Could not create audit partition %s", name)
+
+        if retention_months > 0:
+            cutoff = _add_months(this_month, -retention_months)
+            result = await conn.execute(text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = 'audit_logs'::regclass"
+            ))
+            for (name,) in result:
+                m = _PARTITION_NAME.fullmatch(name)
+                if m and _add_months(date(int(m.group(1)), int(m.group(2)), 1), 1) <= cutoff:
+                    await conn.execute(text(f"DROP TABLE {name}"))
+                    dropped.append(name)
+    if dropped:
+        logger.info("Dropped expired audit partitions: %s", ", ".join(dropped))
+    return dropped
+
+
+async def run_audit_maintenance():
+    """Background loop: re-run partition maintenance every interval."""
+    while True:
+        await asyncio.sleep(AUDIT_MAINTENANCE_INTERVAL_SECONDS)
+        try:
+            await maintain_audit_partitions(wait=False)
+        except Exception:
+            logger.exception("Audit partition maintenance failed")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(maintain_audit_partitions())
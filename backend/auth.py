@@ -1,15 +1,22 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import os
+import uuid
 
-from database import get_db
+from cache import TTLCache
+from database import AsyncSessionLocal, DB_READ_AFTER_WRITE_SECONDS, is_replica, read_session, wrote_recently
+from metrics import JWT_DECODE_SECONDS
 from models import User
 from crud import get_user_by_username
-from password import verify_password, get_password_hash
+from profiling import profiled
+from queries import Principal, principal_by_id, principal_by_username
+from password import verify_password, get_password_hash, needs_rehash, PasswordHasherBusy
 
 # Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
@@ -18,14 +25,66 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
 
+# Authenticated principals, keyed by token subject (the "uid" claim, or the
+# username for tokens issued before it existed).  Entries are immutable
+# Principal records (queries.py); they are dropped whenever a User row is
+# committed as changed or deleted, and otherwise live for at most the TTL.
+# Principals read from the replica, which may predate such a change, live
+# for at most DB_READ_AFTER_WRITE_SECONDS.
+#
+# The cache is per process and a commit only invalidates the worker that
+# made it: with WEB_CONCURRENCY > 1 the other workers can keep serving a
+# changed or deactivated user for up to PRINCIPAL_CACHE_TTL_SECONDS.
+principal_cache = TTLCache(
+    "principals",
+    maxsize=int(os.getenv("PRINCIPAL_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "30")),
+)
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
+
+def invalidate_principal(user_id: str, username: str):
+    """Drop a user from this process's principal cache (under both token subjects)"""
+    principal_cache.invalidate(user_id)
+    principal_cache.invalidate(username)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    changed = session.info.setdefault("changed_users", [])
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            changed.append((str(obj.id), obj.username))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    # Invalidate only once the change is visible to other sessions, otherwise
+    # a concurrent request could re-cache the old row.
+    for user_id, username in session.info.pop("changed_users", ()):
+        invalidate_principal(user_id, username)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session):
+    session.info.pop("changed_users", None)
+
+
+@profiled("auth")
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[User]:
     """Authenticate a user"""
-    user = get_user_by_username(db, username)
+    user = await get_user_by_username(db, username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password(password, user.hashed_password):
         return None
+    if needs_rehash(user.hashed_password):
+        # Cost factor changed since this hash was made; upgrade it now that
+        # we have the plaintext.  Skipped (retried next login) if the pool is busy.
+        try:
+            user.hashed_password = await get_password_hash(password)
+            await db.commit()
+        except PasswordHasherBusy:
+            pass
     return user
 
 
@@ -42,11 +101,9 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get the current authenticated user"""
+@profiled("auth")
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)) -> Principal:
+    """Get the current authenticated user (read from the replica on a cache miss)"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -54,15 +111,41 @@ async def get_current_user(
     )
     
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with JWT_DECODE_SECONDS.time():
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
+        user_id: Optional[str] = payload.get("uid")
         if username is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
-    user = get_user_by_username(db, username)
+
+    key = user_id or username
+    user = principal_cache.get(key)
     if user is None:
-        raise credentials_exception
-    
+        if user_id:
+            try:
+                uid = uuid.UUID(user_id)
+            except ValueError:
+                raise credentials_exception
+            lookup = lambda session: principal_by_id(session, uid)
+        else:
+            lookup = lambda session: principal_by_username(session, username)
+        # A session of its own, closed at once: the endpoint may not need one
+        async with read_session(primary=wrote_recently(request)) as db:
+            user = await lookup(db)
+            replica = is_replica(db)
+        ttl = min(principal_cache.ttl, DB_READ_AFTER_WRITE_SECONDS) if replica else None
+        if user is None and replica:
+            # The account may be newer than the replica
+            async with AsyncSessionLocal() as db:
+                user = await lookup(db)
+            ttl = None
+        if user is None:
+            raise credentials_exception
+        principal_cache.set(key, user, ttl)
+
+    if not user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+
     return user
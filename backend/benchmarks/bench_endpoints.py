@@ -0,0 +1,435 @@
+"""
+Endpoint benchmark suite.
+
+Starts the app in-process under uvicorn against the Postgres in
+DATABASE_URL (migrated with ``alembic upgrade head``).  It replaces
+api.cloudflare.com with FakeCloudflare, which can add latency and inject
+429s (which the app retries after their Retry-After; see
+cloudflare_scheduler.py).  Every route in ``main.py`` is then driven at a
+fixed concurrency.  The report is JSON, with p50/p95/p99
+latency and requests per second per endpoint, so runs can be compared
+over time:
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_endpoints.py \\
+        -n 200 -c 20 --cf-latency 0.05 --cf-429-rate 0.05 -o bench.json
+
+Each run registers its own user, so it can be repeated against the same
+database.  Routes missing a scenario are listed under
+``uncovered_routes``; add one when adding an endpoint.  The load
+generator shares the server's event loop, so absolute numbers are
+conservative; compare runs made on the same machine.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import math
+import os
+import platform
+import secrets
+import subprocess
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_cloudflare import FakeCloudflare
+
+# Projects per request in the batch create / delete scenarios
+BATCH_SIZE = 20
+
+# (method, url, httpx request kwargs) for the i-th request of a scenario
+RequestFn = Callable[[int], Tuple[str, str, dict]]
+
+
+@dataclass
+class Scenario:
+    method: str
+    route: str
+    request: RequestFn
+    # Creates whatever the n requests consume (e.g. projects to delete)
+    prepare: Optional[Callable[[int], Awaitable[None]]] = None
+    expect: Tuple[int, ...] = (200,)
+
+    @property
+    def name(self) -> str:
+        return f"{self.method} {self.route}"
+
+
+@dataclass
+class Fixture:
+    client: httpx.AsyncClient
+    tag: str = field(default_factory=lambda: secrets.token_hex(4))
+    headers: dict = field(default_factory=dict)
+    username: str = ""
+    project_id: str = ""
+    deployment_id: str = ""
+    job_id: str = ""
+    tunnel_id: str = ""
+    doomed_projects: List[str] = field(default_factory=list)
+    doomed_batches: List[List[str]] = field(default_factory=list)
+    failed_jobs: List[str] = field(default_factory=list)
+    webhook_secret: str = ""
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+# ----------------------------------------------------------------------
+#  Fixture setup
+# ----------------------------------------------------------------------
+async def _wait_for_job(fx: Fixture, job_id: str, timeout: float = 60) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        job = (await fx.client.get(f"/api/cloudflare/setup/{job_id}", headers=fx.headers)).json()
+        if job["status"] in ("success", "failed") or time.monotonic() > deadline:
+            return job
+        await asyncio.sleep(0.05)
+
+
+async def setup_fixture(fx: Fixture, fake: FakeCloudflare):
+    c = fx.client
+    fx.username = f"bench-{fx.tag}"
+    r = await c.post("/api/auth/register", json={
+        "email": f"{fx.username}@bench.example.com", "username": fx.username, "password": "bench-password",
+    })
+    r.raise_for_status()
+    r = await c.post("/api/auth/token", data={"username": fx.username, "password": "bench-password"})
+    r.raise_for_status()
+    fx.headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    r = await c.post("/api/projects", json={"name": f"bench-{fx.tag}"}, headers=fx.headers)
+    fx.project_id = r.json()["id"]
+    r = await c.post(f"/api/projects/{fx.project_id}/deployments", json={}, headers=fx.headers)
+    fx.deployment_id = r.json()["id"]
+
+    # Provisioning must not fail here, whatever the 429 ratio is
+    ratio, fake.rate_limit_ratio = fake.rate_limit_ratio, 0.0
+    try:
+        r = await c.post("/api/cloudflare/setup", json={
+            "api_token": "bench-token", "domain": "bench.example.com", "subdomain": f"app-{fx.tag}",
+        }, headers=fx.headers)
+        job = await _wait_for_job(fx, r.json()["id"])
+        if job["status"] != "success":
+            raise RuntimeError(f"Fixture provisioning failed: {job}")
+        fx.job_id, fx.tunnel_id = job["id"], job["tunnel_id"]
+    finally:
+        fake.rate_limit_ratio = ratio
+
+
+async def _prepare_doomed_projects(fx: Fixture, n: int):
+    for i in range(n):
+        r = await fx.client.post("/api/projects", json={"name": f"doomed-{fx.tag}-{i}"}, headers=fx.headers)
+        fx.doomed_projects.append(r.json()["id"])
+
+
+async def _prepare_doomed_batches(fx: Fixture, n: int):
+    for i in range(n):
+        r = await fx.client.post("/api/projects/batch", json={"projects": [
+            {"name": f"doomed-batch-{fx.tag}-{i}-{j}"} for j in range(BATCH_SIZE)
+        ]}, headers=fx.headers)
+        fx.doomed_batches.append([p["id"] for p in r.json()])
+
+
+async def _prepare_webhook(fx: Fixture, n: int):
+    r = await fx.client.post(f"/api/projects/{fx.project_id}/webhook", json={}, headers=fx.headers)
+    fx.webhook_secret = r.json()["secret"]
+
+
+def _push_request(fx: Fixture, i: int) -> Tuple[str, str, dict]:
+    body = json.dumps({"ref": "refs/heads/main", "after": f"{i + 1:040x}"}).encode()
+    signature = "sha256=" + hmac.new(fx.webhook_secret.encode(), body, hashlib.sha256).hexdigest()
+    return "POST", f"/api/projects/{fx.project_id}/webhooks/push", {"content": body, "headers": {
+        "Content-Type": "application/json",
+        "X-GitHub-Event": "push",
+        "X-GitHub-Delivery": f"bench-{fx.tag}-{i}",
+        "X-Hub-Signature-256": signature,
+    }}
+
+
+def _prepare_failed_jobs(fake: FakeCloudflare):
+    async def prepare(fx: Fixture, n: int):
+        fake.outage = True
+        try:
+            for i in range(n):
+                r = await fx.client.post("/api/cloudflare/setup", json={
+                    "api_token": "bench-token", "domain": "bench.example.com", "subdomain": f"resume-{fx.tag}-{i}",
+                }, headers=fx.headers)
+                fx.failed_jobs.append(r.json()["id"])
+            for job_id in fx.failed_jobs:
+                await _wait_for_job(fx, job_id)
+        finally:
+            fake.outage = False
+            # The outage opened the circuit; later scenarios should not wait it out
+            import cloudflare_scheduler
+            cloudflare_scheduler.breaker.success()
+    return prepare
+
+
+def build_scenarios(fx: Fixture, fake: FakeCloudflare) -> List[Scenario]:
+    h = fx.headers
+    failed_jobs = _prepare_failed_jobs(fake)
+    return [
+        Scenario("GET", "/", lambda i: ("GET", "/", {})),
+        Scenario("GET", "/api/health", lambda i: ("GET", "/api/health", {})),
+        Scenario("GET", "/api/platform/status", lambda i: ("GET", "/api/platform/status", {})),
+        Scenario(
+            "POST", "/api/auth/register", expect=(201,),
+            request=lambda i: ("POST", "/api/auth/register", {"json": {
+                "email": f"r{i}-{fx.tag}@bench.example.com", "username": f"r{i}-{fx.tag}", "password": "bench-password",
+            }}),
+        ),
+        Scenario("POST", "/api/auth/token", lambda i: (
+            "POST", "/api/auth/token", {"data": {"username": fx.username, "password": "bench-password"}},
+        )),
+        Scenario("GET", "/api/auth/me", lambda i: ("GET", "/api/auth/me", {"headers": h})),
+        Scenario(
+            "POST", "/api/cloudflare/setup", expect=(202,),
+            request=lambda i: ("POST", "/api/cloudflare/setup", {"headers": h, "json": {
+                "api_token": "bench-token", "domain": "bench.example.com", "subdomain": f"s{i}-{fx.tag}",
+            }}),
+        ),
+        Scenario("GET", "/api/cloudflare/setup/{job_id}", lambda i: (
+            "GET", f"/api/cloudflare/setup/{fx.job_id}", {"headers": h},
+        )),
+        Scenario(
+            "POST", "/api/cloudflare/setup/{job_id}/resume", expect=(202,),
+            prepare=lambda n: failed_jobs(fx, n),
+            request=lambda i: ("POST", f"/api/cloudflare/setup/{fx.failed_jobs[i]}/resume", {"headers": h}),
+        ),
+        Scenario("GET", "/api/cloudflare/config", lambda i: ("GET", "/api/cloudflare/config", {"headers": h})),
+        Scenario(
+            "POST", "/api/projects", expect=(201,),
+            request=lambda i: ("POST", "/api/projects", {"headers": h, "json": {"name": f"p{i}-{fx.tag}"}}),
+        ),
+        Scenario(
+            "POST", "/api/projects/batch", expect=(201,),
+            request=lambda i: ("POST", "/api/projects/batch", {"headers": h, "json": {"projects": [
+                {"name": f"b{i}-{j}-{fx.tag}"} for j in range(BATCH_SIZE)
+            ]}}),
+        ),
+        Scenario(
+            "POST", "/api/projects/batch/delete",
+            prepare=lambda n: _prepare_doomed_batches(fx, n),
+            request=lambda i: ("POST", "/api/projects/batch/delete", {
+                "headers": h, "json": {"ids": fx.doomed_batches[i]},
+            }),
+        ),
+        Scenario("GET", "/api/projects", lambda i: ("GET", "/api/projects", {"headers": h})),
+        Scenario("GET", "/api/projects/{project_id}", lambda i: (
+            "GET", f"/api/projects/{fx.project_id}", {"headers": h},
+        )),
+        Scenario(
+            "DELETE", "/api/projects/{project_id}", expect=(204,),
+            prepare=lambda n: _prepare_doomed_projects(fx, n),
+            request=lambda i: ("DELETE", f"/api/projects/{fx.doomed_projects[i]}", {"headers": h}),
+        ),
+        Scenario(
+            "POST", "/api/projects/{project_id}/deployments", expect=(201,),
+            request=lambda i: ("POST", f"/api/projects/{fx.project_id}/deployments", {"headers": h, "json": {}}),
+        ),
+        Scenario("GET", "/api/projects/{project_id}/deployments", lambda i: (
+            "GET", f"/api/projects/{fx.project_id}/deployments", {"headers": h},
+        )),
+        Scenario("GET", "/api/projects/{project_id}/stats", lambda i: (
+            "GET", f"/api/projects/{fx.project_id}/stats", {"headers": h},
+        )),
+        Scenario("GET", "/api/deployments/{deployment_id}", lambda i: (
+            "GET", f"/api/deployments/{fx.deployment_id}", {"headers": h},
+        )),
+        Scenario("GET", "/api/deployments/{deployment_id}/logs/stream", lambda i: (
+            "GET", f"/api/deployments/{fx.deployment_id}/logs/stream", {"headers": h, "params": {"follow": "false"}},
+        )),
+        Scenario("POST", "/api/projects/{project_id}/webhook", lambda i: (
+            "POST", f"/api/projects/{fx.project_id}/webhook", {"headers": h, "json": {}},
+        )),
+        Scenario(
+            "POST", "/api/projects/{project_id}/webhooks/push", expect=(202,),
+            prepare=lambda n: _prepare_webhook(fx, n),
+            request=lambda i: _push_request(fx, i),
+        ),
+        Scenario("DELETE", "/api/projects/{project_id}/webhook", expect=(204,), request=lambda i: (
+            "DELETE", f"/api/projects/{fx.project_id}/webhook", {"headers": h},
+        )),
+        Scenario("GET", "/api/audit-logs", lambda i: ("GET", "/api/audit-logs", {"headers": h})),
+        Scenario("GET", "/api/audit-logs/export", lambda i: ("GET", "/api/audit-logs/export", {
+            "headers": h, "params": {"since": "2000-01-01T00:00:00Z", "format": ("ndjson", "csv")[i % 2]},
+        })),
+        # Last: it deactivates the fixture's tunnel configuration
+        Scenario("DELETE", "/api/cloudflare/tunnel/{tunnel_id}", lambda i: (
+            "DELETE", f"/api/cloudflare/tunnel/{fx.tunnel_id}", {"headers": h},
+        )),
+    ]
+
+
+# ----------------------------------------------------------------------
+#  Load generation
+# ----------------------------------------------------------------------
+async def run_scenario(client: httpx.AsyncClient, sc: Scenario, n: int, concurrency: int) -> dict:
+    if sc.prepare:
+        await sc.prepare(n)
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    indexes = iter(range(n))
+
+    async def worker():
+        for i in indexes:
+            method, url, kwargs = sc.request(i)
+            t0 = time.perf_counter()
+            try:
+                resp = await client.request(method, url, **kwargs)
+                statuses[str(resp.status_code)] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, n))))
+    wall = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "endpoint": sc.name,
+        "requests": n,
+        "concurrency": min(concurrency, n),
+        "errors": sum(v for k, v in statuses.items() if not k.isdigit() or int(k) not in sc.expect),
+        "status_counts": dict(statuses),
+        "rps": round(n / wall, 2) if wall else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+    }
+
+
+def _uncovered(app, scenarios: List[Scenario]) -> List[str]:
+    from fastapi.routing import APIRoute
+
+    covered = {sc.name for sc in scenarios}
+    routes = {
+        f"{method} {route.path}"
+        for route in app.routes if isinstance(route, APIRoute)
+        for method in route.methods if method != "HEAD"
+    }
+    return sorted(routes - covered)
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    os.environ["CLOUDFLARE_RATE_PER_SECOND"] = str(args.cf_rate)
+    import uvicorn
+    import cloudflare_service
+    import main
+
+    fake = FakeCloudflare(
+        latency=args.cf_latency, jitter=args.cf_jitter,
+        rate_limit_ratio=args.cf_429_rate, seed=args.seed,
+    )
+    fake.install()
+
+    # Provisioning would otherwise write the tunnel token into the repo's .env
+    async def _skip_env_file(self, tunnel_token: str):
+        return None
+
+    cloudflare_service.CloudflareService.update_env_file = _skip_env_file
+
+    server = uvicorn.Server(uvicorn.Config(
+        main.app, host="127.0.0.1", port=args.port, log_level="warning", lifespan="on",
+    ))
+    serve = asyncio.create_task(server.serve())
+    while not server.started:
+        if serve.done():
+            serve.result()
+        await asyncio.sleep(0.05)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=60) as client:
+            fx = Fixture(client)
+            await setup_fixture(fx, fake)
+            scenarios = build_scenarios(fx, fake)
+            selected = [sc for sc in scenarios if not args.only or any(s in sc.name for s in args.only)]
+            results = []
+            for sc in selected:
+                result = await run_scenario(client, sc, args.requests, args.concurrency)
+                print(f"{result['endpoint']:<50} p50={result['latency_ms']['p50']:>9.2f}ms "
+                      f"p99={result['latency_ms']['p99']:>9.2f}ms rps={result['rps']:>8} "
+                      f"errors={result['errors']}", file=sys.stderr)
+                results.append(result)
+    finally:
+        server.should_exit = True
+        await serve
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "requests_per_endpoint": args.requests,
+            "concurrency": args.concurrency,
+            "cloudflare": {
+                "latency_seconds": args.cf_latency, "jitter_seconds": args.cf_jitter,
+                "rate_limit_ratio": args.cf_429_rate, "client_rate_per_second": args.cf_rate,
+            },
+        },
+        "results": results,
+        "uncovered_routes": _uncovered(main.app, scenarios),
+        "cloudflare_calls": {"total": sum(fake.calls.values()), "rate_limited": fake.rate_limited,
+                             "by_endpoint": dict(fake.calls)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--requests", type=int, default=100, help="requests per endpoint")
+    parser.add_argument("-c", "--concurrency", type=int, default=10, help="requests in flight per endpoint")
+    parser.add_argument("--cf-latency", type=float, default=0.0, help="seconds added to every Cloudflare call")
+    parser.add_argument("--cf-jitter", type=float, default=0.0, help="extra random latency, 0..jitter seconds")
+    parser.add_argument("--cf-429-rate", type=float, default=0.0, help="fraction of Cloudflare calls answered 429")
+    parser.add_argument("--cf-rate", type=float, default=0.0,
+                        help="CLOUDFLARE_RATE_PER_SECOND for the app (0: no client-side rate limit)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for latency jitter and 429 injection")
+    parser.add_argument("--only", action="append", help="run only endpoints containing this text (repeatable)")
+    parser.add_argument("--port", type=int, default=8765, help="local port for the in-process server")
+    parser.add_argument("-o", "--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("deployx").setLevel(logging.ERROR)
+
+    report = asyncio.run(run(args))
+    out = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+
+
+if __name__ == "__main__":
+    main()
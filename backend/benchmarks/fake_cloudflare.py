@@ -0,0 +1,130 @@
+"""
+In-process stand-in for the Cloudflare API, for benchmarks.
+
+``FakeCloudflare`` answers the calls CloudflareService makes (zones,
+tunnels, tunnel tokens, DNS records, tunnel configurations) from memory
+through an ``httpx.MockTransport``.  It can add latency to every call and
+answer a fraction of calls with 429 + Retry-After, so client-side behaviour
+under API pressure can be measured without touching api.cloudflare.com.
+
+    fake = FakeCloudflare(latency=0.05, rate_limit_ratio=0.1)
+    fake.install()      # route cloudflare_service's shared client to the fake
+"""
+import asyncio
+import itertools
+import json
+import random
+import re
+from collections import Counter
+from typing import Optional
+
+import httpx
+
+ZONE_ID = "fakezone0000000000000000000000001"
+ACCOUNT_ID = "fakeaccount00000000000000000001"
+
+_ID_SEGMENT = re.compile(r"(/(?:accounts|zones|cfd_tunnel|dns_records)/)[^/]+")
+_TUNNEL = re.compile(r"/accounts/[^/]+/cfd_tunnel/([^/]+)(/token|/configurations)?$")
+
+
+def _ok(result=None) -> httpx.Response:
+    return httpx.Response(200, json={"success": True, "errors": [], "messages": [], "result": result})
+
+
+def _error(status: int, code: int, message: str, headers: Optional[dict] = None) -> httpx.Response:
+    return httpx.Response(
+        status,
+        json={"success": False, "errors": [{"code": code, "message": message}], "messages": [], "result": None},
+        headers=headers,
+    )
+
+
+class FakeCloudflare:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate_limit_ratio: float = 0.0,
+        retry_after: int = 1,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        # While set, every call fails with 500 (to produce failed jobs)
+        self.outage = False
+        self.calls: Counter = Counter()
+        self.rate_limited = 0
+        self._rng = random.Random(seed)
+        self._ids = itertools.count(1)
+        self.tunnels: dict = {}
+        self.dns_records: dict = {}
+        self.configurations: dict = {}
+
+    def install(self):
+        """Point cloudflare_service's shared HTTP client at this fake."""
+        import cloudflare_service
+
+        cloudflare_service._client = httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        path = request.url.path.split("/client/v4", 1)[-1]
+        self.calls[request.method + " " + _ID_SEGMENT.sub(r"\1{id}", path)] += 1
+
+        if self.outage:
+            return _error(500, 10000, "Internal error (simulated outage)")
+        if self.rate_limit_ratio and self._rng.random() < self.rate_limit_ratio:
+            self.rate_limited += 1
+            return _error(429, 971, "Please wait and consider throttling your request speed",
+                          headers={"Retry-After": str(self.retry_after)})
+        return self._route(request, path)
+
+    def _new_id(self) -> str:
+        return f"{next(self._ids):032x}"
+
+    def _route(self, request: httpx.Request, path: str) -> httpx.Response:
+        method = request.method
+        if path == "/zones" and method == "GET":
+            return _ok([{"id": ZONE_ID, "name": request.url.params.get("name", "example.com"),
+                         "account": {"id": ACCOUNT_ID}}])
+
+        if path.endswith("/cfd_tunnel") and method == "POST":
+            body = json.loads(request.content)
+            tunnel_id = self._new_id()
+            self.tunnels[tunnel_id] = {"id": tunnel_id, "name": body.get("name")}
+            return _ok(self.tunnels[tunnel_id])
+        if path.endswith("/cfd_tunnel") and method == "GET":
+            name = request.url.params.get("name")
+            return _ok([t for t in self.tunnels.values() if name is None or t["name"] == name])
+
+        m = _TUNNEL.search(path)
+        if m:
+            tunnel_id, sub = m.groups()
+            if tunnel_id not in self.tunnels:
+                return _error(404, 1003, "Tunnel not found")
+            if sub == "/token":
+                return _ok(f"token-{tunnel_id}")
+            if sub == "/configurations":
+                if method == "PUT":
+                    self.configurations[tunnel_id] = json.loads(request.content)
+                return _ok(self.configurations.get(tunnel_id, {"config": {"ingress": []}}))
+            if method == "DELETE":
+                self.tunnels.pop(tunnel_id, None)
+                return _ok({"id": tunnel_id})
+
+        if path.endswith("/dns_records") and method == "POST":
+            body = json.loads(request.content)
+            if any(r["name"] == body.get("name") for r in self.dns_records.values()):
+                return _error(400, 81053, "An A, AAAA, or CNAME record with that host already exists.")
+            record_id = self._new_id()
+            self.dns_records[record_id] = dict(body, id=record_id)
+            return _ok(self.dns_records[record_id])
+        if path.endswith("/dns_records") and method == "GET":
+            name = request.url.params.get("name")
+            return _ok([r for r in self.dns_records.values() if name is None or r["name"] == name])
+
+        return _error(404, 7003, f"No route for {method} {path}")
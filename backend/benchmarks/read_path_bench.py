@@ -0,0 +1,155 @@
+"""
+Read-path benchmark: ORM entities vs column-projected rows.
+
+Seeds one user, one project and N deployments (each carrying a legacy
+``log_output`` of --log-kb KiB) in the database at DATABASE_URL, then
+times the hot reads both ways, each in a fresh session as a request
+would see it:
+
+    principal     db.get(User)                      vs queries.principal_by_id
+    project       select(Project) + dump_json       vs queries.owned_project + row_response
+    deployments   select(Deployment) + dump_json    vs queries.project_deployments + rows_response
+
+The report gives milliseconds per call and the peak Python memory
+allocated per call (tracemalloc), as JSON.  The seeded rows are deleted
+afterwards.
+
+    DATABASE_URL=postgresql://... python benchmarks/read_path_bench.py -n 50 --log-kb 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pydantic import TypeAdapter
+from sqlalchemy import delete, select
+
+from database import AsyncSessionLocal, engine
+from models import Deployment, Project, User
+from queries import owned_project, principal_by_id, project_deployments
+from schemas import DeploymentResponse, ProjectResponse
+from serialization import row_response, rows_response
+
+_project_adapter = TypeAdapter(ProjectResponse)
+_deployments_adapter = TypeAdapter(List[DeploymentResponse])
+
+
+async def _seed(deployments: int, log_kb: int):
+    tag = uuid.uuid4().hex[:12]
+    async with AsyncSessionLocal() as db:
+        user = User(email=f"bench-{tag}@example.com", username=f"bench-{tag}", hashed_password="x" * 60)
+        db.add(user)
+        await db.flush()
+        project = Project(user_id=user.id, name=f"bench-{tag}", status="active")
+        db.add(project)
+        await db.flush()
+        log = "build output line\n" * (log_kb * 1024 // 18)
+        db.add_all(
+            Deployment(project_id=project.id, user_id=user.id, status="success", log_output=log)
+            for _ in range(deployments)
+        )
+        await db.commit()
+        return user.id, project.id
+
+
+async def _cleanup(user_id):
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(User).where(User.id == user_id))
+        await db.commit()
+
+
+async def _measure(fn, repeat: int) -> dict:
+    await fn()  # warm up: connection, statement cache
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        await fn()
+    elapsed = (time.perf_counter() - t0) / repeat
+
+    tracemalloc.start()
+    peaks = []
+    for _ in range(min(repeat, 10)):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        await fn()
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+    return {"ms_per_call": round(elapsed * 1000, 3), "peak_kib_per_call": round(max(peaks) / 1024, 1)}
+
+
+async def run(args) -> dict:
+    user_id, project_id = await _seed(args.deployments, args.log_kb)
+    limit = args.deployments
+
+    async def principal_orm():
+        async with AsyncSessionLocal() as db:
+            return await db.get(User, user_id)
+
+    async def principal_rows():
+        async with AsyncSessionLocal() as db:
+            return await principal_by_id(db, user_id)
+
+    async def project_orm():
+        async with AsyncSessionLocal() as db:
+            project = await db.scalar(select(Project).where(Project.id == project_id, Project.user_id == user_id))
+            return _project_adapter.dump_json(_project_adapter.validate_python(project, from_attributes=True))
+
+    async def project_rows():
+        async with AsyncSessionLocal() as db:
+            return row_response(await owned_project(db, project_id, user_id)).body
+
+    async def deployments_orm():
+        async with AsyncSessionLocal() as db:
+            deployments = (await db.scalars(
+                select(Deployment).where(Deployment.project_id == project_id)
+                .order_by(Deployment.created_at.desc()).limit(limit)
+            )).all()
+            return _deployments_adapter.dump_json(
+                _deployments_adapter.validate_python(deployments, from_attributes=True)
+            )
+
+    async def deployments_rows():
+        async with AsyncSessionLocal() as db:
+            return rows_response(await project_deployments(db, project_id, limit)).body
+
+    try:
+        # Both paths must produce the same documents
+        assert json.loads(await project_orm()) == json.loads(await project_rows()), "project output differs"
+        assert json.loads(await deployments_orm()) == json.loads(await deployments_rows()), "deployments output differs"
+
+        results = []
+        for name, orm, rows in (
+            ("principal", principal_orm, principal_rows),
+            ("project", project_orm, project_rows),
+            ("deployments", deployments_orm, deployments_rows),
+        ):
+            before, after = await _measure(orm, args.repeat), await _measure(rows, args.repeat)
+            results.append({
+                "read": name,
+                "orm": before,
+                "rows": after,
+                "speedup": round(before["ms_per_call"] / after["ms_per_call"], 2),
+            })
+    finally:
+        await _cleanup(user_id)
+        await engine.dispose()
+    return {"deployments": args.deployments, "log_kb": args.log_kb, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--deployments", type=int, default=50, help="deployments in the listed project")
+    parser.add_argument("--log-kb", type=int, default=64, help="legacy log_output per deployment, KiB")
+    parser.add_argument("-r", "--repeat", type=int, default=200, help="timed iterations per path")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Small in-process TTL + LRU cache"""
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from metrics import CACHE_ENTRIES, CACHE_REQUESTS
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded mapping whose entries expire *ttl* seconds after being set.
+    When full, the least recently used entry is evicted.  Not thread-safe;
+    meant to be used from the event loop.
+
+    Hits, misses and the entry count are exported as the
+    deployx_cache_* metrics, labelled with *name*.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._hits = CACHE_REQUESTS.labels(name, "hit")
+        self._misses = CACHE_REQUESTS.labels(name, "miss")
+        self._entries = CACHE_ENTRIES.labels(name)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self._misses.inc()
+            return default
+        expires, value = entry
+        if expires <= time.monotonic():
+            del self._data[key]
+            self._entries.set(len(self._data))
+            self._misses.inc()
+            return default
+        self._data.move_to_end(key)
+        self._hits.inc()
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        self._entries.set(len(self._data))
+
+    def invalidate(self, key: Hashable):
+        if self._data.pop(key, _MISSING) is not _MISSING:
+            self._entries.set(len(self._data))
+
+    def clear(self):
+        self._data.clear()
+        self._entries.set(0)
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,299 @@
+"""
+Cloudflare API request scheduling.
+
+Every call CloudflareService makes goes through ``CloudflareScheduler.send``:
+
+    rate        A token bucket per API token: CLOUDFLARE_RATE_PER_SECOND
+                requests a second, in bursts of up to CLOUDFLARE_RATE_BURST.
+                Cloudflare's limit (1200 requests per 5 minutes) applies to
+                all of a user's calls, so rate and burst are shared out among
+                the WEB_CONCURRENCY workers.  A rate of 0 turns the bucket off.
+    concurrency At most CLOUDFLARE_TOKEN_CONCURRENCY requests per API token
+                in flight at once.
+    429         The token's bucket is paused for the Retry-After the response
+                asks for, so its other requests wait too.  The request is
+                then retried, whatever its method: a rate-limited request
+                was not carried out.
+    5xx, I/O    Retried with exponential backoff and full jitter, but only
+                for idempotent methods (GET, PUT, DELETE) and for requests
+                that never reached Cloudflare (connect errors).  A POST that
+                may have created something is not sent twice.
+    breaker     CLOUDFLARE_BREAKER_FAILURES consecutive 5xx or transport
+                failures (on any token) open the circuit: calls then fail at
+                once with CloudflareUnavailable.  After
+                CLOUDFLARE_BREAKER_RESET_SECONDS one call is let through as a
+                probe; its success closes the circuit.
+
+A call may spend CLOUDFLARE_QUEUE_TIMEOUT_SECONDS in all waiting for its
+turn and between retries.  It fails with CloudflareUnavailable if its turn
+does not come in that time, and is not retried if the retry would overrun
+it.  When a call stops retrying, the last response is returned (or the
+last transport error raised), so callers see the same outcome they would
+have seen without retries.  The time spent waiting for a turn is exported
+as deployx_cloudflare_queue_wait_seconds.
+
+Schedulers are kept for the CLOUDFLARE_SCHEDULERS_MAX most recently used
+tokens; beyond that, the least recently used idle ones are forgotten.
+"""
+import asyncio
+import email.utils
+import logging
+import os
+import random
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+from metrics import (
+    CLOUDFLARE_BREAKER_OPEN, CLOUDFLARE_QUEUE_WAIT, CLOUDFLARE_REJECTED, CLOUDFLARE_RETRIES,
+    current_cloudflare_operation,
+)
+
+logger = logging.getLogger("deployx.cloudflare")
+
+# Worker processes sharing the rate limit (set by gunicorn.conf.py)
+WEB_CONCURRENCY = max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+# Per API token across all workers; each worker takes 1/WEB_CONCURRENCY
+CLOUDFLARE_RATE_PER_SECOND = float(os.getenv("CLOUDFLARE_RATE_PER_SECOND", "4"))
+CLOUDFLARE_RATE_BURST = int(os.getenv("CLOUDFLARE_RATE_BURST", "20"))
+CLOUDFLARE_TOKEN_CONCURRENCY = int(os.getenv("CLOUDFLARE_TOKEN_CONCURRENCY", "4"))
+CLOUDFLARE_QUEUE_TIMEOUT_SECONDS = float(os.getenv("CLOUDFLARE_QUEUE_TIMEOUT_SECONDS", "30"))
+CLOUDFLARE_MAX_RETRIES = int(os.getenv("CLOUDFLARE_MAX_RETRIES", "3"))
+CLOUDFLARE_RETRY_BASE_SECONDS = float(os.getenv("CLOUDFLARE_RETRY_BASE_SECONDS", "0.5"))
+# A Retry-After longer than this is not waited out; the 429 is returned
+CLOUDFLARE_RETRY_MAX_SECONDS = float(os.getenv("CLOUDFLARE_RETRY_MAX_SECONDS", "30"))
+CLOUDFLARE_BREAKER_FAILURES = int(os.getenv("CLOUDFLARE_BREAKER_FAILURES", "5"))
+CLOUDFLARE_BREAKER_RESET_SECONDS = float(os.getenv("CLOUDFLARE_BREAKER_RESET_SECONDS", "30"))
+CLOUDFLARE_SCHEDULERS_MAX = int(os.getenv("CLOUDFLARE_SCHEDULERS_MAX", "256"))
+
+_IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+# Transport errors raised before the request was written
+_NOT_SENT = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class CloudflareUnavailable(Exception):
+    """The request was not sent: the circuit is open or the queue wait ran out."""
+
+
+def retry_after_seconds(resp: httpx.Response) -> Optional[float]:
+    """The response's Retry-After (delta-seconds or HTTP date), in seconds."""
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff before retry number *attempt* (from 0)."""
+    return random.uniform(0, min(CLOUDFLARE_RETRY_MAX_SECONDS, CLOUDFLARE_RETRY_BASE_SECONDS * 2 ** attempt))
+
+
+class TokenBucket:
+    """Request rate limit; waiters are served in arrival order."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def paused(self) -> bool:
+        return time.monotonic() < self._paused_until
+
+    def pause(self, seconds: float):
+        """Hold every request back for *seconds*, and restart from an empty bucket."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def take(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                if self.rate <= 0:
+                    return
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; lets one probe through per reset interval."""
+
+    def __init__(self, threshold: int, reset_seconds: float):
+        self.threshold = max(threshold, 1)
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    def check(self):
+        """Raise CloudflareUnavailable unless a request may be sent now."""
+        if self.opened_at is None:
+            return
+        waited = time.monotonic() - self.opened_at
+        if waited < self.reset_seconds:
+            raise CloudflareUnavailable(
+                f"Cloudflare API unavailable; retrying in {self.reset_seconds - waited:.0f}s"
+            )
+        # Half open: this request is the probe; the rest wait for its outcome
+        # (or, if it never reports one, for the next interval)
+        self.opened_at = time.monotonic()
+
+    def success(self):
+        if self.opened_at is not None:
+            logger.info("Cloudflare API reachable again; circuit closed")
+            CLOUDFLARE_BREAKER_OPEN.set(0)
+        self.failures = 0
+        self.opened_at = None
+
+    def failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.warning("Cloudflare API failing (%d in a row); circuit open", self.failures)
+                CLOUDFLARE_BREAKER_OPEN.set(1)
+            self.opened_at = time.monotonic()
+
+
+class CloudflareScheduler:
+    """Rate limit and concurrency cap of one API token."""
+
+    def __init__(self, rate: float, burst: int, concurrency: int):
+        self.bucket = TokenBucket(rate, burst)
+        self._slots = asyncio.Semaphore(max(concurrency, 1))
+        # Calls in send(), queued or in flight
+        self._calls = 0
+
+    @property
+    def idle(self) -> bool:
+        """No calls under way and no Retry-After pending: forgetting it loses nothing."""
+        return self._calls == 0 and not self.bucket.paused
+
+    async def _acquire(self, timeout: float):
+        """Wait for a turn for at most *timeout* seconds (what is left of the call's budget)."""
+        timeout = max(timeout, 0)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._turn(), timeout)
+        except asyncio.TimeoutError:
+            CLOUDFLARE_REJECTED.labels("queue_timeout").inc()
+            raise CloudflareUnavailable(
+                f"Cloudflare request not sent: no turn within the {timeout:.3g}s left of its "
+                f"{CLOUDFLARE_QUEUE_TIMEOUT_SECONDS:g}s budget"
+            ) from None
+        finally:
+            CLOUDFLARE_QUEUE_WAIT.labels(current_cloudflare_operation()).observe(time.perf_counter() - start)
+
+    async def _turn(self):
+        await self._slots.acquire()
+        try:
+            await self.bucket.take()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def send(self, method: str, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        """Send a request through the limits, retrying it where that is safe."""
+        self._calls += 1
+        try:
+            return await self._send(method, send)
+        finally:
+            self._calls -= 1
+
+    async def _send(self, method: str, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        idempotent = method.upper() in _IDEMPOTENT_METHODS
+        # Queueing and backoff share one budget, so a call never waits much
+        # longer than CLOUDFLARE_QUEUE_TIMEOUT_SECONDS however often it retries
+        deadline = time.monotonic() + CLOUDFLARE_QUEUE_TIMEOUT_SECONDS
+        attempt = 0
+        while True:
+            try:
+                breaker.check()
+            except CloudflareUnavailable:
+                CLOUDFLARE_REJECTED.labels("circuit_open").inc()
+                raise
+            await self._acquire(deadline - time.monotonic())
+            error: Optional[httpx.TransportError] = None
+            try:
+                resp = await send()
+            except httpx.TransportError as e:
+                breaker.failure()
+                error, retryable = e, idempotent or isinstance(e, _NOT_SENT)
+                reason, delay = "transport", backoff(attempt)
+            else:
+                if resp.status_code == 429:
+                    # Cloudflare answered, so it is not down; this token is just over its limit
+                    breaker.success()
+                    wait = retry_after_seconds(resp)
+                    self.bucket.pause(min(backoff(attempt) if wait is None else wait, CLOUDFLARE_RETRY_MAX_SECONDS))
+                    retryable = wait is None or wait <= CLOUDFLARE_RETRY_MAX_SECONDS
+                    # Jittered, so the requests the pause held back do not return together
+                    reason, delay = "rate_limited", (wait or 0) + backoff(attempt)
+                elif resp.status_code >= 500:
+                    breaker.failure()
+                    retryable = idempotent
+                    reason, delay = "server_error", backoff(attempt)
+                else:
+                    breaker.success()
+                    return resp
+            finally:
+                self._slots.release()
+
+            if not retryable or attempt >= CLOUDFLARE_MAX_RETRIES or time.monotonic() + delay > deadline:
+                if error is not None:
+                    raise error
+                return resp
+            CLOUDFLARE_RETRIES.labels(current_cloudflare_operation(), reason).inc()
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+# Process-wide: Cloudflare being down affects every token alike
+breaker = CircuitBreaker(CLOUDFLARE_BREAKER_FAILURES, CLOUDFLARE_BREAKER_RESET_SECONDS)
+
+# Least recently used first
+_schedulers: "OrderedDict[str, CloudflareScheduler]" = OrderedDict()
+
+
+def scheduler_for(token_key: str) -> CloudflareScheduler:
+    """The scheduler of the API token identified by *token_key* (a hash, not the token)."""
+    scheduler = _schedulers.get(token_key)
+    if scheduler is None:
+        scheduler = _schedulers[token_key] = CloudflareScheduler(
+            rate=CLOUDFLARE_RATE_PER_SECOND / WEB_CONCURRENCY,
+            burst=CLOUDFLARE_RATE_BURST // WEB_CONCURRENCY,
+            concurrency=CLOUDFLARE_TOKEN_CONCURRENCY,
+        )
+        _evict(keep=token_key)
+    else:
+        _schedulers.move_to_end(token_key)
+    return scheduler
+
+
+def _evict(keep: str):
+    # A busy scheduler is kept even over the limit: dropping it would let
+    # its token exceed the concurrency cap or ignore a pending Retry-After
+    for key in list(_schedulers):
+        if len(_schedulers) <= CLOUDFLARE_SCHEDULERS_MAX:
+            break
+        if key != keep and _schedulers[key].idle:
+            del _schedulers[key]
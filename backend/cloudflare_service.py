@@ -1,140 +1,239 @@
 import httpx
 import os
 import json
+import hashlib
 import secrets
 import logging
-from typing import Optional, Tuple
+from typing import Iterable, List, Optional, Tuple
+
+from cache import TTLCache
+from cloudflare_scheduler import scheduler_for
+from metrics import cloudflare_operation, record_cloudflare_response
+from profiling import span
 
 logger = logging.getLogger("deployx.cloudflare")
 
+CLOUDFLARE_API_BASE_URL = os.getenv("CLOUDFLARE_API_BASE_URL", "https://api.cloudflare.com/client/v4")
+CLOUDFLARE_HTTP2 = os.getenv("CLOUDFLARE_HTTP2", "false").lower() in ("1", "true", "yes")
+CLOUDFLARE_MAX_CONNECTIONS = int(os.getenv("CLOUDFLARE_MAX_CONNECTIONS", "20"))
+CLOUDFLARE_MAX_KEEPALIVE = int(os.getenv("CLOUDFLARE_MAX_KEEPALIVE", "10"))
+CLOUDFLARE_LOOKUP_TTL_SECONDS = float(os.getenv("CLOUDFLARE_LOOKUP_TTL_SECONDS", "300"))
+# Where the tunnel sends every routed hostname
+TUNNEL_ORIGIN_SERVICE = os.getenv("TUNNEL_ORIGIN_SERVICE", "http://traefik:80")
+
+# ----------------------------------------------------------------------
+#  Shared HTTP client — one keep-alive pool for the app's lifetime
+# ----------------------------------------------------------------------
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available() -> bool:
+    if not CLOUDFLARE_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401  (optional: pip install httpx[http2])
+    except ImportError:
+        logger.warning("CLOUDFLARE_HTTP2 is set but the h2 package is not installed; using HTTP/1.1")
+        return False
+    return True
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide Cloudflare HTTP client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=30,
+            http2=_http2_available(),
+            limits=httpx.Limits(
+                max_connections=CLOUDFLARE_MAX_CONNECTIONS,
+                max_keepalive_connections=CLOUDFLARE_MAX_KEEPALIVE,
+            ),
+        )
+    return _client
+
+
+async def close_http_client():
+    """Close the shared client (called on application shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+# Zone / account IDs rarely change; memoize them per API token.
+_lookups = TTLCache("cloudflare_lookups", maxsize=256, ttl=CLOUDFLARE_LOOKUP_TTL_SECONDS)
+
 
 class CloudflareService:
     """Service for interacting with the Cloudflare API to manage tunnels and DNS."""
 
     def __init__(self, api_token: str):
         self.api_token = api_token
-        self.base_url = "https://api.cloudflare.com/client/v4"
+        self.base_url = CLOUDFLARE_API_BASE_URL
         self.headers = {
             "Authorization": f"Bearer {api_token}",
             "Content-Type": "application/json",
         }
+        # Cache key that does not keep the raw token around
+        self._token_key = hashlib.sha256(api_token.encode()).hexdigest()[:16]
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send a request under this token's rate limit, retrying where safe (see cloudflare_scheduler)."""
+        async def send() -> httpx.Response:
+            with span("cloudflare"):
+                resp = await get_http_client().request(
+                    method, f"{self.base_url}{path}", headers=self.headers, **kwargs
+                )
+            record_cloudflare_response(resp.status_code)
+            return resp
+
+        return await scheduler_for(self._token_key).send(method, send)
 
     # ------------------------------------------------------------------
     #  Zone helpers
     # ------------------------------------------------------------------
+    @cloudflare_operation
     async def get_zone_id(self, domain: str) -> Optional[str]:
         """Return the zone ID for *domain*, or None."""
-        async with httpx.AsyncClient(timeout=30) as client:
-            resp = await client.get(
-                f"{self.base_url}/zones",
-                headers=self.headers,
-                params={"name": domain},
-            )
-            if resp.status_code == 200:
-                data = resp.json()
-                if data.get("success") and data.get("result"):
-                    return data["result"][0]["id"]
+        zone_id = _lookups.get((self._token_key, "zone", domain))
+        if zone_id:
+            return zone_id
+        resp = await self._request("GET", "/zones", params={"name": domain})
+        if resp.status_code == 200:
+            data = resp.json()
+            if data.get("success") and data.get("result"):
+                zone = data["result"][0]
+                _lookups.set((self._token_key, "zone", domain), zone["id"])
+                # The zone carries its account, which saves a separate lookup
+                _lookups.set((self._token_key, "account"), zone["account"]["id"])
+                return zone["id"]
         return None
 
+    @cloudflare_operation
     async def get_account_id(self) -> Optional[str]:
         """Resolve the account ID from zones list."""
-        async with httpx.AsyncClient(timeout=30) as client:
-            resp = await client.get(f"{self.base_url}/zones", headers=self.headers)
-            if resp.status_code == 200:
-                data = resp.json()
-                if data.get("success") and data.get("result"):
-                    return data["result"][0]["account"]["id"]
+        account_id = _lookups.get((self._token_key, "account"))
+        if account_id:
+            return account_id
+        resp = await self._request("GET", "/zones", params={"per_page": 1})
+        if resp.status_code == 200:
+            data = resp.json()
+            if data.get("success") and data.get("result"):
+                account_id = data["result"][0]["account"]["id"]
+                _lookups.set((self._token_key, "account"), account_id)
+                return account_id
         return None
 
     # ------------------------------------------------------------------
     #  Tunnel CRUD
     # ------------------------------------------------------------------
+    @cloudflare_operation
     async def create_tunnel(self, name: str, zone_id: str) -> Tuple[str, str]:
         """Create a Cloudflare Tunnel and return *(tunnel_id, tunnel_token)*."""
         account_id = await self.get_account_id()
         if not account_id:
             raise Exception("Unable to resolve Cloudflare account ID")
 
-        async with httpx.AsyncClient(timeout=30) as client:
-            tunnel_data = {"name": name, "tunnel_secret": secrets.token_urlsafe(32)}
-            resp = await client.post(
-                f"{self.base_url}/accounts/{account_id}/cfd_tunnel",
-                headers=self.headers,
-                json=tunnel_data,
-            )
-            if resp.status_code not in (200, 201):
-                raise Exception(f"Tunnel creation failed: {resp.text}")
+        tunnel_id = await self.create_named_tunnel(account_id, name)
+        tunnel_token = await self.get_tunnel_token(account_id, tunnel_id)
+        return tunnel_id, tunnel_token
+
+    @cloudflare_operation
+    async def create_named_tunnel(self, account_id: str, name: str) -> str:
+        """Create a Cloudflare Tunnel in *account_id* and return its ID."""
+        tunnel_data = {"name": name, "tunnel_secret": secrets.token_urlsafe(32)}
+        resp = await self._request("POST", f"/accounts/{account_id}/cfd_tunnel", json=tunnel_data)
+        if resp.status_code not in (200, 201):
+            raise Exception(f"Tunnel creation failed: {resp.text}")
 
-            result = resp.json()
-            if not result.get("success"):
-                raise Exception(f"Tunnel creation unsuccessful: {result}")
+        result = resp.json()
+        if not result.get("success"):
+            raise Exception(f"Tunnel creation unsuccessful: {result}")
+        return result["result"]["id"]
+
+    @cloudflare_operation
+    async def find_tunnel(self, account_id: str, name: str) -> Optional[str]:
+        """Return the ID of the live tunnel called *name*, or None."""
+        resp = await self._request(
+            "GET",
+            f"/accounts/{account_id}/cfd_tunnel",
+            params={"name": name, "is_deleted": "false"},
+        )
+        if resp.status_code == 200:
+            data = resp.json()
+            if data.get("success") and data.get("result"):
+                return data["result"][0]["id"]
+        return None
 
-            tunnel_id = result["result"]["id"]
-            tunnel_token = await self._get_tunnel_token(account_id, tunnel_id)
-            return tunnel_id, tunnel_token
+    @cloudflare_operation
+    async def get_tunnel_token(self, account_id: str, tunnel_id: str) -> str:
+        """Return the connector token for *tunnel_id*."""
+        resp = await self._request("GET", f"/accounts/{account_id}/cfd_tunnel/{tunnel_id}/token")
+        if resp.status_code == 200:
+            data = resp.json()
+            if data.get("success"):
+                return data["result"]
+        return tunnel_id  # fallback
 
+    @cloudflare_operation
     async def create_dns_record(self, zone_id: str, subdomain: str, tunnel_id: str) -> bool:
         """Create a proxied CNAME record pointing *subdomain* to the tunnel."""
-        async with httpx.AsyncClient(timeout=30) as client:
-            resp = await client.post(
-                f"{self.base_url}/zones/{zone_id}/dns_records",
-                headers=self.headers,
-                json={
-                    "type": "CNAME",
-                    "name": subdomain,
-                    "content": f"{tunnel_id}.cfargotunnel.com",
-                    "ttl": 1,
-                    "proxied": True,
-                },
-            )
-            if resp.status_code == 200:
-                return resp.json().get("success", False)
-            return False
+        resp = await self._request(
+            "POST",
+            f"/zones/{zone_id}/dns_records",
+            json={
+                "type": "CNAME",
+                "name": subdomain,
+                "content": f"{tunnel_id}.cfargotunnel.com",
+                "ttl": 1,
+                "proxied": True,
+            },
+        )
+        if resp.status_code == 200:
+            return resp.json().get("success", False)
+        # 81053: a record for this host already exists (e.g. a resumed setup)
+        try:
+            errors = resp.json().get("errors") or []
+        except ValueError:
+            errors = []
+        return any(e.get("code") == 81053 for e in errors)
+
+    @cloudflare_operation
+    async def configure_tunnel_routing(self, account_id: str, tunnel_id: str, hostnames: Iterable[str]) -> bool:
+        """Replace the tunnel ingress rules: each of *hostnames* routes to Traefik."""
+        rules = [{"hostname": h, "service": TUNNEL_ORIGIN_SERVICE} for h in sorted(hostnames)]
+        resp = await self._request(
+            "PUT",
+            f"/accounts/{account_id}/cfd_tunnel/{tunnel_id}/configurations",
+            json={"config": {"ingress": rules + [{"service": "http_status:404"}]}},
+        )
+        return resp.status_code == 200
 
-    async def configure_tunnel_routing(self, account_id: str, tunnel_id: str, hostname: str) -> bool:
-        """Set the tunnel ingress rules to route traffic to Traefik."""
-        async with httpx.AsyncClient(timeout=30) as client:
-            resp = await client.put(
-                f"{self.base_url}/accounts/{account_id}/cfd_tunnel/{tunnel_id}/configurations",
-                headers=self.headers,
-                json={
-                    "config": {
-                        "ingress": [
-                            {"hostname": hostname, "service": "http://traefik:80"},
-                            {"service": "http_status:404"},
-                        ]
-                    }
-                },
-            )
-            return resp.status_code == 200
+    @cloudflare_operation
+    async def get_tunnel_hostnames(self, account_id: str, tunnel_id: str) -> Optional[List[str]]:
+        """Return the hostnames in the tunnel's current ingress rules, or None."""
+        resp = await self._request("GET", f"/accounts/{account_id}/cfd_tunnel/{tunnel_id}/configurations")
+        if resp.status_code != 200:
+            return None
+        data = resp.json()
+        if not data.get("success"):
+            return None
+        ingress = ((data.get("result") or {}).get("config") or {}).get("ingress") or []
+        return [rule["hostname"] for rule in ingress if rule.get("hostname")]
 
+    @cloudflare_operation
     async def delete_tunnel(self, tunnel_id: str) -> bool:
         """Delete an existing Cloudflare tunnel."""
         account_id = await self.get_account_id()
         if not account_id:
             return False
-        async with httpx.AsyncClient(timeout=30) as client:
-            resp = await client.delete(
-                f"{self.base_url}/accounts/{account_id}/cfd_tunnel/{tunnel_id}",
-                headers=self.headers,
-            )
-            return resp.status_code == 200
+        resp = await self._request("DELETE", f"/accounts/{account_id}/cfd_tunnel/{tunnel_id}")
+        return resp.status_code == 200
 
     # ------------------------------------------------------------------
-    #  Internal helpers
+    #  Local environment
     # ------------------------------------------------------------------
-    async def _get_tunnel_token(self, account_id: str, tunnel_id: str) -> str:
-        async with httpx.AsyncClient(timeout=30) as client:
-            resp = await client.get(
-                f"{self.base_url}/accounts/{account_id}/cfd_tunnel/{tunnel_id}/token",
-                headers=self.headers,
-            )
-            if resp.status_code == 200:
-                data = resp.json()
-                if data.get("success"):
-                    return data["result"]
-        return tunnel_id  # fallback
-
     async def update_env_file(self, tunnel_token: str):
         """Persist the tunnel token into the project .env file."""
         env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".env")
@@ -1,12 +1,14 @@
-from sqlalchemy.orm import Session
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import User
 from schemas import UserCreate
 from password import get_password_hash
 
 
-def create_user(db: Session, user: UserCreate, is_superuser: bool = False) -> User:
+async def create_user(db: AsyncSession, user: UserCreate, is_superuser: bool = False) -> User:
     """Create a new user. The first user is marked as superuser."""
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash(user.password)
     db_user = User(
         email=user.email,
         username=user.username,
@@ -14,21 +16,18 @@ def create_user(db: Session, user: UserCreate, is_superuser: bool = False) -> Us
         is_superuser=is_superuser,
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
-def get_user_by_email(db: Session, email: str) -> User:
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
     """Get user by email"""
-    return db.query(User).filter(User.email == email).first()
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
 
 
-def get_user_by_username(db: Session, username: str) -> User:
+async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
     """Get user by username"""
-    return db.query(User).filter(User.username == username).first()
-
-
-def get_user_by_id(db: Session, user_id: str) -> User:
-    """Get user by ID"""
-    return db.query(User).filter(User.id == user_id).first()
+    result = await db.execute(select(User).where(User.username == username))
+    return result.scalars().first()
@@ -0,0 +1,152 @@
+"""
+Chunked, append-only deployment logs.
+
+The worker writes a deployment's output through DeploymentLogWriter, which
+buffers it and appends a ``deployment_log_chunks`` row whenever the buffer
+reaches DEPLOY_LOG_CHUNK_CHARS or DEPLOY_LOG_FLUSH_SECONDS pass.  Existing
+rows are never rewritten.  Each chunk records the character offsets it
+covers, so readers can start anywhere in the log.
+
+``iter_log`` reads a log from an offset a few chunks at a time and, when
+following, polls for new chunks until the deployment finishes.  A reader
+holds at most DEPLOY_LOG_PAGE_CHUNKS chunks in memory, however large the
+log gets.
+"""
+import asyncio
+import logging
+import os
+from typing import AsyncIterator, Optional, Tuple
+
+from sqlalchemy import insert, select
+
+from database import AsyncSessionLocal
+from models import Deployment, DeploymentLogChunk
+
+logger = logging.getLogger("deployx.deploy")
+
+DEPLOY_LOG_CHUNK_CHARS = int(os.getenv("DEPLOY_LOG_CHUNK_CHARS", "65536"))
+DEPLOY_LOG_FLUSH_SECONDS = float(os.getenv("DEPLOY_LOG_FLUSH_SECONDS", "1"))
+DEPLOY_LOG_PAGE_CHUNKS = int(os.getenv("DEPLOY_LOG_PAGE_CHUNKS", "4"))
+DEPLOY_LOG_POLL_SECONDS = float(os.getenv("DEPLOY_LOG_POLL_SECONDS", "1"))
+
+# No more output will be written for these (a superseded deployment never ran)
+FINISHED_STATUSES = ("success", "failed", "superseded")
+
+
+class DeploymentLogWriter:
+    """Buffers one deployment's output and appends it as chunk rows."""
+
+    def __init__(
+        self,
+        deployment_id,
+        chunk_chars: int = DEPLOY_LOG_CHUNK_CHARS,
+        flush_interval: float = DEPLOY_LOG_FLUSH_SECONDS,
+    ):
+        self.deployment_id = deployment_id
+        self.chunk_chars = chunk_chars
+        self.flush_interval = flush_interval
+        self._buf: list[str] = []
+        self._buf_len = 0
+        self._seq = 0
+        self._offset = 0
+        self._lock = asyncio.Lock()
+        self._ticker: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Flush on a timer as well, so slow steps still show up live."""
+        self._ticker = asyncio.create_task(self._tick())
+
+    async def close(self):
+        if self._ticker is not None:
+            self._ticker.cancel()
+            self._ticker = None
+        await self.flush()
+
+    async def write(self, text: str):
+        if not text:
+            return
+        self._buf.append(text)
+        self._buf_len += len(text)
+        if self._buf_len >= self.chunk_chars:
+            await self.flush()
+
+    async def flush(self):
+        """Append the buffered output.  If that fails, it stays buffered for the next flush."""
+        async with self._lock:
+            if not self._buf:
+                return
+            data = "".join(self._buf)
+            self._buf.clear()
+            self._buf_len = 0
+            rows = []
+            seq, offset = self._seq, self._offset
+            for i in range(0, len(data), self.chunk_chars):
+                content = data[i:i + self.chunk_chars]
+                rows.append(dict(
+                    deployment_id=self.deployment_id, seq=seq,
+                    start_offset=offset, end_offset=offset + len(content),
+                    content=content,
+                ))
+                seq += 1
+                offset += len(content)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(insert(DeploymentLogChunk).values(rows))
+                    await db.commit()
+            except BaseException:
+                # Ahead of anything written meanwhile, so the log keeps its order
+                self._buf.insert(0, data)
+                self._buf_len += len(data)
+                raise
+            self._seq, self._offset = seq, offset
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Log flush failed for deployment %s", self.deployment_id)
+
+
+async def iter_log(
+    deployment_id,
+    offset: int = 0,
+    follow: bool = True,
+    page_chunks: int = DEPLOY_LOG_PAGE_CHUNKS,
+    poll_interval: float = DEPLOY_LOG_POLL_SECONDS,
+) -> AsyncIterator[Tuple[int, str]]:
+    """Yield ``(end_offset, text)`` pieces of a deployment log from *offset*.
+
+    With *follow*, keeps polling for new output until the deployment has
+    finished and everything it wrote has been yielded.
+    """
+    while True:
+        # Short-lived session per page: idle followers must not pin a connection
+        async with AsyncSessionLocal() as db:
+            # Status first: the worker flushes its last chunk before marking
+            # the deployment finished, so a finished status read here means
+            # the chunk query below sees the complete log.
+            status = await db.scalar(select(Deployment.status).where(Deployment.id == deployment_id))
+            rows = (
+                await db.execute(
+                    select(DeploymentLogChunk.start_offset, DeploymentLogChunk.end_offset, DeploymentLogChunk.content)
+                    .where(
+                        DeploymentLogChunk.deployment_id == deployment_id,
+                        DeploymentLogChunk.end_offset > offset,
+                    )
+                    .order_by(DeploymentLogChunk.end_offset)
+                    .limit(page_chunks)
+                )
+            ).all()
+
+        for start, end, content in rows:
+            if start < offset:
+                content = content[offset - start:]
+            offset = end
+            yield end, content
+        if len(rows) == page_chunks:
+            continue
+        if not follow or status is None or status in FINISHED_STATUSES:
+            return
+        await asyncio.sleep(poll_interval)
@@ -0,0 +1,243 @@
+"""
+Per-project deployment statistics, maintained incrementally.
+
+``deployment_stats`` holds one row per project, granularity (hour or day)
+and UTC bucket, counting the deployments that *finished* in it: how many,
+how many succeeded or failed, their summed duration and the latest finish
+times.  Only terminal states feed the stats, so the rollups are touched by
+the transitions into ``success``/``failed`` alone, in the same transaction
+as the deployment row (see deploy_worker).  A deployment that is reaped as
+failed and later reports its real result is retracted from its old
+buckets before it is counted again.
+
+The stats endpoint reads only these rows.  If they are ever in doubt,
+recompute them from ``deployments``:
+
+    python deploy_stats.py --rebuild [--project <id>]
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, func, literal_column, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from models import Deployment, DeploymentStat
+
+logger = logging.getLogger("deployx.stats")
+
+# Finished deployments that count in the stats; superseded ones never ran
+COUNTED_STATUSES = ("success", "failed")
+GRANULARITIES = ("hour", "day")
+
+
+class Outcome(NamedTuple):
+    """What a finished deployment contributes to its project's stats."""
+    project_id: object
+    status: str
+    finished_at: Optional[datetime]
+    duration_seconds: Optional[int]
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    """Start of the UTC hour or day containing *ts*."""
+    ts = ts.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0) if granularity == "day" else ts
+
+
+# ----------------------------------------------------------------------
+#  Incremental updates
+# ----------------------------------------------------------------------
+async def record_outcomes(
+    db: AsyncSession,
+    added: Iterable[Outcome],
+    retracted: Iterable[Outcome] = (),
+):
+    """Fold finished deployments into the rollups (and take retracted ones out).
+
+    Runs in the caller's transaction, so the stats commit together with the
+    status change that produced them.
+    """
+    deltas: Dict[Tuple, List] = defaultdict(lambda: [0, 0, 0, 0, 0, None, None])
+    for outcomes, sign in ((added, 1), (retracted, -1)):
+        for o in outcomes:
+            if o.status not in COUNTED_STATUSES or o.finished_at is None:
+                continue
+            for granularity in GRANULARITIES:
+                d = deltas[(o.project_id, granularity, bucket_start(o.finished_at, granularity))]
+                d[0] += sign
+                d[1 if o.status == "success" else 2] += sign
+                if o.duration_seconds is not None:
+                    d[3] += sign * o.duration_seconds
+                    d[4] += sign
+                if sign > 0:
+                    d[5] = max(filter(None, (d[5], o.finished_at)))
+                    if o.status == "success":
+                        d[6] = max(filter(None, (d[6], o.finished_at)))
+    if not deltas:
+        return
+
+    # Sorted, so concurrent transactions lock the rows in the same order
+    rows = [
+        dict(
+            project_id=project_id, granularity=granularity, bucket_start=start,
+            deployments=d[0], succeeded=d[1], failed=d[2],
+            duration_total=d[3], duration_count=d[4],
+            last_finished_at=d[5], last_success_at=d[6],
+        )
+        for (project_id, granularity, start), d in sorted(deltas.items(), key=lambda kv: str(kv[0]))
+    ]
+    stmt = insert(DeploymentStat).values(rows)
+    table, new = DeploymentStat.__table__.c, stmt.excluded
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[table.project_id, table.granularity, table.bucket_start],
+        set_={
+            "deployments": table.deployments + new.deployments,
+            "succeeded": table.succeeded + new.succeeded,
+            "failed": table.failed + new.failed,
+            "duration_total": table.duration_total + new.duration_total,
+            "duration_count": table.duration_count + new.duration_count,
+            # GREATEST ignores NULLs
+            "last_finished_at": func.greatest(table.last_finished_at, new.last_finished_at),
+            "last_success_at": func.greatest(table.last_success_at, new.last_success_at),
+        },
+    ))
+
+
+# ----------------------------------------------------------------------
+#  Reads
+# ----------------------------------------------------------------------
+async def project_stats(db: AsyncSession, project_id, granularity: str = "day", days: int = 30) -> dict:
+    """Summary and per-bucket series for the last *days*, from the rollups only."""
+    since = bucket_start(datetime.now(timezone.utc) - timedelta(days=days), granularity)
+    if granularity == "day":
+        since += timedelta(days=1)
+    buckets = (
+        await db.execute(
+            select(DeploymentStat)
+            .where(
+                DeploymentStat.project_id == project_id,
+                DeploymentStat.granularity == granularity,
+                DeploymentStat.bucket_start >= since,
+                DeploymentStat.deployments > 0,
+            )
+            .order_by(DeploymentStat.bucket_start)
+        )
+    ).scalars().all()
+    last_finished_at, last_success_at = (
+        await db.execute(
+            select(func.max(DeploymentStat.last_finished_at), func.max(DeploymentStat.last_success_at))
+            .where(DeploymentStat.project_id == project_id, DeploymentStat.granularity == "day")
+        )
+    ).one()
+
+    total = sum(b.deployments for b in buckets)
+    succeeded = sum(b.succeeded for b in buckets)
+    duration_total = sum(b.duration_total for b in buckets)
+    duration_count = sum(b.duration_count for b in buckets)
+    return {
+        "project_id": project_id,
+        "granularity": granularity,
+        "since": since,
+        "last_deployed_at": last_finished_at,
+        "last_success_at": last_success_at,
+        "deployments": total,
+        "succeeded": succeeded,
+        "failed": sum(b.failed for b in buckets),
+        "success_rate": succeeded / total if total else None,
+        "avg_duration_seconds": duration_total / duration_count if duration_count else None,
+        "deployments_per_day": total / days,
+        "buckets": [
+            {
+                "bucket_start": b.bucket_start,
+                "deployments": b.deployments,
+                "succeeded": b.succeeded,
+                "failed": b.failed,
+                "avg_duration_seconds": b.duration_total / b.duration_count if b.duration_count else None,
+            }
+            for b in buckets
+        ],
+    }
+
+
+# ----------------------------------------------------------------------
+#  Rebuild
+# ----------------------------------------------------------------------
+def _utc_bucket(granularity: str, column):
+    # SQL twin of bucket_start; literal (not bound) arguments, so the
+    # expression in GROUP BY matches the one in the select list
+    utc = literal_column("'UTC'")
+    return func.timezone(utc, func.date_trunc(literal_column(f"'{granularity}'"), func.timezone(utc, column)))
+
+
+async def rebuild_stats(project_id=None) -> int:
+    """Recompute the rollups from ``deployments``; returns the number of rows written.
+
+    The table lock lets deployments that are finishing right now either
+    commit before the recount (and be included) or wait and be added on top
+    of it, so nothing is lost or counted twice.
+    """
+    async with AsyncSessionLocal() as db:
+        await db.execute(text("LOCK TABLE deployment_stats IN SHARE ROW EXCLUSIVE MODE"))
+        clear = delete(DeploymentStat)
+        if project_id is not None:
+            clear = clear.where(DeploymentStat.project_id == project_id)
+        await db.execute(clear)
+
+        written = 0
+        for granularity in GRANULARITIES:
+            bucket = _utc_bucket(granularity, Deployment.finished_at)
+            query = (
+                select(
+                    Deployment.project_id,
+                    literal_column(f"'{granularity}'"),
+                    bucket,
+                    func.count(),
+                    func.count().filter(Deployment.status == "success"),
+                    func.count().filter(Deployment.status == "failed"),
+                    func.coalesce(func.sum(Deployment.duration_seconds), 0),
+                    func.count(Deployment.duration_seconds),
+                    func.max(Deployment.finished_at),
+                    func.max(Deployment.finished_at).filter(Deployment.status == "success"),
+                )
+                .where(
+                    Deployment.status.in_(COUNTED_STATUSES),
+                    Deployment.finished_at.isnot(None),
+                    Deployment.project_id.isnot(None),
+                )
+                .group_by(Deployment.project_id, bucket)
+            )
+            if project_id is not None:
+                query = query.where(Deployment.project_id == project_id)
+            result = await db.execute(
+                insert(DeploymentStat).from_select(
+                    [
+                        "project_id", "granularity", "bucket_start",
+                        "deployments", "succeeded", "failed",
+                        "duration_total", "duration_count",
+                        "last_finished_at", "last_success_at",
+                    ],
+                    query,
+                )
+            )
+            written += result.rowcount
+        await db.commit()
+    logger.info("Rebuilt deployment stats: %d rows", written)
+    return written
+
+
+if __name__ == "__main__":
+    import argparse
+    import uuid
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rebuild", action="store_true", required=True,
+                        help="recompute the rollups from the deployments table")
+    parser.add_argument("--project", type=uuid.UUID, help="only this project")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(rebuild_stats(args.project))
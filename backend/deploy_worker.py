@@ -0,0 +1,353 @@
+"""
+Deployment execution engine.
+
+Pending rows in ``deployments`` are the queue.  Every backend process runs a
+DeploymentWorker that claims work with ``SELECT ... FOR UPDATE SKIP LOCKED``,
+so any number of processes can drain the queue without running a deployment
+twice.  The partial unique index ``uq_deployments_active_project`` allows one
+building/deploying row per project, which serializes each project's
+deployments across all workers; DEPLOY_WORKER_CONCURRENCY caps how many run
+in one process.
+
+Running deployments refresh ``heartbeat_at``.  A deployment whose heartbeat
+goes stale (its worker died) is failed by whichever worker notices first, so
+it stops blocking its project.
+
+A project has at most one pending row (``uq_deployments_pending_project``).
+``queue_deployment`` updates it in place, so requests that arrive before it
+is claimed coalesce into one deployment of the newest commit; a row is not
+claimed before its ``scheduled_at``, which gives pushes a window to coalesce.
+
+Before building, the project's repository is fetched into its local mirror
+(see repo_mirror) and the deployment is pinned to the resolved commit; the
+mirror is leased to the executor for the rest of the run.
+
+Moving a deployment into a terminal state updates the project's stats
+rollups in the same transaction (see deploy_stats).
+"""
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import replace
+from datetime import timedelta
+from typing import AsyncIterator, Optional, Set
+
+from sqlalchemy import exists, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+
+from database import AsyncSessionLocal
+from deploy_logs import DeploymentLogWriter
+from deploy_stats import COUNTED_STATUSES, Outcome, record_outcomes
+from executors import DeploymentContext, DeploymentExecutor, ExecutorError
+from models import Deployment, Project
+from repo_mirror import MirrorError, redact_url, repository_mirrors
+
+logger = logging.getLogger("deployx.deploy")
+
+DEPLOY_WORKER_ENABLED = os.getenv("DEPLOY_WORKER_ENABLED", "true").lower() in ("1", "true", "yes")
+DEPLOY_WORKER_CONCURRENCY = int(os.getenv("DEPLOY_WORKER_CONCURRENCY", "4"))
+DEPLOY_POLL_INTERVAL_SECONDS = float(os.getenv("DEPLOY_POLL_INTERVAL_SECONDS", "2"))
+DEPLOY_HEARTBEAT_SECONDS = float(os.getenv("DEPLOY_HEARTBEAT_SECONDS", "10"))
+DEPLOY_SHUTDOWN_GRACE_SECONDS = float(os.getenv("DEPLOY_SHUTDOWN_GRACE_SECONDS", "30"))
+DEPLOY_EXECUTOR = os.getenv("DEPLOY_EXECUTOR", "shell")
+# Fetch the repository and pin the commit before building
+DEPLOY_FETCH_SOURCE = os.getenv("DEPLOY_FETCH_SOURCE", "true").lower() in ("1", "true", "yes")
+
+ACTIVE_STATUSES = ("building", "deploying")
+# Heartbeats missed before a running deployment is considered orphaned
+_STALE_AFTER = timedelta(seconds=DEPLOY_HEARTBEAT_SECONDS * 6)
+_OUTCOME_COLUMNS = (
+    Deployment.project_id, Deployment.status, Deployment.finished_at, Deployment.duration_seconds,
+)
+
+
+async def queue_deployment(
+    db: AsyncSession,
+    project_id,
+    user_id,
+    commit_sha: Optional[str] = None,
+    delay: float = 0,
+) -> Deployment:
+    """Queue a deployment of *project_id*, or retarget the one already queued.
+
+    The pending row takes the new commit and user; it runs at the earlier of
+    its current schedule and now + *delay*.  Runs in the caller's
+    transaction; the caller commits.
+    """
+    stmt = insert(Deployment).values(
+        project_id=project_id,
+        user_id=user_id,
+        status="pending",
+        commit_sha=commit_sha,
+        scheduled_at=func.now() + timedelta(seconds=delay),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Deployment.project_id],
+        # Literal, not a bound parameter: Postgres must match it to the
+        # partial index even under a generic (parameter-blind) plan
+        index_where=text("status = 'pending'"),
+        set_={
+            "commit_sha": stmt.excluded.commit_sha,
+            "user_id": stmt.excluded.user_id,
+            "scheduled_at": func.least(Deployment.scheduled_at, stmt.excluded.scheduled_at),
+        },
+    )
+    return (
+        await db.scalars(stmt.returning(Deployment), execution_options={"populate_existing": True})
+    ).one()
+
+
+class DeploymentWorker:
+    """Claims pending deployments and runs them on a bounded pool of tasks."""
+
+    def __init__(
+        self,
+        executor: DeploymentExecutor,
+        concurrency: int = DEPLOY_WORKER_CONCURRENCY,
+        poll_interval: float = DEPLOY_POLL_INTERVAL_SECONDS,
+    ):
+        self.executor = executor
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._slots = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._running: Set[asyncio.Task] = set()
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def notify(self):
+        """Wake the claim loop early, e.g. right after a deployment is queued."""
+        self._wakeup.set()
+
+    async def start(self):
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._run(), name="deploy-worker")
+
+    async def stop(self):
+        """Stop claiming; give running deployments a grace period, then cancel them."""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+        if self._running:
+            _, pending = await asyncio.wait(self._running, timeout=DEPLOY_SHUTDOWN_GRACE_SECONDS)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    # ------------------------------------------------------------------
+    #  Claim loop
+    # ------------------------------------------------------------------
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        last_reap = 0.0
+        while True:
+            await self._slots.acquire()
+            self._wakeup.clear()
+            ctx = None
+            try:
+                if loop.time() - last_reap >= DEPLOY_HEARTBEAT_SECONDS:
+                    await self._reap_orphans()
+                    last_reap = loop.time()
+                ctx = await self._claim()
+            except Exception:
+                logger.exception("Deployment claim failed")
+
+            if ctx is None:
+                self._slots.release()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            task = asyncio.create_task(self._execute(ctx), name=f"deploy-{ctx.deployment_id}")
+            self._running.add(task)
+            task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task):
+        self._running.discard(task)
+        self._slots.release()
+
+    async def _claim(self) -> Optional[DeploymentContext]:
+        active = aliased(Deployment)
+        async with AsyncSessionLocal() as db:
+            # A racing worker may take the project slot between our SELECT
+            # and UPDATE; the unique index rejects ours and we look again.
+            for _ in range(3):
+                dep = (
+                    await db.execute(
+                        select(Deployment)
+                        .where(
+                            Deployment.status == "pending",
+                            Deployment.scheduled_at <= func.now(),
+                            ~exists().where(
+                                active.project_id == Deployment.project_id,
+                                active.status.in_(ACTIVE_STATUSES),
+                            ),
+                        )
+                        .order_by(Deployment.scheduled_at)
+                        .limit(1)
+                        .with_for_update(skip_locked=True, of=Deployment)
+                    )
+                ).scalars().first()
+                if dep is None:
+                    return None
+                dep.status = "building"
+                dep.started_at = func.now()
+                dep.heartbeat_at = func.now()
+                try:
+                    await db.commit()
+                except IntegrityError:
+                    await db.rollback()
+                    continue
+                project = await db.get(Project, dep.project_id)
+                return DeploymentContext(
+                    deployment_id=dep.id,
+                    project_id=dep.project_id,
+                    project_name=project.name if project else "",
+                    repository_url=project.repository_url if project else None,
+                    commit_sha=dep.commit_sha,
+                )
+        return None
+
+    async def _reap_orphans(self):
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(Deployment)
+                .where(
+                    Deployment.status.in_(ACTIVE_STATUSES),
+                    Deployment.heartbeat_at < func.now() - _STALE_AFTER,
+                )
+                .values(status="failed", finished_at=func.now())
+                .returning(*_OUTCOME_COLUMNS)
+            )
+            reaped = [Outcome(*row) for row in result]
+            await record_outcomes(db, reaped)
+            await db.commit()
+        if reaped:
+            logger.warning("Failed %d orphaned deployment(s) with stale heartbeats", len(reaped))
+
+    # ------------------------------------------------------------------
+    #  Execution
+    # ------------------------------------------------------------------
+    async def _execute(self, ctx: DeploymentContext):
+        started = time.monotonic()
+        writer = DeploymentLogWriter(ctx.deployment_id)
+        writer.start()
+        log = writer.write
+
+        heartbeat = asyncio.create_task(self._heartbeat(ctx))
+        status = "failed"
+        cancelled = False
+        try:
+            async with self._source(ctx, log) as ctx:
+                await self.executor.build(ctx, log)
+                await self._set_status(ctx, "deploying")
+                await self.executor.deploy(ctx, log)
+            status = "success"
+        except ExecutorError as e:
+            await log(f"ERROR: {e}\n")
+        except asyncio.CancelledError:
+            cancelled = True
+            await log("ERROR: deployment interrupted by worker shutdown\n")
+        except Exception as e:
+            logger.exception("Deployment %s crashed", ctx.deployment_id)
+            await log(f"ERROR: {e}\n")
+        finally:
+            heartbeat.cancel()
+
+        try:
+            # Flush the log before the final status so followers see all of it
+            await writer.close()
+        except Exception:
+            logger.exception("Could not flush log of deployment %s", ctx.deployment_id)
+        try:
+            await self._finish(ctx, status, time.monotonic() - started)
+        except Exception:
+            logger.exception("Could not record result of deployment %s", ctx.deployment_id)
+        if cancelled:
+            raise asyncio.CancelledError()
+
+    @asynccontextmanager
+    async def _source(self, ctx: DeploymentContext, log) -> AsyncIterator[DeploymentContext]:
+        """Lease the repository mirror and resolve the deployment's commit in it."""
+        if not ctx.repository_url or not DEPLOY_FETCH_SOURCE:
+            yield ctx
+            return
+        await log(f"Fetching {redact_url(ctx.repository_url)}\n")
+        try:
+            # Leased first: eviction cannot remove the mirror between resolving and building
+            async with repository_mirrors.lease(ctx.repository_url) as path:
+                sha = await repository_mirrors.resolve(ctx.repository_url, ctx.commit_sha)
+                await log(f"Commit {sha}\n")
+                if sha != ctx.commit_sha:
+                    async with AsyncSessionLocal() as db:
+                        await db.execute(
+                            update(Deployment).where(Deployment.id == ctx.deployment_id).values(commit_sha=sha)
+                        )
+                        await db.commit()
+                yield replace(ctx, commit_sha=sha, mirror_path=path)
+        except MirrorError as e:
+            raise ExecutorError(str(e))
+
+    async def _heartbeat(self, ctx: DeploymentContext):
+        while True:
+            await asyncio.sleep(DEPLOY_HEARTBEAT_SECONDS)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(
+                        update(Deployment)
+                        .where(Deployment.id == ctx.deployment_id)
+                        .values(heartbeat_at=func.now())
+                    )
+                    await db.commit()
+            except Exception:
+                logger.exception("Heartbeat failed for deployment %s", ctx.deployment_id)
+
+    async def _set_status(self, ctx: DeploymentContext, status: str):
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Deployment)
+                .where(Deployment.id == ctx.deployment_id)
+                .values(status=status, heartbeat_at=func.now())
+            )
+            await db.commit()
+
+    async def _finish(self, ctx: DeploymentContext, status: str, duration: float):
+        async with AsyncSessionLocal() as db:
+            # Reaped while still running: its "failed" is replaced, so take it out of the stats
+            previous = (
+                await db.execute(
+                    select(*_OUTCOME_COLUMNS)
+                    .where(Deployment.id == ctx.deployment_id)
+                    .with_for_update()
+                )
+            ).first()
+            finished = (
+                await db.execute(
+                    update(Deployment)
+                    .where(Deployment.id == ctx.deployment_id)
+                    .values(
+                        status=status,
+                        finished_at=func.now(),
+                        duration_seconds=int(round(duration)),
+                    )
+                    .returning(*_OUTCOME_COLUMNS)
+                )
+            ).first()
+            if finished is not None:
+                retracted = [Outcome(*previous)] if previous.status in COUNTED_STATUSES else []
+                await record_outcomes(db, [Outcome(*finished)], retracted)
+            if status == "success":
+                await db.execute(
+                    update(Project)
+                    .where(Project.id == ctx.project_id)
+                    .values(status="active", last_deployed_at=func.now())
+                )
+            await db.commit()
+        logger.info("Deployment %s finished: %s in %.1fs", ctx.deployment_id, status, duration)
@@ -0,0 +1,152 @@
+"""
+Pluggable deployment executors.
+
+An executor runs the build and deploy phases of one deployment.  Each phase
+reports output through a ``log`` callback and signals failure by raising
+``ExecutorError``.  Executors are looked up by name (DEPLOY_EXECUTOR) in the
+registry below; ``register_executor`` adds new ones.
+"""
+import asyncio
+import codecs
+import json
+import os
+import signal
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+LogFn = Callable[[str], Awaitable[None]]
+
+DEPLOY_STEP_TIMEOUT_SECONDS = float(os.getenv("DEPLOY_STEP_TIMEOUT_SECONDS", "1800"))
+_READ_SIZE = 65536
+
+
+class ExecutorError(Exception):
+    """A build or deploy step failed."""
+
+
+@dataclass(frozen=True)
+class DeploymentContext:
+    deployment_id: uuid.UUID
+    project_id: uuid.UUID
+    project_name: str
+    repository_url: Optional[str]
+    commit_sha: Optional[str]
+    # Local bare mirror of repository_url (see repo_mirror), leased for the run
+    mirror_path: Optional[str] = None
+
+
+class DeploymentExecutor:
+    """Base class; subclasses implement the two phases."""
+
+    async def build(self, ctx: DeploymentContext, log: LogFn) -> None:
+        raise NotImplementedError
+
+    async def deploy(self, ctx: DeploymentContext, log: LogFn) -> None:
+        raise NotImplementedError
+
+
+class LocalShellExecutor(DeploymentExecutor):
+    """
+    Runs shell commands on the backend host, one after another, streaming
+    their combined stdout/stderr to the log.  Commands see the deployment in
+    DEPLOYX_* environment variables.  A command that runs past the timeout
+    is killed together with everything it started.  Mostly useful for
+    tests and single-host setups.
+    """
+
+    def __init__(
+        self,
+        build_commands: List[str],
+        deploy_commands: List[str],
+        cwd: Optional[str] = None,
+        timeout: float = DEPLOY_STEP_TIMEOUT_SECONDS,
+    ):
+        self.build_commands = build_commands
+        self.deploy_commands = deploy_commands
+        self.cwd = cwd
+        self.timeout = timeout
+
+    @classmethod
+    def from_env(cls) -> "LocalShellExecutor":
+        return cls(
+            build_commands=json.loads(os.getenv("DEPLOY_BUILD_COMMANDS", "[]")),
+            deploy_commands=json.loads(os.getenv("DEPLOY_DEPLOY_COMMANDS", "[]")),
+            cwd=os.getenv("DEPLOY_WORKDIR") or None,
+        )
+
+    async def build(self, ctx: DeploymentContext, log: LogFn) -> None:
+        for command in self.build_commands:
+            await self._run(command, ctx, log)
+
+    async def deploy(self, ctx: DeploymentContext, log: LogFn) -> None:
+        for command in self.deploy_commands:
+            await self._run(command, ctx, log)
+
+    async def _run(self, command: str, ctx: DeploymentContext, log: LogFn):
+        env = dict(
+            os.environ,
+            DEPLOYX_DEPLOYMENT_ID=str(ctx.deployment_id),
+            DEPLOYX_PROJECT_ID=str(ctx.project_id),
+            DEPLOYX_PROJECT_NAME=ctx.project_name,
+            DEPLOYX_REPOSITORY_URL=ctx.repository_url or "",
+            DEPLOYX_COMMIT_SHA=ctx.commit_sha or "",
+            DEPLOYX_MIRROR_PATH=ctx.mirror_path or "",
+        )
+        await log(f"$ {command}\n")
+        proc = await asyncio.create_subprocess_shell(
+            command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            cwd=self.cwd,
+            env=env,
+            # Own process group, so a kill reaches the commands the shell started
+            start_new_session=True,
+        )
+
+        async def pump():
+            # Fixed-size reads: a single huge line must not exceed a readline limit
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            while True:
+                data = await proc.stdout.read(_READ_SIZE)
+                if not data:
+                    break
+                await log(decoder.decode(data))
+            await log(decoder.decode(b"", final=True))
+            return await proc.wait()
+
+        try:
+            returncode = await asyncio.wait_for(pump(), self.timeout)
+        except asyncio.TimeoutError:
+            _kill_group(proc)
+            await proc.wait()
+            raise ExecutorError(f"Command timed out after {self.timeout:g}s: {command}")
+        except asyncio.CancelledError:
+            _kill_group(proc)
+            raise
+        if returncode != 0:
+            raise ExecutorError(f"Command exited with status {returncode}: {command}")
+
+
+def _kill_group(proc: asyncio.subprocess.Process):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+EXECUTORS: Dict[str, Callable[[], DeploymentExecutor]] = {
+    "shell": LocalShellExecutor.from_env,
+}
+
+
+def register_executor(name: str, factory: Callable[[], DeploymentExecutor]):
+    """Make an executor available under DEPLOY_EXECUTOR=*name*."""
+    EXECUTORS[name] = factory
+
+
+def get_executor(name: str) -> DeploymentExecutor:
+    try:
+        return EXECUTORS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown deployment executor: {name}")
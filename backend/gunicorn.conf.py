@@ -0,0 +1,68 @@
+"""
+Production server: gunicorn managing uvicorn workers.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+The app is imported once in the master (preload_app) and forked, so
+workers start without re-importing it.  Nothing at import time touches the
+database; the schema comes from ``alembic upgrade head``, run before this.
+
+Each worker has its own connection pool, sized from DB_MAX_CONNECTIONS /
+WEB_CONCURRENCY (see database.py).  On SIGTERM, workers stop accepting
+connections, finish in-flight requests and run the app's shutdown (the
+deployment worker and audit writer drain) within GRACEFUL_TIMEOUT seconds.
+"""
+import multiprocessing
+import os
+import shutil
+
+from uvicorn_worker import UvicornWorker
+
+workers = int(os.getenv("WEB_CONCURRENCY") or multiprocessing.cpu_count())
+# database.py sizes each worker's pool from this
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+# Metrics from all workers are aggregated through this directory.  It must
+# exist before the app (and prometheus_client) is imported, which preloading
+# does before any server hook runs; samples from a previous run are cleared.
+if workers > 1:
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/deployx-metrics")
+if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+preload_app = True
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+accesslog = "-"
+
+
+class Worker(UvicornWorker):
+    # Leave a little of gunicorn's graceful window for the app's shutdown
+    # after open connections (log streams) are closed.
+    CONFIG_KWARGS = {
+        **UvicornWorker.CONFIG_KWARGS,
+        "timeout_graceful_shutdown": max(graceful_timeout - 5, 1),
+    }
+
+
+worker_class = Worker
+
+
+def post_fork(server, worker):
+    from database import engine, read_engine
+
+    # The pools are empty at fork time; this makes sure no connection is
+    # shared.  The pool metrics follow the new pool (see metrics.instrument_pool).
+    engine.sync_engine.dispose(close=False)
+    if read_engine is not None:
+        read_engine.sync_engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,171 @@
+"""
+Per-project hostnames on the user's tunnel.
+
+Every project is served at ``<project.subdomain>.<domain>`` through the
+tunnel that provisioning created, next to the dashboard's own hostname.
+Cloudflare only lets the ingress rule set be replaced whole, so
+``sync_tunnel_ingress``:
+
+* computes the desired hostnames from the database;
+* diffs them against the hostnames we last wrote, cached on the
+  CloudflareConfig row (fetched from Cloudflare once if unknown);
+* creates CNAMEs only for added hostnames;
+* writes the rule set with a single PUT, and nothing at all when the diff
+  is empty.
+
+Adding a project therefore costs one DNS call and one PUT, however many
+projects the tunnel already serves.  Removed hostnames only lose their
+rule; their CNAME stays, and the tunnel's catch-all answers 404.
+
+No lock or connection is held while Cloudflare is called.  The diff is
+computed from a short read; the result is written back only if the row's
+ingress_version is still the one read.  If another worker wrote in
+between, its PUT may have landed before or after ours, so the sync goes
+round again with fresh data and re-sends the rule set.  Syncs requested
+while one is running in this process are coalesced into the next one.
+"""
+import asyncio
+import logging
+import re
+from typing import Dict, Set
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cloudflare_scheduler import CloudflareUnavailable
+from cloudflare_service import CloudflareService
+from database import AsyncSessionLocal
+from models import CloudflareConfig, Project
+
+logger = logging.getLogger("deployx.ingress")
+
+_NON_LABEL = re.compile(r"[^a-z0-9]+")
+
+
+class IngressSyncFailed(Exception):
+    """Cloudflare did not accept a DNS record or the ingress rules."""
+
+
+def subdomain_for(name: str) -> str:
+    """A DNS label derived from a project name."""
+    return _NON_LABEL.sub("-", name.lower()).strip("-")[:50].strip("-") or "project"
+
+
+async def _desired_hostnames(db: AsyncSession, cfg: CloudflareConfig) -> Set[str]:
+    subdomains = await db.scalars(
+        select(Project.subdomain).where(Project.user_id == cfg.user_id, Project.subdomain.isnot(None))
+    )
+    return {f"{cfg.subdomain}.{cfg.domain}"} | {f"{s}.{cfg.domain}" for s in subdomains}
+
+
+# ----------------------------------------------------------------------
+#  Sync
+# ----------------------------------------------------------------------
+class _SyncState:
+    __slots__ = ("lock", "requested", "completed", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.requested = 0
+        self.completed = 0
+        self.users = 0  # callers holding or waiting for the lock
+
+
+_states: Dict[object, _SyncState] = {}
+
+# Rounds a sync makes before giving up on other workers' concurrent writes
+_MAX_ATTEMPTS = 5
+
+
+async def sync_tunnel_ingress(user_id) -> bool:
+    """Bring the user's tunnel ingress in line with their projects.
+
+    Returns False if the user has no active tunnel.  Raises
+    IngressSyncFailed if Cloudflare rejects a change or cannot be reached;
+    the cached rule set is then left as it was, so the next sync retries
+    the same diff.
+    """
+    state = _states.setdefault(user_id, _SyncState())
+    state.requested += 1
+    state.users += 1
+    ticket = state.requested
+    try:
+        async with state.lock:
+            if state.completed >= ticket:
+                return True  # a sync that started after our request covered it
+            target = state.requested
+            try:
+                synced = await _sync(user_id)
+            except CloudflareUnavailable as e:
+                raise IngressSyncFailed(str(e)) from e
+            state.completed = target
+            return synced
+    finally:
+        state.users -= 1
+        if not state.users and _states.get(user_id) is state:
+            del _states[user_id]
+
+
+async def _sync(user_id) -> bool:
+    resend = False
+    for _ in range(_MAX_ATTEMPTS):
+        async with AsyncSessionLocal() as db:
+            cfg = (
+                await db.execute(
+                    select(CloudflareConfig)
+                    .where(CloudflareConfig.user_id == user_id, CloudflareConfig.is_active.is_(True))
+                )
+            ).scalars().first()
+            if not cfg or not cfg.tunnel_id or not cfg.domain:
+                return False
+            desired = await _desired_hostnames(db, cfg)
+
+        cf = CloudflareService(cfg.api_token)
+        account_id = cfg.account_id or await cf.get_account_id()
+        if cfg.ingress_hostnames is not None:
+            current = set(cfg.ingress_hostnames)
+        else:
+            current = set(await cf.get_tunnel_hostnames(account_id, cfg.tunnel_id) or ())
+
+        added, removed = desired - current, current - desired
+        if added or removed or resend:
+            created = await asyncio.gather(
+                *(cf.create_dns_record(cfg.zone_id, host, cfg.tunnel_id) for host in sorted(added))
+            )
+            failed = [host for host, ok in zip(sorted(added), created) if not ok]
+            if failed:
+                raise IngressSyncFailed(f"Could not create DNS records for {', '.join(failed)}")
+            if not await cf.configure_tunnel_routing(account_id, cfg.tunnel_id, desired):
+                raise IngressSyncFailed("Could not update tunnel ingress")
+            logger.info(
+                "Tunnel %s ingress: +%d -%d hostnames (%d total)",
+                cfg.tunnel_id, len(added), len(removed), len(desired),
+            )
+        elif cfg.account_id == account_id and cfg.ingress_hostnames == sorted(desired):
+            return True
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(CloudflareConfig)
+                .where(CloudflareConfig.id == cfg.id, CloudflareConfig.ingress_version == cfg.ingress_version)
+                .values(
+                    account_id=account_id,
+                    ingress_hostnames=sorted(desired),
+                    ingress_version=CloudflareConfig.ingress_version + 1,
+                )
+            )
+            await db.commit()
+        if result.rowcount:
+            return True
+        resend = True
+    raise IngressSyncFailed(f"Tunnel ingress kept changing during {_MAX_ATTEMPTS} sync attempts")
+
+
+async def sync_tunnel_ingress_quietly(user_id):
+    """Background-task form of ``sync_tunnel_ingress``: log failures instead of raising."""
+    try:
+        await sync_tunnel_ingress(user_id)
+    except IngressSyncFailed as e:
+        logger.warning("Ingress sync for user %s failed: %s", user_id, e)
+    except Exception:
+        logger.exception("Ingress sync for user %s failed", user_id)
@@ -1,34 +1,91 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Response, BackgroundTasks, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from sqlalchemy import func as sql_func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, func as sql_func, insert, select, text, tuple_
+from sqlalchemy.exc import IntegrityError
+from contextlib import asynccontextmanager
 from datetime import timedelta, datetime, timezone
-from typing import List
-import os, json, logging
+from typing import List, Literal, Optional
+import asyncio, os, json, logging, uuid
 
-from database import engine, Base, get_db
-from models import User, CloudflareConfig, AuditLog, Project, Deployment
+from database import (
+    ReadYourWritesMiddleware, engine, get_db, get_read_db, read_engine, replica_monitor, wrote_recently,
+)
+from models import User, CloudflareConfig, AuditLog, Project, Deployment, ProvisioningJob
 from schemas import (
     UserCreate, UserResponse, Token,
     CloudflareConfigCreate, CloudflareConfigResponse,
-    TunnelSetupRequest, TunnelSetupResponse,
-    ProjectCreate, ProjectResponse,
-    PlatformStatus, ServiceStatus, AuditLogResponse,
+    TunnelSetupRequest, ProvisioningJobResponse,
+    ProjectCreate, ProjectResponse, ProjectBatchCreate, ProjectBatchDelete, ProjectBatchDeleteResponse,
+    DeploymentCreate, DeploymentResponse, ProjectDeploymentStats,
+    WebhookConfigCreate, WebhookConfigResponse, WebhookDeliveryResponse,
+    PlatformStatus, AuditLogResponse,
 )
 from auth import (
     authenticate_user, create_access_token, get_current_user,
     ACCESS_TOKEN_EXPIRE_MINUTES,
 )
-from password import get_password_hash
-from cloudflare_service import CloudflareService
+from password import PasswordHasherBusy, shutdown_password_pool
+from cloudflare_scheduler import CLOUDFLARE_BREAKER_RESET_SECONDS, CloudflareUnavailable
+from cloudflare_service import CloudflareService, close_http_client
 from crud import create_user, get_user_by_email, get_user_by_username
+from audit import audit_writer, run_audit_maintenance
+from audit_export import EXPORT_MEDIA_TYPES, stream_audit_export
+from metrics import METRICS_TOKEN, MetricsMiddleware, render_metrics
+from admission import AdmissionMiddleware
+from profiling import ProfilingMiddleware
+from pagination import decode_cursor, encode_cursor
+from serialization import FastJSONResponse, columns_for, row_response, rows_response
+from queries import (
+    Principal, cloudflare_config, owned_deployment, owned_project, owns_project,
+    project_deployments,
+)
+from platform_status import platform_status_cache
+from provisioning import run_provisioning_job
+from ingress import subdomain_for, sync_tunnel_ingress_quietly
+from deploy_logs import iter_log
+from deploy_stats import project_stats
+from deploy_worker import DeploymentWorker, DEPLOY_WORKER_ENABLED, DEPLOY_EXECUTOR, queue_deployment
+from webhooks import (
+    WEBHOOK_COALESCE_SECONDS, link_delivery, new_secret, parse_push, read_body, record_delivery,
+    run_webhook_maintenance, verify_signature,
+)
+from executors import get_executor
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("deployx")
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The schema is managed by Alembic (alembic upgrade head), not created here,
+    # and the container creates the audit partitions once before the workers start
+    maintenance = asyncio.create_task(run_audit_maintenance())
+    webhook_maintenance = asyncio.create_task(run_webhook_maintenance())
+    await replica_monitor.start()
+    await audit_writer.start()
+    await platform_status_cache.start()
+    app.state.deploy_worker = None
+    if DEPLOY_WORKER_ENABLED:
+        app.state.deploy_worker = DeploymentWorker(get_executor(DEPLOY_EXECUTOR))
+        await app.state.deploy_worker.start()
+    yield
+    if app.state.deploy_worker:
+        await app.state.deploy_worker.stop()
+    maintenance.cancel()
+    webhook_maintenance.cancel()
+    await platform_status_cache.stop()
+    await audit_writer.stop()
+    shutdown_password_pool()
+    await close_http_client()
+    await replica_monitor.stop()
+    await engine.dispose()
+    if read_engine is not None:
+        await read_engine.dispose()
+
 
 app = FastAPI(
     title="DeployX API",
@@ -36,6 +93,8 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/api/docs",
     openapi_url="/api/openapi.json",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 # ---------------------------------------------------------------------------
@@ -47,16 +106,42 @@ try:
 except Exception:
     cors_origins = ["*"]
 
+app.add_middleware(ReadYourWritesMiddleware)
+# Inside CORS, so 503s from admission control still carry CORS headers
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=cors_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfilingMiddleware)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
 
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    """Shed auth load instead of queueing unbounded bcrypt work."""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Authentication service busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(CloudflareUnavailable)
+async def cloudflare_unavailable_handler(request: Request, exc: CloudflareUnavailable):
+    """Cloudflare is rate limiting or down: tell the client to retry, not a 500."""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(int(CLOUDFLARE_BREAKER_RESET_SECONDS))},
+    )
+
 # ========================  HEALTH / STATUS  ================================
 
 @app.get("/")
@@ -66,80 +151,69 @@ async def root():
 
 
 @app.get("/api/health")
-async def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_db)):
     """Deep health check including database connectivity"""
     try:
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
         db_status = "healthy"
     except Exception:
         db_status = "unhealthy"
     return {"api": "healthy", "database": db_status}
 
 
+@app.get("/api/metrics", include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus scrape endpoint."""
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 @app.get("/api/platform/status", response_model=PlatformStatus)
-async def platform_status(db: Session = Depends(get_db)):
+async def platform_status(if_none_match: Optional[str] = Header(None)):
     """
     Public endpoint — returns onboarding state so the frontend can decide
     whether to show register, tunnel-setup, or the full dashboard.
+    Served from the in-process status cache; honours If-None-Match.
     """
-    user_count = db.query(sql_func.count(User.id)).scalar() or 0
-    has_admin = user_count > 0
-
-    tunnel_cfg = db.query(CloudflareConfig).filter(CloudflareConfig.is_active == True).first()
-    has_tunnel = tunnel_cfg is not None
-    public_url = f"https://{tunnel_cfg.subdomain}.{tunnel_cfg.domain}" if tunnel_cfg and tunnel_cfg.domain else None
-
-    services = [
-        ServiceStatus(name="Frontend (Next.js)", status="healthy", port=3000),
-        ServiceStatus(name="Backend (FastAPI)", status="healthy", port=3001),
-        ServiceStatus(name="Database (PostgreSQL)", status="healthy", port=3002),
-        ServiceStatus(name="Reverse Proxy (Traefik)", status="healthy", port=80),
-        ServiceStatus(
-            name="Cloudflare Tunnel",
-            status="healthy" if has_tunnel else "not configured",
-        ),
-    ]
-
-    return PlatformStatus(
-        platform="DeployX",
-        version="1.0.0",
-        has_admin=has_admin,
-        has_tunnel=has_tunnel,
-        services=services,
-        public_url=public_url,
-    )
+    snapshot = await platform_status_cache.get()
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if if_none_match and snapshot.etag in (t.strip() for t in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
 
 
 # ========================  AUTH  ===========================================
 
 @app.post("/api/auth/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user: UserCreate, request: Request, db: Session = Depends(get_db)):
+async def register(user: UserCreate, request: Request, db: AsyncSession = Depends(get_db)):
     """Register a new user (first user becomes superuser/admin)."""
-    db_user = get_user_by_email(db, user.email)
+    db_user = await get_user_by_email(db, user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    db_user = get_user_by_username(db, user.username)
+    db_user = await get_user_by_username(db, user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already taken")
 
     # First registered user is the admin
-    user_count = db.query(sql_func.count(User.id)).scalar() or 0
-    new_user = create_user(db, user, is_superuser=(user_count == 0))
+    user_count = await db.scalar(select(sql_func.count(User.id))) or 0
+    new_user = await create_user(db, user, is_superuser=(user_count == 0))
+    platform_status_cache.invalidate()
 
-    db.add(AuditLog(
+    await audit_writer.record(
         user_id=new_user.id, action="user_registered",
         resource_type="user", resource_id=str(new_user.id),
         ip_address=request.client.host if request.client else None,
-    ))
-    db.commit()
+    )
     return new_user
 
 
 @app.post("/api/auth/token", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """Login and receive a JWT access token."""
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -148,114 +222,132 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
         )
 
     token = create_access_token(
-        data={"sub": user.username},
+        data={"sub": user.username, "uid": str(user.id)},
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
     )
 
-    db.add(AuditLog(user_id=user.id, action="user_login", resource_type="user", resource_id=str(user.id)))
-    db.commit()
+    await audit_writer.record(user_id=user.id, action="user_login", resource_type="user", resource_id=str(user.id))
     return {"access_token": token, "token_type": "bearer"}
 
 
 @app.get("/api/auth/me", response_model=UserResponse)
-async def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(current_user: Principal = Depends(get_current_user)):
     """Get current authenticated user details."""
     return current_user
 
 
 # ========================  CLOUDFLARE TUNNEL  ==============================
 
-@app.post("/api/cloudflare/setup", response_model=TunnelSetupResponse)
+@app.post("/api/cloudflare/setup", response_model=ProvisioningJobResponse, status_code=202)
 async def setup_cloudflare_tunnel(
     config: TunnelSetupRequest,
     request: Request,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    background_tasks: BackgroundTasks,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
     """
-    Automates Cloudflare Tunnel provisioning:
-    1. Validates API token  2. Creates tunnel  3. Adds DNS CNAME
-    4. Configures tunnel routing → Traefik  5. Persists to DB
+    Starts Cloudflare Tunnel provisioning in the background and returns the
+    job immediately; poll ``GET /api/cloudflare/setup/{job_id}`` for progress.
+    Submitting the same domain/subdomain again resumes an unfinished job
+    instead of creating another tunnel.
     """
-    cf = CloudflareService(config.api_token)
+    job = (
+        await db.execute(
+            select(ProvisioningJob)
+            .where(
+                ProvisioningJob.user_id == current_user.id,
+                ProvisioningJob.domain == config.domain,
+                ProvisioningJob.subdomain == config.subdomain,
+                ProvisioningJob.status != "success",
+            )
+            .order_by(ProvisioningJob.created_at.desc())
+            .limit(1)
+        )
+    ).scalars().first()
+    if job:
+        job.api_token = config.api_token
+    else:
+        job = ProvisioningJob(
+            user_id=current_user.id, status="pending", steps={},
+            api_token=config.api_token, domain=config.domain, subdomain=config.subdomain,
+            tunnel_name=f"deployx-{current_user.username}",
+        )
+        db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    # Background tasks run before dependency teardown; release the pooled
+    # connection now so the job does not wait on the one this request holds.
+    await db.close()
+
+    background_tasks.add_task(
+        run_provisioning_job, job.id, request.client.host if request.client else None
+    )
+    return job
 
-    try:
-        # Validate token & get zone
-        zone_id = await cf.get_zone_id(config.domain)
-        if not zone_id:
-            raise HTTPException(status_code=400, detail=f"Zone not found for {config.domain}")
-
-        tunnel_name = f"deployx-{current_user.username}"
-        tunnel_id, tunnel_token = await cf.create_tunnel(tunnel_name, zone_id)
-
-        full_domain = f"{config.subdomain}.{config.domain}"
-        await cf.create_dns_record(zone_id, config.subdomain, tunnel_id)
-
-        # Get account id for routing
-        account_id = await cf.get_account_id()
-        if account_id:
-            await cf.configure_tunnel_routing(account_id, tunnel_id, full_domain)
-
-        # Upsert config in DB
-        cfg = db.query(CloudflareConfig).filter(CloudflareConfig.user_id == current_user.id).first()
-        values = dict(
-            api_token=config.api_token, zone_id=zone_id, domain=config.domain,
-            subdomain=config.subdomain, tunnel_id=tunnel_id,
-            tunnel_name=tunnel_name, tunnel_token=tunnel_token, is_active=True,
+
+async def _get_job(db: AsyncSession, job_id: uuid.UUID, user: Principal) -> ProvisioningJob:
+    job = (
+        await db.execute(
+            select(ProvisioningJob).where(ProvisioningJob.id == job_id, ProvisioningJob.user_id == user.id)
         )
-        if cfg:
-            for k, v in values.items():
-                setattr(cfg, k, v)
-        else:
-            cfg = CloudflareConfig(user_id=current_user.id, **values)
-            db.add(cfg)
+    ).scalars().first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Provisioning job not found")
+    return job
 
-        db.commit()
-        db.refresh(cfg)
 
-        # Persist tunnel token to .env so cloudflared container can pick it up
-        await cf.update_env_file(tunnel_token)
+@app.get("/api/cloudflare/setup/{job_id}", response_model=ProvisioningJobResponse)
+async def get_provisioning_job(
+    job_id: uuid.UUID,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Return the progress of a tunnel provisioning job."""
+    return await _get_job(db, job_id, current_user)
 
-        db.add(AuditLog(
-            user_id=current_user.id, action="tunnel_created",
-            resource_type="tunnel", resource_id=tunnel_id,
-            details={"subdomain": config.subdomain, "domain": config.domain},
-            ip_address=request.client.host if request.client else None,
-        ))
-        db.commit()
 
-        return TunnelSetupResponse(
-            success=True, message="Cloudflare tunnel configured successfully",
-            tunnel_id=tunnel_id, subdomain=full_domain,
-            public_url=f"https://{full_domain}",
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.exception("Tunnel setup failed")
-        raise HTTPException(status_code=500, detail=f"Tunnel setup failed: {e}")
+@app.post("/api/cloudflare/setup/{job_id}/resume", response_model=ProvisioningJobResponse, status_code=202)
+async def resume_provisioning_job(
+    job_id: uuid.UUID,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Resume a failed provisioning job from the step where it stopped."""
+    job = await _get_job(db, job_id, current_user)
+    if job.status == "success":
+        raise HTTPException(status_code=409, detail="Provisioning job already completed")
+    await db.close()
+    background_tasks.add_task(
+        run_provisioning_job, job.id, request.client.host if request.client else None
+    )
+    return job
 
 
 @app.get("/api/cloudflare/config", response_model=CloudflareConfigResponse)
-async def get_cloudflare_config(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_cloudflare_config(current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
     """Return the current Cloudflare configuration."""
-    cfg = db.query(CloudflareConfig).filter(CloudflareConfig.user_id == current_user.id).first()
+    cfg = await cloudflare_config(db, current_user.id)
     if not cfg:
         raise HTTPException(status_code=404, detail="Cloudflare configuration not found")
-    return cfg
+    return row_response(cfg)
 
 
 @app.delete("/api/cloudflare/tunnel/{tunnel_id}")
 async def delete_tunnel(
     tunnel_id: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
     """Delete a Cloudflare tunnel and mark config inactive."""
-    cfg = db.query(CloudflareConfig).filter(
-        CloudflareConfig.user_id == current_user.id,
-        CloudflareConfig.tunnel_id == tunnel_id,
-    ).first()
+    cfg = (
+        await db.execute(select(CloudflareConfig).where(
+            CloudflareConfig.user_id == current_user.id,
+            CloudflareConfig.tunnel_id == tunnel_id,
+        ))
+    ).scalars().first()
     if not cfg:
         raise HTTPException(status_code=404, detail="Tunnel not found")
 
@@ -266,67 +358,473 @@ async def delete_tunnel(
         logger.warning("Remote tunnel deletion failed: %s", e)
 
     cfg.is_active = False
-    db.add(AuditLog(user_id=current_user.id, action="tunnel_deleted", resource_type="tunnel", resource_id=tunnel_id))
-    db.commit()
+    await db.commit()
+    platform_status_cache.invalidate()
+    await audit_writer.record(user_id=current_user.id, action="tunnel_deleted", resource_type="tunnel", resource_id=tunnel_id)
     return {"message": "Tunnel deleted successfully"}
 
 
 # ========================  PROJECTS  =======================================
 
+PROJECT_PAGE_MAX = int(os.getenv("PROJECT_PAGE_MAX", "200"))
+
+# Sort keys for GET /api/projects; each is paired with id for keyset paging
+_PROJECT_SORT_KEYS = {
+    "created_at": (Project.created_at, datetime.fromisoformat),
+    "name": (Project.name, str),
+}
+
+
+async def _assign_subdomains(db: AsyncSession, user: Principal, projects: List[Project]):
+    """Give each new project a free subdomain, with one query for the whole batch.
+
+    Explicit subdomains that are taken (by another project, by the tunnel's
+    own hostname, or twice in the batch) raise 409; derived ones get an id
+    suffix instead.
+    """
+    wanted = {p.subdomain or subdomain_for(p.name) for p in projects}
+    taken = set(await db.scalars(
+        select(Project.subdomain).where(Project.user_id == user.id, Project.subdomain.in_(wanted))
+    ))
+    taken.update(await db.scalars(
+        select(CloudflareConfig.subdomain).where(CloudflareConfig.user_id == user.id)
+    ))
+    conflicts = []
+    for p in projects:
+        if p.subdomain is not None:
+            if p.subdomain in taken:
+                conflicts.append(p.subdomain)
+        else:
+            p.subdomain = subdomain_for(p.name)
+            if p.subdomain in taken:
+                p.subdomain = f"{p.subdomain}-{p.id.hex[:8]}"
+        taken.add(p.subdomain)
+    if conflicts:
+        raise HTTPException(status_code=409, detail=f"Subdomain already in use: {', '.join(conflicts)}")
+
+
 @app.post("/api/projects", response_model=ProjectResponse, status_code=201)
 async def create_project(
     project: ProjectCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    background_tasks: BackgroundTasks,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
-    """Create a new project."""
-    p = Project(user_id=current_user.id, **project.model_dump())
+    """
+    Create a new project, served at ``<subdomain>.<tunnel domain>``.  The
+    subdomain defaults to one derived from the name; the tunnel's ingress is
+    updated in the background.
+    """
+    p = Project(id=uuid.uuid4(), user_id=current_user.id, **project.model_dump())
+    await _assign_subdomains(db, current_user, [p])
     db.add(p)
-    db.commit()
-    db.refresh(p)
+    try:
+        await db.commit()
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="Subdomain already in use")
+    await db.refresh(p)
+    await db.close()
+    background_tasks.add_task(sync_tunnel_ingress_quietly, current_user.id)
     return p
 
 
+@app.post("/api/projects/batch", response_model=List[ProjectResponse], status_code=201)
+async def create_projects(
+    batch: ProjectBatchCreate,
+    background_tasks: BackgroundTasks,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Create up to PROJECT_BATCH_MAX projects in one transaction: one lookup
+    for subdomain clashes, one multi-row INSERT, and one ingress update for
+    the whole batch.  Nothing is created if any project is rejected.
+    """
+    projects = [Project(id=uuid.uuid4(), user_id=current_user.id, **p.model_dump()) for p in batch.projects]
+    await _assign_subdomains(db, current_user, projects)
+    try:
+        result = await db.execute(
+            insert(Project).returning(
+                *columns_for(Project, ProjectResponse), sort_by_parameter_order=True
+            ),
+            [
+                dict(id=p.id, user_id=p.user_id, name=p.name, description=p.description,
+                     repository_url=p.repository_url, subdomain=p.subdomain)
+                for p in projects
+            ],
+        )
+        rows = result.all()
+        await db.commit()
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="Subdomain already in use")
+    await db.close()
+    background_tasks.add_task(sync_tunnel_ingress_quietly, current_user.id)
+    return rows_response(rows, status_code=201)
+
+
+@app.post("/api/projects/batch/delete", response_model=ProjectBatchDeleteResponse)
+async def delete_projects(
+    batch: ProjectBatchDelete,
+    background_tasks: BackgroundTasks,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Delete up to PROJECT_BATCH_MAX projects with a single statement.  Ids
+    that do not exist or belong to someone else are reported in
+    ``not_found``.
+    """
+    ids = list(dict.fromkeys(batch.ids))
+    deleted = list(await db.scalars(
+        delete(Project)
+        .where(Project.user_id == current_user.id, Project.id.in_(ids))
+        .returning(Project.id)
+    ))
+    await db.commit()
+    await db.close()
+    if deleted:
+        background_tasks.add_task(sync_tunnel_ingress_quietly, current_user.id)
+    gone = set(deleted)
+    return {"deleted": deleted, "not_found": [i for i in ids if i not in gone]}
+
+
 @app.get("/api/projects", response_model=List[ProjectResponse])
-async def list_projects(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """List all projects for the current user."""
-    return db.query(Project).filter(Project.user_id == current_user.id).order_by(Project.created_at.desc()).all()
+async def list_projects(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    sort: Literal["-created_at", "created_at", "-name", "name"] = "-created_at",
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    List the current user's projects, optionally only those with ``status``,
+    ordered by ``sort`` (prefix ``-`` for descending).  Pages are capped at
+    PROJECT_PAGE_MAX entries; when more exist the ``X-Next-Cursor`` response
+    header holds the cursor for the next page (with the same filter and sort).
+    """
+    limit = max(1, min(limit, PROJECT_PAGE_MAX))
+    descending = sort.startswith("-")
+    key, parse = _PROJECT_SORT_KEYS[sort.lstrip("-")]
+
+    query = select(*columns_for(Project, ProjectResponse)).where(Project.user_id == current_user.id)
+    if status_filter:
+        query = query.where(Project.status == status_filter)
+    if cursor:
+        value, last_id = decode_cursor(cursor, parse, uuid.UUID)
+        row_key, bound = tuple_(key, Project.id), tuple_(value, last_id)
+        query = query.where(row_key < bound if descending else row_key > bound)
+    order = (key.desc(), Project.id.desc()) if descending else (key.asc(), Project.id.asc())
+    rows = (await db.execute(query.order_by(*order).limit(limit + 1))).all()
+
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        value = last.created_at.isoformat() if key is Project.created_at else last.name
+        headers["X-Next-Cursor"] = encode_cursor(value, last.id)
+    return rows_response(rows, headers)
 
 
 @app.get("/api/projects/{project_id}", response_model=ProjectResponse)
-async def get_project(project_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_project(project_id: uuid.UUID, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
     """Get a single project by id."""
-    p = db.query(Project).filter(Project.id == project_id, Project.user_id == current_user.id).first()
+    p = await owned_project(db, project_id, current_user.id)
     if not p:
         raise HTTPException(status_code=404, detail="Project not found")
-    return p
+    return row_response(p)
 
 
 @app.delete("/api/projects/{project_id}", status_code=204)
-async def delete_project(project_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def delete_project(
+    project_id: uuid.UUID,
+    background_tasks: BackgroundTasks,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
     """Delete a project."""
-    p = db.query(Project).filter(Project.id == project_id, Project.user_id == current_user.id).first()
+    p = (
+        await db.execute(select(Project).where(Project.id == project_id, Project.user_id == current_user.id))
+    ).scalars().first()
     if not p:
         raise HTTPException(status_code=404, detail="Project not found")
-    db.delete(p)
-    db.commit()
+    await db.delete(p)
+    await db.commit()
+    await db.close()
+    background_tasks.add_task(sync_tunnel_ingress_quietly, current_user.id)
+
+
+# ========================  DEPLOYMENTS  ====================================
+
+async def _get_owned_project(db: AsyncSession, project_id: uuid.UUID, user: Principal) -> Project:
+    p = (
+        await db.execute(select(Project).where(Project.id == project_id, Project.user_id == user.id))
+    ).scalars().first()
+    if not p:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return p
+
+
+@app.post("/api/projects/{project_id}/deployments", response_model=DeploymentResponse, status_code=201)
+async def create_deployment(
+    project_id: uuid.UUID,
+    request: Request,
+    deployment: Optional[DeploymentCreate] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Queue a deployment of a project; a worker picks it up shortly.  If one
+    is already queued, it is retargeted to this commit and runs now.
+    """
+    p = await _get_owned_project(db, project_id, current_user)
+    d = await queue_deployment(db, p.id, current_user.id, deployment.commit_sha if deployment else None)
+    await db.commit()
+    if request.app.state.deploy_worker:
+        request.app.state.deploy_worker.notify()
+    return d
+
+
+@app.get("/api/projects/{project_id}/deployments", response_model=List[DeploymentResponse])
+async def list_deployments(
+    project_id: uuid.UUID,
+    limit: int = 50,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """List a project's most recent deployments."""
+    if not await owns_project(db, project_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Project not found")
+    return rows_response(await project_deployments(db, project_id, max(1, min(limit, 200))))
+
+
+@app.get("/api/projects/{project_id}/stats", response_model=ProjectDeploymentStats)
+async def get_project_stats(
+    project_id: uuid.UUID,
+    granularity: Literal["day", "hour"] = "day",
+    days: int = Query(30, ge=1, le=366),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Deployment statistics for a project over the last *days*: last deploy,
+    success rate, average duration and deploys per day, plus one bucket per
+    UTC day or hour.  Read from the rollups, not the deployment history.
+    """
+    if not await owns_project(db, project_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Project not found")
+    return await project_stats(db, project_id, granularity, days)
+
+
+@app.get("/api/deployments/{deployment_id}", response_model=DeploymentResponse)
+async def get_deployment(
+    deployment_id: uuid.UUID,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Get a single deployment by id."""
+    d = await owned_deployment(db, deployment_id, current_user.id)
+    if not d:
+        raise HTTPException(status_code=404, detail="Deployment not found")
+    return row_response(d)
+
+
+@app.get("/api/deployments/{deployment_id}/logs/stream")
+async def stream_deployment_logs(
+    deployment_id: uuid.UUID,
+    offset: int = 0,
+    follow: bool = True,
+    last_event_id: Optional[str] = Header(None),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Stream a deployment's log as server-sent events, starting at character
+    *offset*.  Each ``log`` event's id is the offset just past its text, so
+    a reconnecting EventSource resumes via Last-Event-ID.  With *follow*,
+    the stream stays open until the deployment finishes and then sends an
+    ``end`` event.
+    """
+    owned = await db.scalar(
+        select(Deployment.id)
+        .join(Project, Project.id == Deployment.project_id)
+        .where(Deployment.id == deployment_id, Project.user_id == current_user.id)
+    )
+    if not owned:
+        raise HTTPException(status_code=404, detail="Deployment not found")
+    if last_event_id and last_event_id.isdigit():
+        offset = int(last_event_id)
+    # The stream reads with its own short sessions; don't hold this one open
+    await db.close()
+
+    async def events():
+        async for end, content in iter_log(deployment_id, max(offset, 0), follow):
+            data = "".join(f"data: {line}\n" for line in content.split("\n"))
+            yield f"id: {end}\nevent: log\n{data}\n"
+        if follow:
+            yield "event: end\ndata: \n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ========================  WEBHOOKS  =======================================
+
+@app.post("/api/projects/{project_id}/webhook", response_model=WebhookConfigResponse)
+async def configure_webhook(
+    project_id: uuid.UUID,
+    request: Request,
+    config: Optional[WebhookConfigCreate] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Enable push webhooks for a project, or rotate their secret.  The secret
+    is returned only here; pushes to other branches than *branch* (if set)
+    are ignored.
+    """
+    p = await _get_owned_project(db, project_id, current_user)
+    p.webhook_secret = new_secret()
+    p.webhook_branch = config.branch if config else None
+    await db.commit()
+    return {
+        "url": str(request.url_for("receive_push_webhook", project_id=p.id)),
+        "secret": p.webhook_secret,
+        "branch": p.webhook_branch,
+    }
+
+
+@app.delete("/api/projects/{project_id}/webhook", status_code=204)
+async def delete_webhook(
+    project_id: uuid.UUID,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Disable push webhooks for a project."""
+    p = await _get_owned_project(db, project_id, current_user)
+    p.webhook_secret = None
+    p.webhook_branch = None
+    await db.commit()
+
+
+@app.post("/api/projects/{project_id}/webhooks/push", response_model=WebhookDeliveryResponse)
+async def receive_push_webhook(
+    project_id: uuid.UUID,
+    request: Request,
+    response: Response,
+    x_hub_signature_256: Optional[str] = Header(None),
+    x_github_event: Optional[str] = Header(None),
+    x_github_delivery: Optional[str] = Header(None, max_length=100),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Receive a push event signed with the project's webhook secret.  Pushes
+    arriving within WEBHOOK_COALESCE_SECONDS of each other deploy once, at
+    the newest commit; a redelivered X-GitHub-Delivery id changes nothing.
+    """
+    body = await read_body(request)
+    project = (
+        await db.execute(
+            select(Project.user_id, Project.webhook_secret, Project.webhook_branch).where(Project.id == project_id)
+        )
+    ).first()
+    if not project or not project.webhook_secret:
+        raise HTTPException(status_code=404, detail="Webhook not found")
+    if not verify_signature(project.webhook_secret, body, x_hub_signature_256):
+        raise HTTPException(status_code=401, detail="Invalid signature")
+    if x_github_event == "ping":
+        return {"status": "pong"}
+    if x_github_event != "push":
+        return {"status": "ignored"}
+    if not x_github_delivery:
+        raise HTTPException(status_code=400, detail="Missing X-GitHub-Delivery header")
+    push = parse_push(body)
+    if push is None or (project.webhook_branch and push.branch != project.webhook_branch):
+        return {"status": "ignored"}
+
+    if not await record_delivery(db, project_id, x_github_delivery):
+        await db.rollback()
+        return {"status": "duplicate"}
+    d = await queue_deployment(db, project_id, project.user_id, push.commit_sha, WEBHOOK_COALESCE_SECONDS)
+    await link_delivery(db, project_id, x_github_delivery, d.id)
+    await db.commit()
+    response.status_code = status.HTTP_202_ACCEPTED
+    return {"status": "queued", "deployment_id": d.id}
 
 
 # ========================  AUDIT LOG  ======================================
 
+AUDIT_LOG_PAGE_MAX = int(os.getenv("AUDIT_LOG_PAGE_MAX", "200"))
+
+
 @app.get("/api/audit-logs", response_model=List[AuditLogResponse])
 async def list_audit_logs(
     limit: int = 50,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    """Return recent audit log entries for the current user."""
-    return (
-        db.query(AuditLog)
-        .filter(AuditLog.user_id == current_user.id)
-        .order_by(AuditLog.created_at.desc())
-        .limit(limit)
-        .all()
+    """
+    Return recent audit log entries for the current user, newest first.
+    Pages are capped at AUDIT_LOG_PAGE_MAX entries; when more exist the
+    ``X-Next-Cursor`` response header holds the cursor for the next page.
+    """
+    limit = max(1, min(limit, AUDIT_LOG_PAGE_MAX))
+    query = select(*columns_for(AuditLog, AuditLogResponse)).where(AuditLog.user_id == current_user.id)
+    if cursor:
+        created_at, last_id = decode_cursor(cursor, datetime.fromisoformat, uuid.UUID)
+        query = query.where(tuple_(AuditLog.created_at, AuditLog.id) < tuple_(created_at, last_id))
+    result = await db.execute(
+        query.order_by(AuditLog.created_at.desc(), AuditLog.id.desc()).limit(limit + 1)
+    )
+    rows = result.all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1].created_at.isoformat(), rows[-1].id)
+    return rows_response(rows, headers)
+
+
+@app.get("/api/audit-logs/export")
+async def export_audit_logs(
+    request: Request,
+    since: datetime,
+    until: Optional[datetime] = None,
+    fmt: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    compress: bool = Query(False, alias="gzip"),
+    current_user: Principal = Depends(get_current_user),
+):
+    """
+    Stream the current user's audit log entries with ``since <= created_at <
+    until`` (default: now), oldest first, as NDJSON or CSV; with ``gzip``
+    the body is a gzip file.  Timestamps without a zone are taken as UTC.
+    The export is read and sent in batches, so it starts at once and any
+    range can be exported.
+    """
+    since, until = (
+        (t if t.tzinfo else t.replace(tzinfo=timezone.utc)).astimezone(timezone.utc)
+        for t in (since, until or datetime.now(timezone.utc))
+    )
+    if since >= until:
+        raise HTTPException(status_code=400, detail="since must be before until")
+
+    await audit_writer.record(
+        user_id=current_user.id, action="audit_logs_exported", resource_type="audit_log",
+        details={"since": since.isoformat(), "until": until.isoformat(), "format": fmt},
+        ip_address=request.client.host if request.client else None,
+    )
+    filename = f"audit-logs-{since:%Y%m%dT%H%M%SZ}-{until:%Y%m%dT%H%M%SZ}.{fmt}" + (".gz" if compress else "")
+    return StreamingResponse(
+        stream_audit_export(current_user.id, since, until, fmt, compress, primary=wrote_recently(request)),
+        media_type="application/gzip" if compress else EXPORT_MEDIA_TYPES[fmt],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": "no-store",
+            "X-Accel-Buffering": "no",
+        },
     )
 
 
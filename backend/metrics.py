@@ -0,0 +1,239 @@
+"""
+Prometheus metrics.
+
+``GET /api/metrics`` exposes:
+
+    deployx_http_requests_total / _request_duration_seconds   per route template
+    deployx_http_requests_in_flight
+    deployx_admission_rejected_total / _queue_wait_seconds    admission control, per route class
+    deployx_db_pool_*                                          SQLAlchemy pool usage and checkout wait
+    deployx_db_read_sessions_total / _replica_lag_seconds      read routing (replica or primary, and why)
+    deployx_cloudflare_call_duration_seconds / _responses_total per CloudflareService method
+    deployx_cloudflare_queue_wait_seconds / _retries_total     request scheduling (cloudflare_scheduler.py)
+    deployx_cloudflare_rejected_total / _circuit_open
+    deployx_password_hash_seconds                              bcrypt work, by operation
+    deployx_jwt_decode_seconds
+    deployx_cache_requests_total / _entries                    in-process caches (principals, Cloudflare lookups)
+
+Routes are labelled by their template (``/api/projects/{project_id}``), so
+label cardinality stays bounded.  Every metric is a plain counter, gauge
+or histogram update, and the HTTP middleware is raw ASGI.
+
+With several worker processes, set PROMETHEUS_MULTIPROC_DIR to an empty
+directory that all workers share, before they start.  Each worker then
+writes its samples there, and the endpoint aggregates them.  Gauges are
+summed over live processes.  Clear the directory on each deploy.
+"""
+import contextvars
+import functools
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest,
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # when set, scrapes must send it as a bearer token
+
+HTTP_REQUESTS = Counter(
+    "deployx_http_requests_total", "HTTP requests handled", ["method", "route", "status"],
+)
+HTTP_LATENCY = Histogram(
+    "deployx_http_request_duration_seconds", "HTTP request latency", ["method", "route"],
+)
+HTTP_IN_FLIGHT = Gauge(
+    "deployx_http_requests_in_flight", "HTTP requests being handled", multiprocess_mode="livesum",
+)
+
+ADMISSION_REJECTED = Counter(
+    "deployx_admission_rejected_total", "Requests refused with 503 by admission control",
+    ["route_class", "reason"],
+)
+ADMISSION_QUEUE_WAIT = Histogram(
+    "deployx_admission_queue_wait_seconds", "Time queued for an admission slot", ["route_class"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5),
+)
+
+DB_POOL_CHECKED_OUT = Gauge(
+    "deployx_db_pool_checked_out", "Connections checked out of the pool", multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "deployx_db_pool_overflow", "Connections open beyond pool_size", multiprocess_mode="livesum",
+)
+DB_POOL_CHECKOUTS = Counter("deployx_db_pool_checkouts_total", "Pool checkouts")
+DB_POOL_WAIT = Histogram(
+    "deployx_db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30),
+)
+
+DB_READ_SESSIONS = Counter(
+    "deployx_db_read_sessions_total", "Read-only sessions by database and reason", ["target", "reason"],
+)
+DB_REPLICA_LAG = Gauge(
+    "deployx_db_replica_lag_seconds", "Replay lag of the read replica at the last check (-1: unknown)",
+    multiprocess_mode="livemax",
+)
+
+CLOUDFLARE_LATENCY = Histogram(
+    "deployx_cloudflare_call_duration_seconds", "CloudflareService method latency", ["operation", "outcome"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+CLOUDFLARE_RESPONSES = Counter(
+    "deployx_cloudflare_responses_total", "Cloudflare API responses", ["operation", "status"],
+)
+CLOUDFLARE_QUEUE_WAIT = Histogram(
+    "deployx_cloudflare_queue_wait_seconds", "Time a Cloudflare request waited for its API token's rate limit",
+    ["operation"], buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+CLOUDFLARE_RETRIES = Counter(
+    "deployx_cloudflare_retries_total", "Cloudflare requests sent again", ["operation", "reason"],
+)
+CLOUDFLARE_REJECTED = Counter(
+    "deployx_cloudflare_rejected_total", "Cloudflare requests given up on before sending", ["reason"],
+)
+CLOUDFLARE_BREAKER_OPEN = Gauge(
+    "deployx_cloudflare_circuit_open", "1 while calls to the Cloudflare API are being refused",
+    multiprocess_mode="livemax",
+)
+
+PASSWORD_HASH_SECONDS = Histogram(
+    "deployx_password_hash_seconds", "Time spent in bcrypt", ["operation"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+JWT_DECODE_SECONDS = Histogram(
+    "deployx_jwt_decode_seconds", "Time spent decoding access tokens",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005, 0.01),
+)
+
+CACHE_REQUESTS = Counter(
+    "deployx_cache_requests_total", "In-process cache lookups by outcome (hit / miss)", ["cache", "result"],
+)
+CACHE_ENTRIES = Gauge(
+    "deployx_cache_entries", "Entries held by an in-process cache", ["cache"], multiprocess_mode="livesum",
+)
+
+# CloudflareService method currently running, for labelling its HTTP responses
+_cloudflare_operation = contextvars.ContextVar("cloudflare_operation", default="other")
+
+
+# ----------------------------------------------------------------------
+#  HTTP
+# ----------------------------------------------------------------------
+class MetricsMiddleware:
+    """Records latency, status and in-flight count for every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "<unmatched>"
+            method = scope["method"]
+            HTTP_LATENCY.labels(method, template).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(method, template, str(status_code)).inc()
+
+
+def render_metrics():
+    """Return *(body, content_type)* for a scrape."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+# ----------------------------------------------------------------------
+#  Database pool
+# ----------------------------------------------------------------------
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """The async queue pool, observing how long each checkout waits.
+
+    A pool class rather than a listener, because the pool fires no event
+    before a checkout starts.  ``Engine.dispose()`` builds the new pool from
+    the old one's class, so the timing carries over.
+    """
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start)
+
+
+def instrument_pool(engine):
+    """Track checkouts and overflow of *engine*'s pool.
+
+    The listeners are registered through the engine, and SQLAlchemy hands
+    them on to the pool that ``Engine.dispose()`` puts in place.  Sizes are
+    read from ``engine.pool`` on each event.
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    def on_checkout(*_):
+        DB_POOL_CHECKOUTS.inc()
+        DB_POOL_CHECKED_OUT.inc()
+        DB_POOL_OVERFLOW.set(max(sync_engine.pool.overflow(), 0))
+
+    def on_checkin(*_):
+        # Fired before the connection is back in the pool; with the pool
+        # full, it is closed and no longer counts as overflow
+        DB_POOL_CHECKED_OUT.dec()
+        pool = sync_engine.pool
+        discarded = 1 if pool.checkedin() >= pool.size() else 0
+        DB_POOL_OVERFLOW.set(max(pool.overflow() - discarded, 0))
+
+    event.listen(sync_engine, "checkout", on_checkout)
+    event.listen(sync_engine, "checkin", on_checkin)
+
+
+# ----------------------------------------------------------------------
+#  Cloudflare
+# ----------------------------------------------------------------------
+def cloudflare_operation(fn):
+    """Decorator for CloudflareService methods: time the call, label its HTTP responses."""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        token = _cloudflare_operation.set(name)
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await fn(*args, **kwargs)
+            outcome = "ok"
+            return result
+        finally:
+            CLOUDFLARE_LATENCY.labels(name, outcome).observe(time.perf_counter() - start)
+            _cloudflare_operation.reset(token)
+
+    return wrapper
+
+
+def current_cloudflare_operation() -> str:
+    return _cloudflare_operation.get()
+
+
+def record_cloudflare_response(status_code: int):
+    CLOUDFLARE_RESPONSES.labels(_cloudflare_operation.get(), str(status_code)).inc()
@@ -0,0 +1,58 @@
+"""
+Alembic environment.
+
+Migrations run against DATABASE_URL (the same variable the app reads),
+through asyncpg.  Each run holds a transaction-level advisory lock, so
+replicas that start together and all run ``alembic upgrade head`` apply
+each migration once.
+"""
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import pool, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database import Base, DATABASE_URL, _async_url
+import models  # noqa: F401  (registers the tables on Base.metadata)
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# Arbitrary, but fixed: pg_advisory_xact_lock key for migration runs
+_MIGRATION_LOCK_ID = 0x6465706C6F79  # "deploy"
+
+
+def run_migrations_offline() -> None:
+    """Emit the SQL instead of running it (``alembic upgrade head --sql``)."""
+    context.configure(
+        url=_async_url(DATABASE_URL).render_as_string(hide_password=False),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection) -> None:
+    context.configure(connection=connection, target_metadata=target_metadata)
+    with context.begin_transaction():
+        connection.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _MIGRATION_LOCK_ID})
+        context.run_migrations()
+
+
+async def run_migrations_online() -> None:
+    engine = create_async_engine(_async_url(DATABASE_URL), poolclass=pool.NullPool)
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    asyncio.run(run_migrations_online())
@@ -0,0 +1,199 @@
+"""Baseline schema (formerly database/init.sql)
+
+Every statement is idempotent, so it can run against a database created
+by the old init.sql or by ``Base.metadata.create_all``: missing tables and
+indexes are created, and the columns added to existing tables since
+init.sql (deployments.started_at, heartbeat_at) are added.  Existing
+tables are not otherwise altered; in particular they keep their
+uuid_generate_v4() key defaults, and an unpartitioned audit_logs is left
+for 0006 to convert.  New tables use the built-in gen_random_uuid() (Postgres
+13+) instead of uuid-ossp, so no extension (or superuser) is needed.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# asyncpg runs one statement per call, so the DDL is a list
+STATEMENTS = [
+    # ---------- Users ----------
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+        email VARCHAR(255) UNIQUE NOT NULL,
+        username VARCHAR(100) UNIQUE NOT NULL,
+        hashed_password VARCHAR(255) NOT NULL,
+        is_active BOOLEAN DEFAULT TRUE,
+        is_superuser BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+
+    # ---------- Cloudflare tunnel configurations ----------
+    """
+    CREATE TABLE IF NOT EXISTS cloudflare_configs (
+        id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+        user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+        api_token TEXT NOT NULL,
+        zone_id VARCHAR(255),
+        domain VARCHAR(255),
+        subdomain VARCHAR(255) NOT NULL,
+        tunnel_id VARCHAR(255),
+        tunnel_name VARCHAR(255),
+        tunnel_token TEXT,
+        is_active BOOLEAN DEFAULT TRUE,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(user_id)
+    )
+    """,
+
+    # ---------- Cloudflare tunnel provisioning jobs ----------
+    """
+    CREATE TABLE IF NOT EXISTS provisioning_jobs (
+        id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+        user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+        status VARCHAR(50) DEFAULT 'pending',
+        api_token TEXT NOT NULL,
+        domain VARCHAR(255) NOT NULL,
+        subdomain VARCHAR(255) NOT NULL,
+        steps JSONB DEFAULT '{}'::jsonb,
+        zone_id VARCHAR(255),
+        account_id VARCHAR(255),
+        tunnel_id VARCHAR(255),
+        tunnel_name VARCHAR(255),
+        tunnel_token TEXT,
+        error TEXT,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP WITH TIME ZONE
+    )
+    """,
+
+    # ---------- Projects ----------
+    """
+    CREATE TABLE IF NOT EXISTS projects (
+        id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+        user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+        name VARCHAR(255) NOT NULL,
+        description TEXT,
+        repository_url VARCHAR(500),
+        status VARCHAR(50) DEFAULT 'inactive',
+        last_deployed_at TIMESTAMP WITH TIME ZONE,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+
+    # ---------- Deployments ----------
+    """
+    CREATE TABLE IF NOT EXISTS deployments (
+        id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+        project_id UUID REFERENCES projects(id) ON DELETE CASCADE,
+        user_id UUID REFERENCES users(id) ON DELETE SET NULL,
+        status VARCHAR(50) DEFAULT 'pending',
+        commit_sha VARCHAR(40),
+        log_output TEXT,
+        duration_seconds INTEGER,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        started_at TIMESTAMP WITH TIME ZONE,
+        heartbeat_at TIMESTAMP WITH TIME ZONE,
+        finished_at TIMESTAMP WITH TIME ZONE
+    )
+    """,
+    # Deployments tables from init.sql predate the worker's columns
+    "ALTER TABLE deployments ADD COLUMN IF NOT EXISTS started_at TIMESTAMP WITH TIME ZONE",
+    "ALTER TABLE deployments ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP WITH TIME ZONE",
+
+    # ---------- Deployment log chunks (append-only, character offsets) ----------
+    """
+    CREATE TABLE IF NOT EXISTS deployment_log_chunks (
+        deployment_id UUID REFERENCES deployments(id) ON DELETE CASCADE,
+        seq INTEGER NOT NULL,
+        start_offset BIGINT NOT NULL,
+        end_offset BIGINT NOT NULL,
+        content TEXT NOT NULL,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (deployment_id, seq)
+    )
+    """,
+
+    # ---------- Audit logs ----------
+    # Partitioned by month; the backend creates upcoming monthly partitions
+    # and drops expired ones (see audit.py)
+    """
+    CREATE TABLE IF NOT EXISTS audit_logs (
+        id UUID NOT NULL DEFAULT gen_random_uuid(),
+        user_id UUID REFERENCES users(id) ON DELETE SET NULL,
+        action VARCHAR(100) NOT NULL,
+        resource_type VARCHAR(100),
+        resource_id VARCHAR(255),
+        details JSONB,
+        ip_address VARCHAR(45),
+        created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at)
+    """,
+
+    # ---------- Indexes ----------
+    "CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)",
+    "CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)",
+    "CREATE INDEX IF NOT EXISTS idx_cloudflare_configs_user_id ON cloudflare_configs(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_provisioning_jobs_user_id ON provisioning_jobs(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_projects_user_id ON projects(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_deployments_project_id ON deployments(project_id)",
+    "CREATE INDEX IF NOT EXISTS idx_deployments_pending ON deployments(created_at) WHERE status = 'pending'",
+    # At most one running deployment per project, across all backend workers
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_deployments_active_project ON deployments(project_id)
+        WHERE status IN ('building', 'deploying')
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_deployment_log_chunks_end_offset ON deployment_log_chunks(deployment_id, end_offset)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_logs_user_id_created_at ON audit_logs(user_id, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_logs_created_at ON audit_logs(created_at DESC)",
+
+    # ---------- Auto-update updated_at ----------
+    """
+    CREATE OR REPLACE FUNCTION update_updated_at_column()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        NEW.updated_at = CURRENT_TIMESTAMP;
+        RETURN NEW;
+    END;
+    $$ language 'plpgsql'
+    """,
+    *(
+        f"""
+        CREATE OR REPLACE TRIGGER update_{table}_updated_at BEFORE UPDATE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION update_updated_at_column()
+        """
+        for table in ("users", "cloudflare_configs", "provisioning_jobs", "projects")
+    ),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for statement in STATEMENTS:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in (
+        "audit_logs", "deployment_log_chunks", "deployments", "projects",
+        "provisioning_jobs", "cloudflare_configs", "users",
+    ):
+        op.execute(f"DROP TABLE IF EXISTS {table} CASCADE")
+    op.execute("DROP FUNCTION IF EXISTS update_updated_at_column()")
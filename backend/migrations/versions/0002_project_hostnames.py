@@ -0,0 +1,57 @@
+"""Per-project hostnames on the shared tunnel
+
+Adds projects.subdomain (unique per user) and the tunnel bookkeeping that
+ingress.py needs on cloudflare_configs.  Existing projects get a subdomain
+derived from their name; duplicates within a user get an id suffix.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("ALTER TABLE projects ADD COLUMN IF NOT EXISTS subdomain VARCHAR(63)")
+    op.execute("ALTER TABLE cloudflare_configs ADD COLUMN IF NOT EXISTS account_id VARCHAR(255)")
+    op.execute("ALTER TABLE cloudflare_configs ADD COLUMN IF NOT EXISTS ingress_hostnames JSONB")
+
+    op.execute("""
+        WITH slugs AS (
+            SELECT id, user_id, created_at,
+                   COALESCE(NULLIF(left(trim(BOTH '-' FROM lower(
+                       regexp_replace(name, '[^a-zA-Z0-9]+', '-', 'g'))), 50), ''), 'project') AS slug
+            FROM projects
+            WHERE subdomain IS NULL
+        ), labelled AS (
+            SELECT id,
+                   CASE WHEN row_number() OVER (PARTITION BY user_id, slug ORDER BY created_at) = 1
+                        THEN slug
+                        ELSE slug || '-' || left(replace(id::text, '-', ''), 8)
+                   END AS label
+            FROM slugs
+        )
+        UPDATE projects SET subdomain = labelled.label
+        FROM labelled WHERE projects.id = labelled.id
+    """)
+    op.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_projects_user_subdomain ON projects(user_id, subdomain)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX IF EXISTS uq_projects_user_subdomain")
+    op.execute("ALTER TABLE cloudflare_configs DROP COLUMN IF EXISTS ingress_hostnames")
+    op.execute("ALTER TABLE cloudflare_configs DROP COLUMN IF EXISTS account_id")
+    op.execute("ALTER TABLE projects DROP COLUMN IF EXISTS subdomain")
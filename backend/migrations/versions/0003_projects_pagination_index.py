@@ -0,0 +1,33 @@
+"""Index for keyset pagination of a user's projects
+
+(user_id, created_at, id) serves GET /api/projects in either direction and
+makes the single-column user_id index redundant.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_projects_user_id_created_at ON projects(user_id, created_at, id)"
+    )
+    op.execute("DROP INDEX IF EXISTS idx_projects_user_id")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("CREATE INDEX IF NOT EXISTS idx_projects_user_id ON projects(user_id)")
+    op.execute("DROP INDEX IF EXISTS idx_projects_user_id_created_at")
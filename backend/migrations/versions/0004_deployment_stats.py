@@ -0,0 +1,60 @@
+"""Hourly and daily deployment rollups per project
+
+Creates deployment_stats (maintained by deploy_stats.py) and fills it from
+the deployments that have already finished.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS deployment_stats (
+            project_id UUID REFERENCES projects(id) ON DELETE CASCADE,
+            granularity VARCHAR(4) NOT NULL,
+            bucket_start TIMESTAMP WITH TIME ZONE NOT NULL,
+            deployments INTEGER NOT NULL DEFAULT 0,
+            succeeded INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            duration_total BIGINT NOT NULL DEFAULT 0,
+            duration_count INTEGER NOT NULL DEFAULT 0,
+            last_finished_at TIMESTAMP WITH TIME ZONE,
+            last_success_at TIMESTAMP WITH TIME ZONE,
+            PRIMARY KEY (project_id, granularity, bucket_start)
+        )
+    """)
+    for granularity in ("hour", "day"):
+        op.execute(f"""
+            INSERT INTO deployment_stats
+            SELECT project_id, '{granularity}',
+                   date_trunc('{granularity}', finished_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+                   count(*),
+                   count(*) FILTER (WHERE status = 'success'),
+                   count(*) FILTER (WHERE status = 'failed'),
+                   coalesce(sum(duration_seconds), 0),
+                   count(duration_seconds),
+                   max(finished_at),
+                   max(finished_at) FILTER (WHERE status = 'success')
+            FROM deployments
+            WHERE status IN ('success', 'failed') AND finished_at IS NOT NULL AND project_id IS NOT NULL
+            GROUP BY 1, 3
+            ON CONFLICT DO NOTHING
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE IF EXISTS deployment_stats")
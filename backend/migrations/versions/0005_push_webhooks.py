@@ -0,0 +1,76 @@
+"""Push webhooks and coalesced deployment queue
+
+Adds the per-project webhook secret and branch filter, the table of
+processed webhook deliveries, and deployments.scheduled_at.  A project can
+now have only one pending deployment: older duplicates already queued are
+marked 'superseded' and the newest one is kept.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("ALTER TABLE projects ADD COLUMN IF NOT EXISTS webhook_secret VARCHAR(64)")
+    op.execute("ALTER TABLE projects ADD COLUMN IF NOT EXISTS webhook_branch VARCHAR(255)")
+
+    op.execute("ALTER TABLE deployments ADD COLUMN IF NOT EXISTS scheduled_at TIMESTAMP WITH TIME ZONE")
+    op.execute("UPDATE deployments SET scheduled_at = coalesce(created_at, CURRENT_TIMESTAMP) WHERE scheduled_at IS NULL")
+    op.execute("ALTER TABLE deployments ALTER COLUMN scheduled_at SET DEFAULT CURRENT_TIMESTAMP")
+    op.execute("ALTER TABLE deployments ALTER COLUMN scheduled_at SET NOT NULL")
+
+    op.execute("""
+        UPDATE deployments SET status = 'superseded', finished_at = CURRENT_TIMESTAMP
+        WHERE status = 'pending' AND id NOT IN (
+            SELECT DISTINCT ON (project_id) id FROM deployments
+            WHERE status = 'pending'
+            ORDER BY project_id, created_at DESC
+        )
+    """)
+    op.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_deployments_pending_project ON deployments(project_id)
+            WHERE status = 'pending'
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_deployments_pending_scheduled ON deployments(scheduled_at)
+            WHERE status = 'pending'
+    """)
+    op.execute("DROP INDEX IF EXISTS idx_deployments_pending")
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS webhook_deliveries (
+            project_id UUID REFERENCES projects(id) ON DELETE CASCADE,
+            delivery_id VARCHAR(100) NOT NULL,
+            deployment_id UUID,
+            received_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (project_id, delivery_id)
+        )
+    """)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_webhook_deliveries_received_at ON webhook_deliveries(received_at)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE IF EXISTS webhook_deliveries")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_deployments_pending ON deployments(created_at) WHERE status = 'pending'"
+    )
+    op.execute("DROP INDEX IF EXISTS idx_deployments_pending_scheduled")
+    op.execute("DROP INDEX IF EXISTS uq_deployments_pending_project")
+    op.execute("ALTER TABLE deployments DROP COLUMN IF EXISTS scheduled_at")
+    op.execute("ALTER TABLE projects DROP COLUMN IF EXISTS webhook_branch")
+    op.execute("ALTER TABLE projects DROP COLUMN IF EXISTS webhook_secret")
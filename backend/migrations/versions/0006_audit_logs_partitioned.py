@@ -0,0 +1,128 @@
+"""Partition a legacy audit_logs table
+
+Databases created by the old init.sql (or by ``create_all``) have a plain
+audit_logs table, which 0001 leaves alone.  This converts it: the table is
+renamed, the partitioned parent is created under the old name with monthly
+partitions covering every existing row, the rows are copied across (a NULL
+created_at becomes the migration time, since it is part of the key) and
+the old table is dropped.  The copy holds an exclusive lock on audit_logs,
+so writes to the audit log wait for it.
+
+Every database then gets the default partition and partitions up to three
+months ahead; audit.py keeps creating upcoming ones from there.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy import text
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Monthly partitions from the month of the oldest row in {source} through
+# three months from now, named as audit.py names them
+_MONTHLY_PARTITIONS = """
+    DO $$
+    DECLARE
+        month date;
+    BEGIN
+        FOR month IN
+            SELECT generate_series(
+                date_trunc('month', least(min(created_at), now()) AT TIME ZONE 'UTC'),
+                date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months',
+                interval '1 month'
+            )::date
+            FROM {source}
+        LOOP
+            BEGIN
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF audit_logs FOR VALUES FROM (%L) TO (%L)',
+                    to_char(month, '"audit_logs_y"YYYY"m"MM'),
+                    month || ' 00:00+00',
+                    (month + interval '1 month')::date || ' 00:00+00'
+                );
+            EXCEPTION WHEN check_violation OR invalid_object_definition THEN
+                -- Rows for that month already sit in the default partition,
+                -- or another partition covers it; audit.py logs the same case
+                RAISE NOTICE 'audit partition for % not created: %', month, SQLERRM;
+            END;
+        END LOOP;
+    END
+    $$
+"""
+
+
+def _convert() -> None:
+    op.execute("ALTER TABLE audit_logs RENAME TO audit_logs_unpartitioned")
+    # Free the constraint and index names for the new table
+    op.execute("""
+        DO $$
+        DECLARE
+            r record;
+        BEGIN
+            FOR r IN SELECT conname FROM pg_constraint
+                     WHERE conrelid = 'audit_logs_unpartitioned'::regclass AND contype IN ('p', 'u', 'f')
+            LOOP
+                EXECUTE format('ALTER TABLE audit_logs_unpartitioned DROP CONSTRAINT %I', r.conname);
+            END LOOP;
+            FOR r IN SELECT indexrelid::regclass AS name FROM pg_index
+                     WHERE indrelid = 'audit_logs_unpartitioned'::regclass
+            LOOP
+                EXECUTE format('DROP INDEX %s', r.name);
+            END LOOP;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TABLE audit_logs (
+            id UUID NOT NULL DEFAULT gen_random_uuid(),
+            user_id UUID REFERENCES users(id) ON DELETE SET NULL,
+            action VARCHAR(100) NOT NULL,
+            resource_type VARCHAR(100),
+            resource_id VARCHAR(255),
+            details JSONB,
+            ip_address VARCHAR(45),
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute(_MONTHLY_PARTITIONS.format(source="audit_logs_unpartitioned"))
+    op.execute("CREATE TABLE audit_logs_default PARTITION OF audit_logs DEFAULT")
+    op.execute("""
+        INSERT INTO audit_logs (id, user_id, action, resource_type, resource_id, details, ip_address, created_at)
+        SELECT id, user_id, action, resource_type, resource_id, details::jsonb, ip_address,
+               coalesce(created_at, CURRENT_TIMESTAMP)
+        FROM audit_logs_unpartitioned
+    """)
+    op.execute("DROP TABLE audit_logs_unpartitioned")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    partitioned = op.get_bind().scalar(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'audit_logs'::regclass)"
+    ))
+    if not partitioned:
+        _convert()
+
+    op.execute(_MONTHLY_PARTITIONS.format(source="(SELECT NULL::timestamptz AS created_at) AS empty"))
+    op.execute("CREATE TABLE IF NOT EXISTS audit_logs_default PARTITION OF audit_logs DEFAULT")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_audit_logs_user_id_created_at ON audit_logs(user_id, created_at, id)"
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS idx_audit_logs_created_at ON audit_logs(created_at DESC)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The partitioned table is what 0001 creates on an empty database;
+    # there is no reason to turn it back into a plain one.
+    pass
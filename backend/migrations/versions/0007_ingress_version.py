@@ -0,0 +1,30 @@
+"""Version counter for the cached tunnel ingress
+
+ingress.py now talks to Cloudflare without holding the cloudflare_configs
+row lock and writes the new rule set back only if ingress_version is still
+the one it read.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, Sequence[str], None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("ALTER TABLE cloudflare_configs ADD COLUMN IF NOT EXISTS ingress_version INTEGER NOT NULL DEFAULT 0")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE cloudflare_configs DROP COLUMN IF EXISTS ingress_version")
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Text, JSON, Integer
+from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Text, JSON, Integer, BigInteger, Index
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from database import Base
 import uuid
 
@@ -30,19 +30,59 @@ class CloudflareConfig(Base):
     tunnel_id = Column(String(255))
     tunnel_name = Column(String(255))
     tunnel_token = Column(Text)
+    account_id = Column(String(255))
+    # Hostnames in the tunnel's ingress as last written by us (see ingress.py)
+    ingress_hostnames = Column(JSON, nullable=True)
+    # Bumped on every write of ingress_hostnames; a sync writes back only if unchanged
+    ingress_version = Column(Integer, nullable=False, default=0)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
 
+class ProvisioningJob(Base):
+    __tablename__ = "provisioning_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    status = Column(String(50), default="pending")  # pending, running, success, failed
+    api_token = Column(Text, nullable=False)
+    domain = Column(String(255), nullable=False)
+    subdomain = Column(String(255), nullable=False)
+    steps = Column(JSON, default=dict)  # step name -> {"status": ..., "at": ..., "error"?: ...}
+    zone_id = Column(String(255))
+    account_id = Column(String(255))
+    tunnel_id = Column(String(255))
+    tunnel_name = Column(String(255))
+    tunnel_token = Column(Text)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    @property
+    def public_url(self) -> str:
+        return f"https://{self.subdomain}.{self.domain}"
+
+
 class Project(Base):
     __tablename__ = "projects"
+    __table_args__ = (
+        Index("uq_projects_user_subdomain", "user_id", "subdomain", unique=True),
+        # Keyset pagination of a user's projects (GET /api/projects)
+        Index("idx_projects_user_id_created_at", "user_id", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"))
     name = Column(String(255), nullable=False)
     description = Column(Text)
     repository_url = Column(String(500))
+    # Served at https://<subdomain>.<tunnel domain>
+    subdomain = Column(String(63), nullable=True)
+    # Push webhooks are accepted once a secret is set (see webhooks.py)
+    webhook_secret = Column(String(64), nullable=True)
+    webhook_branch = Column(String(255), nullable=True)  # None: every branch
     status = Column(String(50), default="inactive")
     last_deployed_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -51,20 +91,85 @@ class Project(Base):
 
 class Deployment(Base):
     __tablename__ = "deployments"
+    __table_args__ = (
+        # Queue scan used by the deployment worker
+        Index("idx_deployments_pending_scheduled", "scheduled_at", postgresql_where=text("status = 'pending'")),
+        # At most one queued deployment per project; new requests update it
+        Index(
+            "uq_deployments_pending_project", "project_id", unique=True,
+            postgresql_where=text("status = 'pending'"),
+        ),
+        # At most one running deployment per project, across all workers
+        Index(
+            "uq_deployments_active_project", "project_id", unique=True,
+            postgresql_where=text("status IN ('building', 'deploying')"),
+        ),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id", ondelete="CASCADE"))
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id", ondelete="CASCADE"), index=True)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="SET NULL"))
-    status = Column(String(50), default="pending")  # pending, building, deploying, success, failed
+    status = Column(String(50), default="pending")  # pending, building, deploying, success, failed, superseded
     commit_sha = Column(String(40), nullable=True)
-    log_output = Column(Text, nullable=True)
+    log_output = Column(Text, nullable=True)  # legacy; new logs live in deployment_log_chunks
     duration_seconds = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Not claimed before this; pushes in the coalescing window share one row
+    scheduled_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
     finished_at = Column(DateTime(timezone=True), nullable=True)
 
 
+class DeploymentLogChunk(Base):
+    """Append-only piece of a deployment's log covering [start_offset, end_offset)."""
+    __tablename__ = "deployment_log_chunks"
+    __table_args__ = (
+        Index("idx_deployment_log_chunks_end_offset", "deployment_id", "end_offset"),
+    )
+
+    deployment_id = Column(UUID(as_uuid=True), ForeignKey("deployments.id", ondelete="CASCADE"), primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    start_offset = Column(BigInteger, nullable=False)
+    end_offset = Column(BigInteger, nullable=False)
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class WebhookDelivery(Base):
+    """A webhook delivery already processed; redeliveries with the same id are ignored."""
+    __tablename__ = "webhook_deliveries"
+
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    delivery_id = Column(String(100), primary_key=True)
+    deployment_id = Column(UUID(as_uuid=True), nullable=True)
+    received_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class DeploymentStat(Base):
+    """Rollup of the deployments of a project that finished in one UTC hour or day (see deploy_stats.py)."""
+    __tablename__ = "deployment_stats"
+
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    granularity = Column(String(4), primary_key=True)  # hour, day
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    deployments = Column(Integer, nullable=False, default=0)
+    succeeded = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    duration_total = Column(BigInteger, nullable=False, default=0)
+    duration_count = Column(Integer, nullable=False, default=0)
+    last_finished_at = Column(DateTime(timezone=True), nullable=True)
+    last_success_at = Column(DateTime(timezone=True), nullable=True)
+
+
 class AuditLog(Base):
     __tablename__ = "audit_logs"
+    # Range-partitioned by month (see audit.maintain_audit_partitions), so the
+    # partition key has to be part of the primary key.
+    __table_args__ = (
+        Index("idx_audit_logs_user_id_created_at", "user_id", "created_at", "id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="SET NULL"))
@@ -73,4 +178,4 @@ class AuditLog(Base):
     resource_id = Column(String(255))
     details = Column(JSON)
     ip_address = Column(String(45))
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
@@ -1,14 +1,77 @@
-"""Password hashing utilities"""
+"""Password hashing utilities
+
+bcrypt is CPU-bound (~250ms per call at cost 12), so all hashing runs in a
+small dedicated thread pool instead of on the event loop.  The pool has a
+fixed number of slots (running + queued); once they are taken new requests
+fail fast with ``PasswordHasherBusy`` rather than piling up behind a burst.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import bcrypt
 
+from metrics import PASSWORD_HASH_SECONDS
+
+# bcrypt cost factor for new hashes; existing hashes with another cost are
+# upgraded transparently on the next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 8)))
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_MAX_PENDING)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing pool has no free slot."""
+
+
+async def _submit(fn, *args):
+    if not _slots.acquire(blocking=False):
+        raise PasswordHasherBusy()
+    try:
+        future = _executor.submit(fn, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    # Release on completion of the actual work, not when the awaiting request
+    # goes away, so abandoned hashes still count against the limit.
+    future.add_done_callback(lambda _: _slots.release())
+    return await asyncio.wrap_future(future)
+
+
+def _checkpw(plain_password: str, hashed_password: str) -> bool:
+    with PASSWORD_HASH_SECONDS.labels("verify").time():
+        return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+
+def _hashpw(password: str, rounds: int) -> str:
+    with PASSWORD_HASH_SECONDS.labels("hash").time():
+        salt = bcrypt.gensalt(rounds=rounds)
+        hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
+    return hashed.decode('utf-8')
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hash"""
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    return await _submit(_checkpw, plain_password, hashed_password)
 
 
-def get_password_hash(password: str) -> str:
+async def get_password_hash(password: str) -> str:
     """Hash a password"""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
+    return await _submit(_hashpw, password, BCRYPT_ROUNDS)
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True if *hashed_password* was made with a different cost than BCRYPT_ROUNDS"""
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
+def shutdown_password_pool():
+    """Stop the hashing threads (called on application shutdown)"""
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,232 @@
+"""
+Cached platform status.
+
+``GET /api/platform/status`` is public and polled by the frontend, so it is
+served from an in-process snapshot: the onboarding state (admin registered,
+tunnel configured) plus the result of real health probes.  The snapshot is
+pre-serialized and carries an ETag, so a poll costs a dictionary lookup and
+an unchanged poll answers 304.
+
+A background refresher probes Postgres, Traefik and the frontend
+concurrently every PLATFORM_STATUS_REFRESH_SECONDS, each with a
+PLATFORM_PROBE_TIMEOUT_SECONDS timeout, and reloads the onboarding state
+from the read replica.  Handlers that change that state (registration,
+tunnel create/delete) call ``invalidate()`` so this process reflects the
+change on the next request; until the replica has surely caught up, the
+state is then reloaded from the primary.  Other worker processes pick the
+change up on their next refresh.
+
+Probe results are kept even when the onboarding state cannot be loaded
+(the database is down): the snapshot then shows the failed probe and the
+tunnel as "unavailable", rather than the last good status.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+import httpx
+from sqlalchemy import select, text
+
+from database import DB_READ_AFTER_WRITE_SECONDS, engine, read_session
+from models import CloudflareConfig, User
+from schemas import PlatformStatus, ServiceStatus
+
+logger = logging.getLogger("deployx.status")
+
+PLATFORM_STATUS_REFRESH_SECONDS = float(os.getenv("PLATFORM_STATUS_REFRESH_SECONDS", "15"))
+PLATFORM_PROBE_TIMEOUT_SECONDS = float(os.getenv("PLATFORM_PROBE_TIMEOUT_SECONDS", "2"))
+# Empty URL disables a probe; the service is then reported as "unknown"
+FRONTEND_HEALTH_URL = os.getenv("FRONTEND_HEALTH_URL", "http://frontend:3000/")
+TRAEFIK_HEALTH_URL = os.getenv("TRAEFIK_HEALTH_URL", "http://traefik:8080/api/version")
+
+
+@dataclass(frozen=True)
+class _OnboardingState:
+    has_admin: bool
+    has_tunnel: bool
+    public_url: Optional[str]
+
+
+@dataclass(frozen=True)
+class StatusSnapshot:
+    body: bytes
+    etag: str
+
+
+class PlatformStatusCache:
+    """Serves the platform status from memory and keeps it fresh."""
+
+    def __init__(
+        self,
+        refresh_interval: float = PLATFORM_STATUS_REFRESH_SECONDS,
+        probe_timeout: float = PLATFORM_PROBE_TIMEOUT_SECONDS,
+    ):
+        self.refresh_interval = refresh_interval
+        self.probe_timeout = probe_timeout
+        self._state: Optional[_OnboardingState] = None
+        # Probe results by service name; empty until the first refresh
+        self._probes: dict = {}
+        self._snapshot: Optional[StatusSnapshot] = None
+        # Bumped by invalidate() so a load that started earlier is not stored
+        self._generation = 0
+        self._invalidated_at = float("-inf")
+        self._lock = asyncio.Lock()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._client = httpx.AsyncClient(timeout=self.probe_timeout)
+            self._task = asyncio.create_task(self._run(), name="platform-status")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def invalidate(self):
+        """Forget the onboarding state; the next request reloads it."""
+        self._generation += 1
+        self._invalidated_at = time.monotonic()
+        self._state = None
+        self._snapshot = None
+
+    async def get(self) -> StatusSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        async with self._lock:
+            if self._snapshot is not None:
+                return self._snapshot
+            generation = self._generation
+            try:
+                state = await self._load_state()
+            except Exception as e:
+                state = e
+            return self._store(state, generation)
+
+    async def refresh(self):
+        """Re-run all probes and reload the onboarding state."""
+        generation = self._generation
+        probes, state = await asyncio.gather(self._probe_all(), self._load_state(), return_exceptions=True)
+        if isinstance(probes, BaseException):
+            raise probes
+        # Stored whatever became of the state load: a database that is down
+        # must show up as such, not as its last good probe
+        self._probes = probes
+        if generation == self._generation:
+            self._store(state, generation)
+        else:
+            self._snapshot = None
+
+    def _store(self, state, generation: int) -> StatusSnapshot:
+        """Build and cache the snapshot for *state*, or for a failed load of it."""
+        if isinstance(state, BaseException):
+            logger.warning("Platform status: onboarding state unavailable (%s)", type(state).__name__)
+            snapshot = self._build(self._state, available=False)
+        else:
+            snapshot = self._build(state)
+            if generation == self._generation:
+                self._state = state
+        if generation == self._generation:
+            self._snapshot = snapshot
+        return snapshot
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Platform status refresh failed")
+            await asyncio.sleep(self.refresh_interval)
+
+    # ------------------------------------------------------------------
+    #  Sources
+    # ------------------------------------------------------------------
+    async def _load_state(self) -> _OnboardingState:
+        primary = time.monotonic() - self._invalidated_at < DB_READ_AFTER_WRITE_SECONDS
+        async with read_session(primary=primary) as db:
+            has_admin = await db.scalar(select(User.id).limit(1)) is not None
+            row = (
+                await db.execute(
+                    select(CloudflareConfig.subdomain, CloudflareConfig.domain)
+                    .where(CloudflareConfig.is_active == True)
+                    .limit(1)
+                )
+            ).first()
+        public_url = f"https://{row.subdomain}.{row.domain}" if row and row.domain else None
+        return _OnboardingState(has_admin=has_admin, has_tunnel=row is not None, public_url=public_url)
+
+    async def _probe_all(self) -> dict:
+        names = ["frontend", "postgres", "traefik"]
+        results = await asyncio.gather(
+            self._probe_http(FRONTEND_HEALTH_URL),
+            self._probe_postgres(),
+            self._probe_http(TRAEFIK_HEALTH_URL),
+        )
+        return dict(zip(names, results))
+
+    async def _probe_postgres(self) -> str:
+        async def ping():
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        try:
+            await asyncio.wait_for(ping(), self.probe_timeout)
+            return "healthy"
+        except Exception:
+            return "unhealthy"
+
+    async def _probe_http(self, url: str) -> str:
+        if not url or self._client is None:
+            return "unknown"
+        try:
+            r = await self._client.get(url)
+            # Redirects are not followed; a 3xx still means the service answered
+            return "healthy" if 200 <= r.status_code < 400 else "unhealthy"
+        except httpx.HTTPError:
+            return "unhealthy"
+
+    # ------------------------------------------------------------------
+    #  Snapshot
+    # ------------------------------------------------------------------
+    def _build(self, state: Optional[_OnboardingState], available: bool = True) -> StatusSnapshot:
+        """Snapshot of *state* and the probes.
+
+        When the state could not be loaded (*available* false), the tunnel
+        is reported as unavailable and the onboarding flags keep their last
+        known values (false if there are none).
+        """
+        if state is None:
+            state = _OnboardingState(has_admin=False, has_tunnel=False, public_url=None)
+        if not available:
+            tunnel = "unavailable"
+        else:
+            tunnel = "healthy" if state.has_tunnel else "not configured"
+        probes = self._probes
+        services: List[ServiceStatus] = [
+            ServiceStatus(name="Frontend (Next.js)", status=probes.get("frontend", "unknown"), port=3000),
+            ServiceStatus(name="Backend (FastAPI)", status="healthy", port=3001),
+            ServiceStatus(name="Database (PostgreSQL)", status=probes.get("postgres", "unknown"), port=3002),
+            ServiceStatus(name="Reverse Proxy (Traefik)", status=probes.get("traefik", "unknown"), port=80),
+            ServiceStatus(name="Cloudflare Tunnel", status=tunnel),
+        ]
+        body = PlatformStatus(
+            platform="DeployX",
+            version="1.0.0",
+            has_admin=state.has_admin,
+            has_tunnel=state.has_tunnel,
+            services=services,
+            public_url=state.public_url,
+        ).model_dump_json().encode()
+        return StatusSnapshot(body=body, etag=f'"{hashlib.sha1(body).hexdigest()}"')
+
+
+platform_status_cache = PlatformStatusCache()
@@ -0,0 +1,173 @@
+"""
+Per-request profiling.
+
+``ProfilingMiddleware`` gives each HTTP request a RequestProfile, held in
+a context variable.  SQLAlchemy engine events add every statement and its
+duration to the profile.  ``span(name)`` blocks (auth, cloudflare,
+serialization) add their wall time.  Work that runs concurrently is
+summed, so spans can exceed the request time.
+
+At the end of a request:
+
+* statements slower than SQL_SLOW_QUERY_MS are logged as they finish,
+  with parameter values replaced by their types;
+* a statement run SQL_N_PLUS_ONE_THRESHOLD or more times in one request
+  is logged as an N+1 candidate;
+* with SERVER_TIMING=true, the response carries a ``Server-Timing``
+  header with the db / auth / cloudflare / serialization split.  Browser
+  dev tools show it next to each request.
+"""
+import contextvars
+import functools
+import logging
+import os
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger("deployx.sql")
+
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+
+
+class RequestProfile:
+    __slots__ = ("queries", "db_seconds", "statements", "spans", "closed")
+
+    def __init__(self):
+        self.closed = False
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements: Counter = Counter()
+        self.spans: defaultdict = defaultdict(float)
+
+    def server_timing(self, total_seconds: float) -> str:
+        parts = [f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries"']
+        parts += [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.spans.items()]
+        parts.append(f"total;dur={total_seconds * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar("request_profile", default=None)
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str):
+    """Add the time spent in the block to the current request's *name* span."""
+    profile = _current.get()
+    if profile is None or profile.closed:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.spans[name] += time.perf_counter() - start
+
+
+def profiled(name: str):
+    """Decorator form of ``span`` for async functions (dependencies included)."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ----------------------------------------------------------------------
+#  SQL statements
+# ----------------------------------------------------------------------
+def _redact(parameters, executemany: bool) -> str:
+    if executemany:
+        return f"<{len(parameters)} parameter sets>"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: <{type(v).__name__}>" for k, v in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(f"<{type(v).__name__}>" for v in parameters) + ")"
+    return "<redacted>"
+
+
+def instrument_engine(engine):
+    """Attach statement counting, timing and slow-query logging to *engine*."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("deployx_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["deployx_query_start"].pop()
+        profile = _current.get()
+        if profile is not None and not profile.closed:
+            profile.queries += 1
+            profile.db_seconds += elapsed
+            profile.statements[statement] += 1
+        if elapsed * 1000 >= SQL_SLOW_QUERY_MS:
+            logger.warning(
+                "Slow query (%.0f ms): %s params=%s",
+                elapsed * 1000, " ".join(statement.split()), _redact(parameters, executemany),
+            )
+
+    @event.listens_for(sync_engine, "handle_error")
+    def on_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("deployx_query_start"):
+            conn.info["deployx_query_start"].pop()
+
+
+# ----------------------------------------------------------------------
+#  HTTP
+# ----------------------------------------------------------------------
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and not profile.closed:
+                if SERVER_TIMING:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", profile.server_timing(time.perf_counter() - start).encode()))
+                    message = {**message, "headers": headers}
+                self._close(scope, profile)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            if not profile.closed:
+                self._close(scope, profile)
+
+    @staticmethod
+    def _close(scope, profile: RequestProfile):
+        # The handler is done once the response starts; streamed bodies and
+        # background tasks that follow are not part of this request's profile.
+        profile.closed = True
+        repeated = [(s, n) for s, n in profile.statements.items() if n >= SQL_N_PLUS_ONE_THRESHOLD]
+        if not repeated:
+            return
+        route = getattr(scope.get("route"), "path", scope.get("path"))
+        for statement, count in repeated:
+            logger.warning(
+                "Possible N+1 in %s %s: statement ran %d times: %s",
+                scope["method"], route, count, " ".join(statement.split())[:500],
+            )
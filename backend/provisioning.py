@@ -0,0 +1,228 @@
+"""
+Background Cloudflare tunnel provisioning.
+
+``POST /api/cloudflare/setup`` records a ProvisioningJob and returns at once;
+``run_provisioning_job`` then works through the steps below, committing the
+outcome of each one.  Independent steps run concurrently, and a failed job
+can be resumed: completed steps are skipped, so re-running never creates a
+second tunnel.
+
+    resolve_zone    ─┐                  ┌─ fetch_token       ─┐
+                     ├─ create_tunnel ──┼─ create_dns         ├─ save_config ─ write_env ─ route_projects
+    resolve_account ─┘                  └─ configure_routing ─┘
+
+``route_projects`` adds the hostnames of the user's existing projects to
+the new tunnel (see ingress.py).
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from audit import audit_writer
+from cloudflare_scheduler import CloudflareUnavailable
+from cloudflare_service import CloudflareService
+from database import AsyncSessionLocal
+from ingress import sync_tunnel_ingress
+from models import CloudflareConfig, ProvisioningJob
+from platform_status import platform_status_cache
+
+logger = logging.getLogger("deployx.provisioning")
+
+# A "running" job whose row has not been touched for this long is assumed to
+# belong to a dead worker and may be resumed.
+PROVISIONING_STALE_SECONDS = int(os.getenv("PROVISIONING_STALE_SECONDS", "600"))
+
+StepFn = Callable[[], Awaitable[dict]]
+
+
+class StepFailed(Exception):
+    """A provisioning step could not complete."""
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _set_step(job: ProvisioningJob, name: str, status: str, error: Optional[str] = None):
+    # Reassign rather than mutate so the JSON column is flagged dirty
+    steps = dict(job.steps or {})
+    entry = {"status": status, "at": _now().isoformat()}
+    if error:
+        entry["error"] = error
+    steps[name] = entry
+    job.steps = steps
+
+
+def _step_status(job: ProvisioningJob, name: str) -> Optional[str]:
+    return (job.steps or {}).get(name, {}).get("status")
+
+
+async def _run_steps(db: AsyncSession, job: ProvisioningJob, steps: Dict[str, StepFn]):
+    """Run the not-yet-successful *steps* concurrently and record each outcome.
+
+    Each step returns a dict of job attributes to store.  Raises StepFailed
+    after recording if any step failed.
+    """
+    todo = {name: fn for name, fn in steps.items() if _step_status(job, name) != "success"}
+    if not todo:
+        return
+    for name in todo:
+        _set_step(job, name, "running")
+    await db.commit()
+
+    results = await asyncio.gather(*(fn() for fn in todo.values()), return_exceptions=True)
+
+    failures = []
+    for name, result in zip(todo, results):
+        if isinstance(result, BaseException):
+            _set_step(job, name, "failed", str(result))
+            failures.append(f"{name}: {result}")
+        else:
+            for key, value in result.items():
+                setattr(job, key, value)
+            _set_step(job, name, "success")
+    await db.commit()
+    if failures:
+        raise StepFailed("; ".join(failures))
+
+
+async def _claim(db: AsyncSession, job_id) -> bool:
+    """Atomically move the job to running, so concurrent resumes run it once."""
+    stale = _now() - timedelta(seconds=PROVISIONING_STALE_SECONDS)
+    result = await db.execute(
+        update(ProvisioningJob)
+        .where(
+            ProvisioningJob.id == job_id,
+            or_(
+                ProvisioningJob.status.in_(("pending", "failed")),
+                and_(ProvisioningJob.status == "running", ProvisioningJob.updated_at < stale),
+            ),
+        )
+        .values(status="running", error=None, finished_at=None)
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+
+async def _provision(db: AsyncSession, job: ProvisioningJob, ip_address: Optional[str]):
+    cf = CloudflareService(job.api_token)
+    full_domain = f"{job.subdomain}.{job.domain}"
+
+    async def resolve_zone():
+        zone_id = await cf.get_zone_id(job.domain)
+        if not zone_id:
+            raise StepFailed(f"Zone not found for {job.domain}")
+        return {"zone_id": zone_id}
+
+    async def resolve_account():
+        account_id = await cf.get_account_id()
+        if not account_id:
+            raise StepFailed("Unable to resolve Cloudflare account ID")
+        return {"account_id": account_id}
+
+    await _run_steps(db, job, {"resolve_zone": resolve_zone, "resolve_account": resolve_account})
+
+    # A previous attempt may have created the tunnel remotely before failing
+    # to record it; look it up first so a resume never makes a duplicate.
+    retrying_tunnel = _step_status(job, "create_tunnel") is not None
+
+    async def create_tunnel():
+        if retrying_tunnel:
+            existing = await cf.find_tunnel(job.account_id, job.tunnel_name)
+            if existing:
+                return {"tunnel_id": existing}
+        return {"tunnel_id": await cf.create_named_tunnel(job.account_id, job.tunnel_name)}
+
+    await _run_steps(db, job, {"create_tunnel": create_tunnel})
+
+    async def fetch_token():
+        return {"tunnel_token": await cf.get_tunnel_token(job.account_id, job.tunnel_id)}
+
+    async def create_dns():
+        try:
+            created = await cf.create_dns_record(job.zone_id, job.subdomain, job.tunnel_id)
+        except CloudflareUnavailable as e:
+            raise StepFailed(f"Could not create DNS record for {full_domain}: {e}") from e
+        if not created:
+            raise StepFailed(f"Could not create DNS record for {full_domain}")
+        return {}
+
+    async def configure_routing():
+        if not await cf.configure_tunnel_routing(job.account_id, job.tunnel_id, [full_domain]):
+            raise StepFailed("Could not configure tunnel ingress")
+        return {}
+
+    await _run_steps(db, job, {
+        "fetch_token": fetch_token,
+        "create_dns": create_dns,
+        "configure_routing": configure_routing,
+    })
+
+    async def save_config():
+        cfg = (
+            await db.execute(select(CloudflareConfig).where(CloudflareConfig.user_id == job.user_id))
+        ).scalars().first()
+        values = dict(
+            api_token=job.api_token, zone_id=job.zone_id, domain=job.domain,
+            subdomain=job.subdomain, tunnel_id=job.tunnel_id,
+            tunnel_name=job.tunnel_name, tunnel_token=job.tunnel_token, is_active=True,
+            # configure_routing wrote exactly this rule set
+            account_id=job.account_id, ingress_hostnames=[full_domain],
+        )
+        if cfg:
+            for k, v in values.items():
+                setattr(cfg, k, v)
+            # A sync in flight must not write its rule set over this one
+            cfg.ingress_version = CloudflareConfig.ingress_version + 1
+        else:
+            db.add(CloudflareConfig(user_id=job.user_id, **values))
+        return {}
+
+    saving = _step_status(job, "save_config") != "success"
+    await _run_steps(db, job, {"save_config": save_config})
+    if saving:
+        platform_status_cache.invalidate()
+        await audit_writer.record(
+            user_id=job.user_id, action="tunnel_created",
+            resource_type="tunnel", resource_id=job.tunnel_id,
+            details={"subdomain": job.subdomain, "domain": job.domain},
+            ip_address=ip_address,
+        )
+
+    async def write_env():
+        # Persist tunnel token to .env so cloudflared container can pick it up
+        await cf.update_env_file(job.tunnel_token)
+        return {}
+
+    await _run_steps(db, job, {"write_env": write_env})
+
+    async def route_projects():
+        await sync_tunnel_ingress(job.user_id)
+        return {}
+
+    await _run_steps(db, job, {"route_projects": route_projects})
+
+
+async def run_provisioning_job(job_id, ip_address: Optional[str] = None):
+    """Run (or resume) a provisioning job; a no-op if another run owns it."""
+    async with AsyncSessionLocal() as db:
+        if not await _claim(db, job_id):
+            return
+        job = await db.get(ProvisioningJob, job_id)
+        try:
+            await _provision(db, job, ip_address)
+        except Exception as e:
+            if not isinstance(e, StepFailed):
+                logger.exception("Provisioning job %s failed", job_id)
+            await db.rollback()
+            job.status = "failed"
+            job.error = str(e)
+        else:
+            job.status = "success"
+        job.finished_at = _now()
+        await db.commit()
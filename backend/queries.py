@@ -0,0 +1,107 @@
+"""
+Column-projected reads.
+
+Hot read paths select only the columns their response needs and get plain
+rows (or, for the authenticated user, a small frozen dataclass) back.  No
+ORM instances are built, nothing enters a session's identity map, and
+columns the caller never uses are not fetched: ``hashed_password`` on
+every authentication, the legacy ``log_output`` text of deployments, the
+Cloudflare API and tunnel tokens.
+
+The statements are built once, at import, with bound parameters, so a call
+only binds values and finds the compiled SQL in SQLAlchemy's statement
+cache; nothing is constructed per request.
+
+Rows from these functions suit ``serialization.rows_response``.  Code that
+modifies rows loads ORM instances instead (``crud``, ``select(Model)``).
+
+    python benchmarks/read_path_bench.py    # compares both paths
+"""
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import Row, bindparam, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import CloudflareConfig, Deployment, Project, User
+from schemas import CloudflareConfigResponse, DeploymentResponse, ProjectResponse
+from serialization import columns_for
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """The authenticated user, as endpoints see it: no password hash, no session."""
+    id: uuid.UUID
+    username: str
+    email: str
+    is_active: bool
+    is_superuser: bool
+    created_at: datetime
+
+
+# ----------------------------------------------------------------------
+#  Statements
+# ----------------------------------------------------------------------
+_PRINCIPAL_COLUMNS = [getattr(User, name) for name in Principal.__dataclass_fields__]
+_PRINCIPAL_BY_ID = select(*_PRINCIPAL_COLUMNS).where(User.id == bindparam("user_id"))
+_PRINCIPAL_BY_USERNAME = select(*_PRINCIPAL_COLUMNS).where(User.username == bindparam("username"))
+
+_OWNED_PROJECT = select(*columns_for(Project, ProjectResponse)).where(
+    Project.id == bindparam("project_id"), Project.user_id == bindparam("user_id"),
+)
+_OWNS_PROJECT = select(Project.id).where(
+    Project.id == bindparam("project_id"), Project.user_id == bindparam("user_id"),
+)
+
+_PROJECT_DEPLOYMENTS = (
+    select(*columns_for(Deployment, DeploymentResponse))
+    .where(Deployment.project_id == bindparam("project_id"))
+    .order_by(Deployment.created_at.desc())
+    .limit(bindparam("limit"))
+)
+_OWNED_DEPLOYMENT = (
+    select(*columns_for(Deployment, DeploymentResponse))
+    .join(Project, Project.id == Deployment.project_id)
+    .where(Deployment.id == bindparam("deployment_id"), Project.user_id == bindparam("user_id"))
+)
+
+_CLOUDFLARE_CONFIG = select(*columns_for(CloudflareConfig, CloudflareConfigResponse)).where(
+    CloudflareConfig.user_id == bindparam("user_id"),
+)
+
+
+# ----------------------------------------------------------------------
+#  Reads
+# ----------------------------------------------------------------------
+async def principal_by_id(db: AsyncSession, user_id: uuid.UUID) -> Optional[Principal]:
+    row = (await db.execute(_PRINCIPAL_BY_ID, {"user_id": user_id})).first()
+    return Principal(*row) if row else None
+
+
+async def principal_by_username(db: AsyncSession, username: str) -> Optional[Principal]:
+    row = (await db.execute(_PRINCIPAL_BY_USERNAME, {"username": username})).first()
+    return Principal(*row) if row else None
+
+
+async def owned_project(db: AsyncSession, project_id: uuid.UUID, user_id: uuid.UUID) -> Optional[Row]:
+    """The project's ProjectResponse columns, if *user_id* owns it."""
+    return (await db.execute(_OWNED_PROJECT, {"project_id": project_id, "user_id": user_id})).first()
+
+
+async def owns_project(db: AsyncSession, project_id: uuid.UUID, user_id: uuid.UUID) -> bool:
+    return await db.scalar(_OWNS_PROJECT, {"project_id": project_id, "user_id": user_id}) is not None
+
+
+async def project_deployments(db: AsyncSession, project_id: uuid.UUID, limit: int) -> List[Row]:
+    """A project's most recent deployments, newest first."""
+    return (await db.execute(_PROJECT_DEPLOYMENTS, {"project_id": project_id, "limit": limit})).all()
+
+
+async def owned_deployment(db: AsyncSession, deployment_id: uuid.UUID, user_id: uuid.UUID) -> Optional[Row]:
+    return (await db.execute(_OWNED_DEPLOYMENT, {"deployment_id": deployment_id, "user_id": user_id})).first()
+
+
+async def cloudflare_config(db: AsyncSession, user_id: uuid.UUID) -> Optional[Row]:
+    return (await db.execute(_CLOUDFLARE_CONFIG, {"user_id": user_id})).first()
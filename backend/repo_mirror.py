@@ -0,0 +1,314 @@
+"""
+Local git mirror cache for project repositories.
+
+Each repository URL gets one bare mirror (``git clone --mirror``) under
+GIT_MIRROR_DIR, so branches are resolved and code is read from local disk;
+the remote is only contacted to refresh a mirror, and not again within
+GIT_MIRROR_REFRESH_SECONDS of the last fetch.
+
+Concurrent fetches of the same URL are de-duplicated: callers in this
+process share one in-flight fetch, and other processes serialise on the
+mirror's ``fetch.lock`` and skip fetching if the mirror turns out to be
+fresh once they hold it.
+
+Mirrors are evicted least-recently-used first when their total size
+exceeds GIT_MIRROR_MAX_MB.  A mirror that is being fetched or is leased
+(``lease()``, e.g. by a running build) is never evicted.
+
+Only URL schemes in GIT_ALLOWED_SCHEMES are accepted; add ``file`` to use
+local repositories (as the tests do).
+"""
+import asyncio
+import fcntl
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+logger = logging.getLogger("deployx.mirror")
+
+GIT_MIRROR_DIR = os.getenv("GIT_MIRROR_DIR", "/var/cache/deployx/mirrors")
+GIT_MIRROR_MAX_BYTES = int(float(os.getenv("GIT_MIRROR_MAX_MB", "5120")) * 1024 * 1024)
+GIT_MIRROR_REFRESH_SECONDS = float(os.getenv("GIT_MIRROR_REFRESH_SECONDS", "30"))
+GIT_TIMEOUT_SECONDS = float(os.getenv("GIT_TIMEOUT_SECONDS", "300"))
+GIT_ALLOWED_SCHEMES = tuple(
+    s.strip() for s in os.getenv("GIT_ALLOWED_SCHEMES", "https,ssh,git").split(",") if s.strip()
+)
+
+_SCP_LIKE = re.compile(r"^[\w.-]+@[\w.-]+:(?!//)")
+_HEX = re.compile(r"^[0-9a-f]{7,40}$")
+# Marker files inside a mirror; their mtimes are shared by all processes
+_FETCHED = "deployx-fetched"
+_USED = "deployx-used"
+
+
+class MirrorError(Exception):
+    """A repository could not be mirrored, fetched or resolved."""
+
+
+def redact_url(url: str) -> str:
+    """*url* without credentials, for logs and error messages."""
+    parts = urlsplit(url)
+    if parts.username or parts.password:
+        host = parts.hostname or ""
+        if parts.port:
+            host += f":{parts.port}"
+        return urlunsplit(parts._replace(netloc=host))
+    return url
+
+
+def _mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def _touch(path: str):
+    with open(path, "a"):
+        os.utime(path)
+
+
+def _disk_usage(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+
+@asynccontextmanager
+async def _flock(path: str, mode: int) -> AsyncIterator[None]:
+    """Hold an flock on *path*; the blocking wait runs in a thread."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        await asyncio.to_thread(fcntl.flock, fd, mode)
+        yield
+    finally:
+        os.close(fd)  # releases the lock
+
+
+def _try_flock(path: str, mode: int) -> Optional[int]:
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, mode | fcntl.LOCK_NB)
+        return fd
+    except BlockingIOError:
+        os.close(fd)
+        return None
+
+
+class RepositoryMirrors:
+    """Bare mirrors of remote repositories, keyed by URL."""
+
+    def __init__(
+        self,
+        root: str = GIT_MIRROR_DIR,
+        max_bytes: int = GIT_MIRROR_MAX_BYTES,
+        refresh_interval: float = GIT_MIRROR_REFRESH_SECONDS,
+        allowed_schemes: Iterable[str] = GIT_ALLOWED_SCHEMES,
+        timeout: float = GIT_TIMEOUT_SECONDS,
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.refresh_interval = refresh_interval
+        self.allowed_schemes = frozenset(allowed_schemes)
+        self.timeout = timeout
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    # ------------------------------------------------------------------
+    #  Paths
+    # ------------------------------------------------------------------
+    def _check_url(self, url: str) -> str:
+        url = url.strip()
+        if _SCP_LIKE.match(url):
+            scheme = "ssh"
+        else:
+            scheme = urlsplit(url).scheme.lower()
+        if not url or scheme not in self.allowed_schemes:
+            raise MirrorError(f"Repository URL scheme not allowed: {redact_url(url) or '(empty)'}")
+        return url
+
+    def path_for(self, url: str) -> str:
+        """Directory of the mirror for *url* (which may not exist yet)."""
+        key = hashlib.sha256(self._check_url(url).encode()).hexdigest()[:32]
+        return os.path.join(self.root, f"{key}.git")
+
+    # ------------------------------------------------------------------
+    #  Fetching
+    # ------------------------------------------------------------------
+    async def fetch(self, url: str, force: bool = False) -> str:
+        """Create or refresh the mirror of *url*; returns its path.
+
+        Without *force*, a mirror fetched within the refresh interval is
+        used as it is.  Callers asking for the same URL while a fetch is in
+        flight wait for that fetch instead of starting another.
+        """
+        path = self.path_for(url)
+        if not force and time.time() - _mtime(os.path.join(path, _FETCHED)) < self.refresh_interval:
+            return path
+        task = self._inflight.get(path)
+        if task is None:
+            task = asyncio.create_task(self._fetch(url.strip(), path, force))
+            self._inflight[path] = task
+            task.add_done_callback(lambda _: self._inflight.pop(path, None))
+        # Shielded: one cancelled caller must not abort the others' fetch
+        return await asyncio.shield(task)
+
+    async def _fetch(self, url: str, path: str, force: bool) -> str:
+        os.makedirs(self.root, exist_ok=True)
+        started = time.time()
+        async with _flock(f"{path}.fetch.lock", fcntl.LOCK_EX):
+            # Another process may have fetched while we waited for the lock
+            fetched_at = _mtime(os.path.join(path, _FETCHED))
+            if fetched_at >= started or (not force and started - fetched_at < self.refresh_interval):
+                return path
+            if os.path.isdir(path):
+                await self._git("fetch", "--prune", "--quiet", "origin", cwd=path)
+                logger.info("Fetched mirror of %s", redact_url(url))
+            else:
+                tmp = tempfile.mkdtemp(dir=self.root, prefix=".clone-")
+                try:
+                    await self._git("clone", "--mirror", "--quiet", "--", url, tmp)
+                    os.rename(tmp, path)
+                except BaseException:
+                    shutil.rmtree(tmp, ignore_errors=True)
+                    raise
+                logger.info("Created mirror of %s", redact_url(url))
+            _touch(os.path.join(path, _FETCHED))
+            _touch(os.path.join(path, _USED))
+        await self._evict(keep=path)
+        return path
+
+    async def _git(self, *args: str, cwd: Optional[str] = None) -> str:
+        env = dict(os.environ, GIT_TERMINAL_PROMPT="0", GIT_ASKPASS="true")
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "git", *args,
+                cwd=cwd, env=env,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except FileNotFoundError:
+            raise MirrorError("git is not installed")
+        try:
+            out, err = await asyncio.wait_for(proc.communicate(), self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            proc.kill()
+            await proc.wait()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise MirrorError(f"git {args[0]} timed out after {self.timeout:.0f}s")
+        if proc.returncode != 0:
+            lines = err.decode(errors="replace").strip().splitlines()
+            fatal = [line for line in lines if line.startswith(("fatal:", "error:"))]
+            message = (fatal or lines or [f"exit status {proc.returncode}"])[0]
+            raise MirrorError(f"git {args[0]} failed: {self._redact_all(message)}")
+        return out.decode(errors="replace")
+
+    @staticmethod
+    def _redact_all(text: str) -> str:
+        return re.sub(r"://[^/@\s]+@", "://", text)
+
+    # ------------------------------------------------------------------
+    #  Resolving refs
+    # ------------------------------------------------------------------
+    async def resolve(self, url: str, ref: Optional[str] = None) -> str:
+        """Full commit SHA of *ref* in the mirror of *url*.
+
+        *ref* is a branch name (or ``refs/...``), a commit SHA (full or
+        abbreviated), or None for the remote's default branch.  A ref not
+        in the mirror triggers one forced fetch, so commits pushed since the
+        last refresh are found.
+        """
+        ref = (ref or "HEAD").strip()
+        if not ref or ref.startswith("-") or ".." in ref:
+            raise MirrorError(f"Invalid ref: {ref!r}")
+        if ref == "HEAD" or ref.startswith("refs/"):
+            candidates = [ref]
+        else:
+            candidates = [f"refs/heads/{ref}", f"refs/tags/{ref}"]
+            if _HEX.match(ref):
+                candidates.append(ref)
+
+        path = await self.fetch(url)
+        for attempt in range(2):
+            for candidate in candidates:
+                try:
+                    sha = await self._git(
+                        "rev-parse", "--verify", "--quiet", f"{candidate}^{{commit}}", cwd=path,
+                    )
+                except MirrorError:
+                    continue
+                _touch(os.path.join(path, _USED))
+                return sha.strip()
+            if attempt == 0:
+                path = await self.fetch(url, force=True)
+        raise MirrorError(f"Ref {ref!r} not found in {redact_url(url)}")
+
+    @asynccontextmanager
+    async def lease(self, url: str) -> AsyncIterator[str]:
+        """Keep the mirror of *url* from being evicted while in use; yields its path.
+
+        The lease is taken before the mirror is fetched (if it is missing or
+        stale), so ``resolve()`` inside it reads a mirror that stays put.
+        """
+        path = self.path_for(url)
+        os.makedirs(self.root, exist_ok=True)
+        async with _flock(f"{path}.use.lock", fcntl.LOCK_SH):
+            await self.fetch(url)
+            _touch(os.path.join(path, _USED))
+            yield path
+
+    # ------------------------------------------------------------------
+    #  Eviction
+    # ------------------------------------------------------------------
+    async def _evict(self, keep: Optional[str] = None) -> List[str]:
+        """Remove least-recently-used mirrors until the cache fits the budget."""
+        return await asyncio.to_thread(self._evict_sync, keep)
+
+    def _evict_sync(self, keep: Optional[str]) -> List[str]:
+        mirrors: List[Tuple[float, str, int]] = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith(".git") and os.path.isdir(path):
+                mirrors.append((_mtime(os.path.join(path, _USED)), path, _disk_usage(path)))
+        total = sum(size for _, _, size in mirrors)
+        evicted = []
+        for _, path, size in sorted(mirrors):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            # Skip mirrors that are being fetched or are leased right now
+            fetch_fd = _try_flock(f"{path}.fetch.lock", fcntl.LOCK_EX)
+            if fetch_fd is None:
+                continue
+            try:
+                use_fd = _try_flock(f"{path}.use.lock", fcntl.LOCK_EX)
+                if use_fd is None:
+                    continue
+                try:
+                    shutil.rmtree(path, ignore_errors=True)
+                finally:
+                    os.close(use_fd)
+            finally:
+                os.close(fetch_fd)
+            total -= size
+            evicted.append(path)
+        if evicted:
+            logger.info("Evicted %d git mirror(s); cache is now %.1f MB", len(evicted), total / 1048576)
+        return evicted
+
+
+repository_mirrors = RepositoryMirrors()
@@ -60,19 +60,50 @@ class TunnelSetupRequest(BaseModel):
     subdomain: str
 
 
-class TunnelSetupResponse(BaseModel):
-    success: bool
-    message: str
-    tunnel_id: str
+class ProvisioningJobResponse(BaseModel):
+    id: uuid.UUID
+    status: str  # pending, running, success, failed
+    domain: str
     subdomain: str
     public_url: str
+    tunnel_id: Optional[str] = None
+    steps: dict = {}
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
 
 
 # ---------- Project Schemas ----------
+# One DNS label: the project is served at <subdomain>.<tunnel domain>
+SUBDOMAIN_PATTERN = r"^[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?$"
+
+
 class ProjectCreate(BaseModel):
     name: str
     description: Optional[str] = None
     repository_url: Optional[str] = None
+    subdomain: Optional[str] = Field(default=None, pattern=SUBDOMAIN_PATTERN)  # default: from name
+
+
+# Most projects one batch request may create or delete
+PROJECT_BATCH_MAX = 500
+
+
+class ProjectBatchCreate(BaseModel):
+    projects: List[ProjectCreate] = Field(min_length=1, max_length=PROJECT_BATCH_MAX)
+
+
+class ProjectBatchDelete(BaseModel):
+    ids: List[uuid.UUID] = Field(min_length=1, max_length=PROJECT_BATCH_MAX)
+
+
+class ProjectBatchDeleteResponse(BaseModel):
+    deleted: List[uuid.UUID]
+    not_found: List[uuid.UUID]
 
 
 class ProjectResponse(BaseModel):
@@ -81,6 +112,7 @@ class ProjectResponse(BaseModel):
     name: str
     description: Optional[str] = None
     repository_url: Optional[str] = None
+    subdomain: Optional[str] = None
     status: str
     last_deployed_at: Optional[datetime] = None
     created_at: datetime
@@ -90,6 +122,10 @@ class ProjectResponse(BaseModel):
 
 
 # ---------- Deployment Schemas ----------
+class DeploymentCreate(BaseModel):
+    commit_sha: Optional[str] = Field(default=None, max_length=40)
+
+
 class DeploymentResponse(BaseModel):
     id: uuid.UUID
     project_id: uuid.UUID
@@ -97,16 +133,58 @@ class DeploymentResponse(BaseModel):
     commit_sha: Optional[str] = None
     duration_seconds: Optional[int] = None
     created_at: datetime
+    started_at: Optional[datetime] = None
     finished_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
 
 
+class DeploymentStatsBucket(BaseModel):
+    bucket_start: datetime
+    deployments: int
+    succeeded: int
+    failed: int
+    avg_duration_seconds: Optional[float] = None
+
+
+class ProjectDeploymentStats(BaseModel):
+    project_id: uuid.UUID
+    granularity: str
+    since: datetime
+    last_deployed_at: Optional[datetime] = None
+    last_success_at: Optional[datetime] = None
+    # Totals over the window starting at *since*
+    deployments: int
+    succeeded: int
+    failed: int
+    success_rate: Optional[float] = None
+    avg_duration_seconds: Optional[float] = None
+    deployments_per_day: float
+    buckets: List[DeploymentStatsBucket]
+
+
+# ---------- Webhook Schemas ----------
+
+class WebhookConfigCreate(BaseModel):
+    branch: Optional[str] = Field(default=None, max_length=255)  # default: every branch
+
+
+class WebhookConfigResponse(BaseModel):
+    url: str
+    secret: str  # shown once; sign payloads with HMAC-SHA256 (X-Hub-Signature-256)
+    branch: Optional[str] = None
+
+
+class WebhookDeliveryResponse(BaseModel):
+    status: str  # queued, duplicate, ignored, pong
+    deployment_id: Optional[uuid.UUID] = None
+
+
 # ---------- Platform / System Schemas ----------
 class ServiceStatus(BaseModel):
     name: str
-    status: str  # healthy, unhealthy, unknown
+    status: str  # healthy, unhealthy, unknown, unavailable, not configured
     port: Optional[int] = None
     uptime: Optional[str] = None
 
@@ -0,0 +1,92 @@
+"""
+Fast JSON responses.
+
+``FastJSONResponse`` is the app's default response class.  It encodes with
+orjson when that is installed (UUIDs and datetimes natively, UTC as "Z"
+like pydantic) and falls back to the stdlib encoder otherwise.
+
+Endpoints that return many rows can skip the ORM and per-row model
+validation.  ``columns_for`` selects exactly the fields of a response
+schema, and ``rows_response`` encodes the resulting rows directly.  Only use
+that path for flat schemas whose fields map one-to-one onto columns.
+"""
+import json
+import uuid
+from typing import Any, Iterable, List, Mapping, Optional, Type
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+from profiling import span
+
+try:
+    import orjson
+except ImportError:  # optional; stdlib json is used instead
+    orjson = None
+
+_Fragment = getattr(orjson, "Fragment", None)  # orjson >= 3.9.11
+
+
+def _default(obj: Any) -> Any:
+    # asyncpg returns its own uuid.UUID subclass, which orjson does not accept
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    with span("serialization"):
+        if orjson is not None:
+            return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+        return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def raw_json(text: str) -> Any:
+    """Embed an already encoded JSON document in ``dumps`` output (as it is, where orjson can)."""
+    if _Fragment is not None:
+        return _Fragment(text)
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+
+def dumps_lines(items: Iterable[Any]) -> bytes:
+    """Encode *items* as newline-delimited JSON, one document per line."""
+    with span("serialization"):
+        if orjson is not None:
+            option = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+            return b"".join(orjson.dumps(item, default=_default, option=option) for item in items)
+        return "".join(
+            json.dumps(jsonable_encoder(item), ensure_ascii=False, separators=(",", ":")) + "\n" for item in items
+        ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def columns_for(entity, schema: Type[BaseModel]) -> List[Any]:
+    """The mapped attributes of *entity* named by *schema*'s fields, in order."""
+    return [getattr(entity, name) for name in schema.model_fields]
+
+
+def rows_response(
+    rows: Iterable, headers: Optional[Mapping[str, str]] = None, status_code: int = 200,
+) -> Response:
+    """Encode result rows (from a ``columns_for`` select) as a JSON array."""
+    return Response(
+        content=dumps([row._asdict() for row in rows]),
+        status_code=status_code,
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+def row_response(row, headers: Optional[Mapping[str, str]] = None, status_code: int = 200) -> Response:
+    """Encode one result row (from a ``columns_for`` select) as a JSON object."""
+    return Response(
+        content=dumps(row._asdict()),
+        status_code=status_code,
+        media_type="application/json",
+        headers=headers,
+    )
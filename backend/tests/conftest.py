@@ -0,0 +1,106 @@
+"""
+Shared test setup.
+
+The backend modules are imported flat (``import repo_mirror``), as the app
+imports them, so the backend directory goes on sys.path.  Async tests use
+the anyio pytest plugin (anyio ships with FastAPI) on asyncio.
+
+Tests marked with the ``database`` fixture need a migrated database at
+DATABASE_URL (CI runs ``alembic upgrade head`` first) and are skipped when
+it cannot be reached.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Before any backend module reads them
+os.environ.setdefault("GIT_ALLOWED_SCHEMES", "https,ssh,git,file")
+os.environ.setdefault("GIT_MIRROR_DIR", tempfile.mkdtemp(prefix="deployx-mirrors-"))
+os.environ.setdefault("DEPLOY_WORKER_ENABLED", "false")
+
+_GIT_ENV = dict(
+    os.environ,
+    GIT_AUTHOR_NAME="DeployX Tests", GIT_AUTHOR_EMAIL="tests@example.com",
+    GIT_COMMITTER_NAME="DeployX Tests", GIT_COMMITTER_EMAIL="tests@example.com",
+)
+
+
+def git(*args, cwd=None) -> str:
+    result = subprocess.run(["git", *args], cwd=cwd, env=_GIT_ENV, check=True, capture_output=True, text=True)
+    return result.stdout.strip()
+
+
+class Origin:
+    """A bare repository on disk and a working clone that pushes to it."""
+
+    def __init__(self, tmp_path):
+        self.bare = tmp_path / "origin.git"
+        self.work = tmp_path / "work"
+        git("init", "--quiet", "--bare", "--initial-branch=main", str(self.bare))
+        git("clone", "--quiet", str(self.bare), str(self.work))
+        git("checkout", "--quiet", "-B", "main", cwd=self.work)
+        self.url = self.bare.as_uri()
+
+    def commit(self, message: str) -> str:
+        """Commit a change on main, push it and return its SHA."""
+        (self.work / "CHANGES").write_text(message + "\n")
+        git("add", "CHANGES", cwd=self.work)
+        git("commit", "--quiet", "-m", message, cwd=self.work)
+        git("push", "--quiet", "origin", "main", cwd=self.work)
+        return git("rev-parse", "HEAD", cwd=self.work)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def origin(tmp_path):
+    return Origin(tmp_path)
+
+
+@pytest.fixture
+async def database():
+    """The primary engine, or a skip if DATABASE_URL cannot be reached."""
+    from sqlalchemy import text
+
+    from database import engine
+
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    except Exception as e:
+        await engine.dispose()
+        pytest.skip(f"database unavailable: {type(e).__name__}")
+    yield engine
+    # Pooled connections belong to this test's event loop
+    await engine.dispose()
+
+
+@pytest.fixture
+async def project(database):
+    """A user and a project of theirs, deleted (with their deployments) afterwards."""
+    from sqlalchemy import delete
+
+    from database import AsyncSessionLocal
+    from models import Project, User
+
+    tag = uuid.uuid4().hex[:12]
+    async with AsyncSessionLocal() as db:
+        user = User(email=f"test-{tag}@example.com", username=f"test-{tag}", hashed_password="x" * 60)
+        db.add(user)
+        await db.flush()
+        project = Project(user_id=user.id, name=f"test-{tag}", subdomain=f"test-{tag}")
+        db.add(project)
+        await db.commit()
+    yield project
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(User).where(User.id == user.id))
+        await db.commit()
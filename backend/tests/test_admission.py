@@ -0,0 +1,112 @@
+import asyncio
+
+import httpx
+import pytest
+from prometheus_client import REGISTRY
+from starlette.responses import PlainTextResponse
+
+from admission import AdmissionGate, AdmissionMiddleware
+
+pytestmark = pytest.mark.anyio
+
+
+def _rejected(route_class: str, reason: str) -> float:
+    return REGISTRY.get_sample_value(
+        "deployx_admission_rejected_total", {"route_class": route_class, "reason": reason}
+    ) or 0
+
+
+async def test_freed_slots_go_to_the_oldest_waiter():
+    gate = AdmissionGate("test", concurrency=1, queue_size=5, queue_timeout=5)
+    assert await gate.acquire() is None
+    admitted = []
+
+    async def request(name):
+        assert await gate.acquire() is None
+        admitted.append(name)
+
+    first = asyncio.create_task(request("first"))
+    second = asyncio.create_task(request("second"))
+    await asyncio.sleep(0)
+    assert gate.waiting == 2
+
+    # A new arrival right after the release must queue behind both
+    gate.release(0.1)
+    late = asyncio.create_task(request("late"))
+    await asyncio.sleep(0)
+    assert admitted == ["first"]
+    gate.release(0.1)
+    await asyncio.sleep(0)
+    gate.release(0.1)
+    await asyncio.gather(first, second, late)
+    assert admitted == ["first", "second", "late"]
+    assert gate.active == 1 and gate.waiting == 0
+
+
+async def test_cancelled_waiter_leaves_the_queue():
+    gate = AdmissionGate("test", concurrency=1, queue_size=5, queue_timeout=5)
+    await gate.acquire()
+    waiter = asyncio.create_task(gate.acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert gate.waiting == 0
+
+    gate.release(0.1)
+    assert gate.active == 0
+    assert await gate.acquire() is None
+
+
+@pytest.fixture
+async def busy():
+    """An app whose /slow requests hold their slot until released, behind a one-slot read gate."""
+    release = asyncio.Event()
+
+    async def app(scope, receive, send):
+        if scope["path"] == "/slow":
+            await release.wait()
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    middleware = AdmissionMiddleware(app, enabled=True)
+    middleware.gates["read"] = AdmissionGate("read", concurrency=1, queue_size=1, queue_timeout=0.2)
+    transport = httpx.ASGITransport(app=middleware)
+    async with httpx.AsyncClient(transport=transport, base_url="http://deployx.test") as client:
+        holder = asyncio.create_task(client.get("/slow"))
+        while not middleware.gates["read"].active:
+            await asyncio.sleep(0)
+        yield client, middleware.gates["read"]
+        release.set()
+        assert (await holder).status_code == 200
+
+
+async def test_deadline_and_full_queue_are_answered_503_with_retry_after(busy):
+    client, gate = busy
+    deadline, queue_full = _rejected("read", "deadline"), _rejected("read", "queue_full")
+
+    queued = asyncio.create_task(client.get("/api/projects"))
+    while not gate.waiting:
+        await asyncio.sleep(0)
+    r = await client.get("/api/projects")
+    assert r.status_code == 503
+    assert 1 <= int(r.headers["Retry-After"]) <= 30
+    assert _rejected("read", "queue_full") == queue_full + 1
+
+    r = await queued
+    assert r.status_code == 503
+    assert int(r.headers["Retry-After"]) >= 1
+    assert _rejected("read", "deadline") == deadline + 1
+    assert gate.waiting == 0
+
+
+@pytest.mark.parametrize("path", ["/", "/api/health", "/api/metrics"])
+async def test_exempt_paths_bypass_a_full_gate(busy, path):
+    client, gate = busy
+    queued = asyncio.create_task(client.get("/api/projects"))
+    while not gate.waiting:
+        await asyncio.sleep(0)
+
+    r = await client.get(path)
+    assert r.status_code == 200
+    assert (await client.get("/api/projects")).status_code == 503
+    await queued
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+from sqlalchemy import delete, select
+
+import audit
+from audit import AuditWriter
+
+pytestmark = pytest.mark.anyio
+
+
+def _queued(writer: AuditWriter):
+    """Actions of the events waiting in *writer*'s queue, oldest first (drains it)."""
+    actions = []
+    while not writer._queue.empty():
+        actions.append(writer._queue.get_nowait()["action"])
+    return actions
+
+
+async def _fill(writer: AuditWriter, *actions: str):
+    for action in actions:
+        await writer.record(action)
+
+
+async def test_drop_oldest_makes_room_for_the_new_event():
+    writer = AuditWriter(maxsize=2, overflow_policy="drop_oldest")
+    await _fill(writer, "one", "two", "three", "four")
+    assert writer.dropped == 2
+    assert _queued(writer) == ["three", "four"]
+
+
+async def test_drop_newest_keeps_the_queue_as_it_was():
+    writer = AuditWriter(maxsize=2, overflow_policy="drop_newest")
+    await _fill(writer, "one", "two", "three", "four")
+    assert writer.dropped == 2
+    assert _queued(writer) == ["one", "two"]
+
+
+async def test_block_waits_for_room_then_gives_up(monkeypatch):
+    monkeypatch.setattr(audit, "AUDIT_ENQUEUE_TIMEOUT_SECONDS", 0.05)
+    writer = AuditWriter(maxsize=1, overflow_policy="block")
+    await _fill(writer, "one")
+
+    # Room appears while the producer waits: nothing is dropped
+    blocked = asyncio.create_task(writer.record("two"))
+    await asyncio.sleep(0)
+    assert not blocked.done()
+    assert writer._queue.get_nowait()["action"] == "one"
+    await blocked
+    assert writer.dropped == 0
+
+    # No room within the timeout: the new event is dropped
+    await writer.record("three")
+    assert writer.dropped == 1
+    assert _queued(writer) == ["two"]
+
+
+async def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError, match="overflow policy"):
+        AuditWriter(overflow_policy="drop_everything")
+
+
+async def test_stop_flushes_queued_events(project):
+    from database import AsyncSessionLocal
+    from models import AuditLog
+
+    # A flush interval far beyond the test: only stop() can write the events
+    writer = AuditWriter(batch_size=3, flush_interval=60)
+    for i in range(7):
+        await writer.record("test_flush", user_id=project.user_id, resource_id=str(i))
+    await writer.start()
+    try:
+        await asyncio.wait_for(writer.stop(), 5)
+        assert writer.written == 7 and writer.dropped == 0
+        async with AsyncSessionLocal() as db:
+            written = (
+                await db.scalars(select(AuditLog.resource_id).where(AuditLog.user_id == project.user_id))
+            ).all()
+        assert sorted(written) == [str(i) for i in range(7)]
+    finally:
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(AuditLog).where(AuditLog.user_id == project.user_id))
+            await db.commit()
@@ -0,0 +1,80 @@
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+pytestmark = pytest.mark.anyio
+
+
+def _request() -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/api/auth/me", "headers": []})
+
+
+@pytest.fixture
+async def user(database):
+    """A user of its own, deleted afterwards."""
+    from sqlalchemy import delete
+
+    from database import AsyncSessionLocal
+    from models import User
+
+    tag = uuid.uuid4().hex[:12]
+    async with AsyncSessionLocal() as db:
+        user = User(email=f"test-{tag}@example.com", username=f"test-{tag}", hashed_password="x" * 60)
+        db.add(user)
+        await db.commit()
+    yield user
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(User).where(User.id == user.id))
+        await db.commit()
+
+
+async def test_committed_user_changes_evict_the_cached_principal(user):
+    from auth import create_access_token, get_current_user, principal_cache
+    from database import AsyncSessionLocal
+    from models import User
+
+    token = create_access_token({"sub": user.username, "uid": str(user.id)})
+    principal = await get_current_user(_request(), token)
+    assert principal.email == user.email
+    assert principal_cache.get(str(user.id)) is principal
+
+    # A change that is rolled back leaves the entry alone
+    async with AsyncSessionLocal() as db:
+        (await db.get(User, user.id)).email = f"rolled-back-{user.email}"
+        await db.flush()
+        await db.rollback()
+    assert principal_cache.get(str(user.id)) is principal
+
+    async with AsyncSessionLocal() as db:
+        (await db.get(User, user.id)).email = f"changed-{user.email}"
+        await db.commit()
+    assert principal_cache.get(str(user.id)) is None
+    assert (await get_current_user(_request(), token)).email == f"changed-{user.email}"
+
+    async with AsyncSessionLocal() as db:
+        (await db.get(User, user.id)).is_active = False
+        await db.commit()
+    with pytest.raises(HTTPException) as exc:
+        await get_current_user(_request(), token)
+    assert exc.value.status_code == 400
+
+
+async def test_deleted_user_is_evicted(user):
+    from auth import create_access_token, get_current_user, principal_cache
+    from database import AsyncSessionLocal
+    from models import User
+
+    # A token from before the "uid" claim is cached under the username
+    token = create_access_token({"sub": user.username})
+    await get_current_user(_request(), token)
+    assert principal_cache.get(user.username) is not None
+
+    async with AsyncSessionLocal() as db:
+        await db.delete(await db.get(User, user.id))
+        await db.commit()
+    assert principal_cache.get(user.username) is None
+    with pytest.raises(HTTPException) as exc:
+        await get_current_user(_request(), token)
+    assert exc.value.status_code == 401
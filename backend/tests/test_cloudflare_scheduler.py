@@ -0,0 +1,183 @@
+import asyncio
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import cloudflare_scheduler
+from cloudflare_scheduler import (
+    CircuitBreaker, CloudflareScheduler, CloudflareUnavailable, TokenBucket, scheduler_for,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeClock:
+    """Stands in for time.monotonic/perf_counter and asyncio.sleep in cloudflare_scheduler."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += max(seconds, 0)
+        await asyncio.sleep(0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cloudflare_scheduler, "time", SimpleNamespace(
+        **{**vars(time), "monotonic": clock.monotonic, "perf_counter": clock.monotonic}
+    ))
+    monkeypatch.setattr(cloudflare_scheduler, "asyncio", SimpleNamespace(**{**vars(asyncio), "sleep": clock.sleep}))
+    # Deterministic backoff: the full exponential delay
+    monkeypatch.setattr(cloudflare_scheduler, "backoff", lambda attempt: 0.5 * 2 ** attempt)
+    monkeypatch.setattr(cloudflare_scheduler, "breaker", CircuitBreaker(threshold=100, reset_seconds=30))
+    return clock
+
+
+class FakeCloudflare:
+    """Answers each request with the next of *responses* (status or (status, headers))."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.client = httpx.AsyncClient(transport=httpx.MockTransport(self.handle))
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request.method)
+        # The last response repeats
+        response = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        status, headers = response if isinstance(response, tuple) else (response, {})
+        return httpx.Response(status, headers=headers, json={"success": status < 400})
+
+    def sender(self, method: str):
+        return lambda: self.client.request(method, "https://api.cloudflare.com/client/v4/zones")
+
+
+def _scheduler(rate: float = 100, burst: int = 100, concurrency: int = 4) -> CloudflareScheduler:
+    return CloudflareScheduler(rate=rate, burst=burst, concurrency=concurrency)
+
+
+async def test_bucket_allows_a_burst_then_refills_at_the_rate(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    for _ in range(3):
+        await bucket.take()
+    assert clock.sleeps == []
+
+    await bucket.take()
+    assert clock.sleeps == [pytest.approx(0.5)]
+
+    # A long idle spell refills to the burst, not beyond it
+    clock.now += 60
+    clock.sleeps.clear()
+    for _ in range(3):
+        await bucket.take()
+    assert clock.sleeps == []
+    await bucket.take()
+    assert clock.sleeps == [pytest.approx(0.5)]
+
+
+async def test_429_waits_out_retry_after_and_pauses_the_bucket(clock):
+    cf = FakeCloudflare((429, {"Retry-After": "7"}), 200)
+    scheduler = _scheduler()
+    start = clock.now
+
+    resp = await scheduler.send("POST", cf.sender("POST"))
+
+    assert resp.status_code == 200
+    assert cf.requests == ["POST", "POST"]  # a 429 was not carried out, so even a POST is retried
+    assert clock.now - start >= 7
+    assert scheduler.bucket.paused is False
+
+
+async def test_retry_after_beyond_the_limit_returns_the_429(clock, monkeypatch):
+    monkeypatch.setattr(cloudflare_scheduler, "CLOUDFLARE_RETRY_MAX_SECONDS", 30)
+    cf = FakeCloudflare((429, {"Retry-After": "3600"}))
+
+    resp = await _scheduler().send("GET", cf.sender("GET"))
+
+    assert resp.status_code == 429
+    assert cf.requests == ["GET"]
+
+
+async def test_server_errors_are_retried_only_for_idempotent_methods(clock, monkeypatch):
+    monkeypatch.setattr(cloudflare_scheduler, "CLOUDFLARE_MAX_RETRIES", 3)
+    cf = FakeCloudflare(503)
+    resp = await _scheduler().send("GET", cf.sender("GET"))
+    assert resp.status_code == 503
+    assert cf.requests == ["GET"] * 4
+    assert clock.sleeps == [0.5, 1.0, 2.0]
+
+    cf = FakeCloudflare(503)
+    resp = await _scheduler().send("POST", cf.sender("POST"))
+    assert resp.status_code == 503
+    assert cf.requests == ["POST"]
+
+    cf = FakeCloudflare(502, 200)
+    resp = await _scheduler().send("PUT", cf.sender("PUT"))
+    assert resp.status_code == 200
+    assert cf.requests == ["PUT", "PUT"]
+
+
+async def test_breaker_opens_probes_once_and_closes(clock, monkeypatch):
+    breaker = CircuitBreaker(threshold=2, reset_seconds=30)
+    monkeypatch.setattr(cloudflare_scheduler, "breaker", breaker)
+    monkeypatch.setattr(cloudflare_scheduler, "CLOUDFLARE_MAX_RETRIES", 0)
+    scheduler = _scheduler()
+
+    cf = FakeCloudflare(500)
+    for _ in range(2):
+        await scheduler.send("GET", cf.sender("GET"))
+    with pytest.raises(CloudflareUnavailable, match="retrying in 30s"):
+        await scheduler.send("GET", cf.sender("GET"))
+    assert cf.requests == ["GET", "GET"]
+
+    # Half open after the reset interval: one probe goes through, the rest are held back
+    clock.now += 30
+    breaker.check()
+    with pytest.raises(CloudflareUnavailable):
+        breaker.check()
+
+    # A successful probe closes the circuit
+    breaker.success()
+    cf = FakeCloudflare(200)
+    assert (await scheduler.send("GET", cf.sender("GET"))).status_code == 200
+    assert breaker.opened_at is None and breaker.failures == 0
+
+
+async def test_queue_timeout_reports_the_remaining_budget():
+    scheduler = _scheduler(concurrency=1)
+    await scheduler._turn()  # hold the only slot
+    with pytest.raises(CloudflareUnavailable, match=r"within the 0\.05s left of its 30s budget"):
+        await scheduler._acquire(0.05)
+
+
+async def test_idle_schedulers_are_evicted_least_recently_used_first(clock, monkeypatch):
+    monkeypatch.setattr(cloudflare_scheduler, "CLOUDFLARE_SCHEDULERS_MAX", 2)
+    monkeypatch.setattr(cloudflare_scheduler, "_schedulers", OrderedDict())
+    schedulers = cloudflare_scheduler._schedulers
+
+    a, b = scheduler_for("a"), scheduler_for("b")
+    assert scheduler_for("a") is a  # "a" is now the most recently used
+    scheduler_for("c")
+    assert list(schedulers) == ["a", "c"]
+
+    # Busy, or paused by a Retry-After: kept even over the limit
+    a._calls = 1
+    schedulers["c"].bucket.pause(10)
+    scheduler_for("d")
+    assert list(schedulers) == ["a", "c", "d"]
+
+    a._calls = 0
+    clock.now += 10
+    scheduler_for("e")
+    assert list(schedulers) == ["d", "e"]
+    assert b not in schedulers.values()
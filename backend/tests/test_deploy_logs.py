@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+import deploy_logs
+from database import AsyncSessionLocal
+from deploy_logs import DeploymentLogWriter, iter_log
+from models import Deployment, DeploymentLogChunk
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def deployment(project):
+    async with AsyncSessionLocal() as db:
+        dep = Deployment(project_id=project.id, user_id=project.user_id, status="failed")
+        db.add(dep)
+        await db.commit()
+    return dep
+
+
+class FailingOnce:
+    """Session factory whose first session cannot execute anything."""
+
+    def __init__(self):
+        self.failed = False
+
+    def __call__(self):
+        session = AsyncSessionLocal()
+        if not self.failed:
+            self.failed = True
+
+            async def execute(*args, **kwargs):
+                raise OperationalError("INSERT", {}, ConnectionResetError("connection lost"))
+
+            session.execute = execute
+        return session
+
+
+async def test_a_failed_flush_keeps_the_output_for_the_next_one(deployment, monkeypatch):
+    monkeypatch.setattr(deploy_logs, "AsyncSessionLocal", FailingOnce())
+    writer = DeploymentLogWriter(deployment.id, chunk_chars=8)
+
+    with pytest.raises(OperationalError):
+        await writer.write("step one\n")
+    await writer.write("step two\n")
+    await writer.close()
+
+    async with AsyncSessionLocal() as db:
+        chunks = (await db.execute(
+            select(DeploymentLogChunk.seq, DeploymentLogChunk.start_offset, DeploymentLogChunk.end_offset)
+            .where(DeploymentLogChunk.deployment_id == deployment.id)
+            .order_by(DeploymentLogChunk.seq)
+        )).all()
+    assert [seq for seq, _, _ in chunks] == list(range(len(chunks)))
+    assert [start for _, start, _ in chunks] == [0] + [end for _, _, end in chunks[:-1]]
+
+    text = "".join([piece async for _, piece in iter_log(deployment.id, follow=False)])
+    assert text == "step one\nstep two\n"
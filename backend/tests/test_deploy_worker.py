@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from database import AsyncSessionLocal
+from deploy_worker import DeploymentWorker, queue_deployment
+from executors import LocalShellExecutor
+from models import Deployment, DeploymentLogChunk, Project
+
+pytestmark = pytest.mark.anyio
+
+
+async def _run(executor, project) -> Deployment:
+    """Queue a deployment of *project*, let a worker run it and return the finished row."""
+    async with AsyncSessionLocal() as db:
+        queued = await queue_deployment(db, project.id, project.user_id)
+        await db.commit()
+    worker = DeploymentWorker(executor, poll_interval=0.05)
+    await worker.start()
+    try:
+        for _ in range(600):
+            async with AsyncSessionLocal() as db:
+                dep = await db.get(Deployment, queued.id)
+            if dep.status in ("success", "failed"):
+                return dep
+            await asyncio.sleep(0.05)
+        pytest.fail(f"deployment still {dep.status}")
+    finally:
+        await worker.stop()
+
+
+async def _log(deployment_id) -> str:
+    async with AsyncSessionLocal() as db:
+        chunks = await db.scalars(
+            select(DeploymentLogChunk.content)
+            .where(DeploymentLogChunk.deployment_id == deployment_id)
+            .order_by(DeploymentLogChunk.seq)
+        )
+        return "".join(chunks)
+
+
+async def test_deploys_the_fetched_commit_through_the_shell_executor(project, origin):
+    sha = origin.commit("first")
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            Project.__table__.update().where(Project.id == project.id).values(repository_url=origin.url)
+        )
+        await db.commit()
+    executor = LocalShellExecutor(
+        build_commands=['git --git-dir="$DEPLOYX_MIRROR_PATH" log -1 --format=%s "$DEPLOYX_COMMIT_SHA"'],
+        deploy_commands=['echo "deployed $DEPLOYX_PROJECT_NAME"'],
+    )
+
+    dep = await _run(executor, project)
+
+    log = await _log(dep.id)
+    assert dep.status == "success", log
+    assert dep.commit_sha == sha
+    assert dep.started_at is not None and dep.finished_at >= dep.started_at
+    assert f"Commit {sha}\n" in log
+    assert "\nfirst\n" in log
+    assert f"deployed {project.name}\n" in log
+    async with AsyncSessionLocal() as db:
+        assert (await db.get(Project, project.id)).status == "active"
+
+
+async def test_a_failing_build_fails_the_deployment(project):
+    executor = LocalShellExecutor(["echo compiling", "exit 2"], ["echo never"])
+
+    dep = await _run(executor, project)
+
+    log = await _log(dep.id)
+    assert dep.status == "failed"
+    assert "compiling\n" in log
+    assert "ERROR: Command exited with status 2: exit 2\n" in log
+    assert "never" not in log
@@ -0,0 +1,59 @@
+import uuid
+
+import pytest
+
+from executors import DeploymentContext, ExecutorError, LocalShellExecutor
+
+pytestmark = pytest.mark.anyio
+
+
+def _context(**kwargs) -> DeploymentContext:
+    values = dict(
+        deployment_id=uuid.uuid4(), project_id=uuid.uuid4(), project_name="shop",
+        repository_url="https://example.com/shop.git", commit_sha="a" * 40,
+    )
+    return DeploymentContext(**{**values, **kwargs})
+
+
+class Log:
+    def __init__(self):
+        self.parts = []
+
+    async def __call__(self, text: str):
+        self.parts.append(text)
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+
+async def test_commands_run_in_order_and_see_the_deployment(tmp_path):
+    ctx = _context()
+    executor = LocalShellExecutor(
+        build_commands=['echo "build $DEPLOYX_PROJECT_NAME $DEPLOYX_COMMIT_SHA"', "echo oops >&2"],
+        deploy_commands=['echo "deploy $DEPLOYX_DEPLOYMENT_ID" > deployed', "cat deployed"],
+        cwd=str(tmp_path),
+    )
+    log = Log()
+    await executor.build(ctx, log)
+    await executor.deploy(ctx, log)
+
+    assert log.text.splitlines() == [
+        '$ echo "build $DEPLOYX_PROJECT_NAME $DEPLOYX_COMMIT_SHA"',
+        f"build shop {ctx.commit_sha}",
+        "$ echo oops >&2",
+        "oops",
+        '$ echo "deploy $DEPLOYX_DEPLOYMENT_ID" > deployed',
+        "$ cat deployed",
+        f"deploy {ctx.deployment_id}",
+    ]
+
+
+async def test_failing_and_slow_commands_raise():
+    log = Log()
+    with pytest.raises(ExecutorError, match="status 3"):
+        await LocalShellExecutor(["echo before; exit 3", "echo never"], []).build(_context(), log)
+    assert "before" in log.text and "never" not in log.text
+
+    with pytest.raises(ExecutorError, match="timed out after 0.2s"):
+        await LocalShellExecutor([], ["sleep 5"], timeout=0.2).deploy(_context(), Log())
@@ -0,0 +1,123 @@
+import pytest
+from sqlalchemy import select, update
+
+import ingress
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeCloudflare:
+    """Records the calls ingress.py makes in place of CloudflareService."""
+
+    calls = []
+    on_put = None
+
+    def __init__(self, api_token: str):
+        self.api_token = api_token
+
+    async def get_account_id(self):
+        self.calls.append(("account",))
+        return "account-1"
+
+    async def get_tunnel_hostnames(self, account_id, tunnel_id):
+        self.calls.append(("get_ingress", tunnel_id))
+        return []
+
+    async def create_dns_record(self, zone_id, host, tunnel_id):
+        self.calls.append(("cname", host))
+        return True
+
+    async def configure_tunnel_routing(self, account_id, tunnel_id, hostnames):
+        self.calls.append(("put", sorted(hostnames)))
+        if self.on_put:
+            await self.on_put()
+        return True
+
+
+@pytest.fixture
+async def tunnel(project, monkeypatch):
+    """An active tunnel for the project's owner whose cached rule set has only the dashboard."""
+    from database import AsyncSessionLocal
+    from models import CloudflareConfig
+
+    monkeypatch.setattr(FakeCloudflare, "calls", [])
+    monkeypatch.setattr(ingress, "CloudflareService", FakeCloudflare)
+    async with AsyncSessionLocal() as db:
+        cfg = CloudflareConfig(
+            user_id=project.user_id, api_token="token", zone_id="zone-1", domain="example.com",
+            subdomain="dash", tunnel_id="tunnel-1", account_id="account-1",
+            ingress_hostnames=["dash.example.com"],
+        )
+        db.add(cfg)
+        await db.commit()
+    return cfg
+
+
+async def _config(user_id):
+    from database import AsyncSessionLocal
+    from models import CloudflareConfig
+
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(select(CloudflareConfig).where(CloudflareConfig.user_id == user_id))).scalar_one()
+
+
+async def _add_project(user_id, subdomain):
+    from database import AsyncSessionLocal
+    from models import Project
+
+    async with AsyncSessionLocal() as db:
+        db.add(Project(user_id=user_id, name=subdomain, subdomain=subdomain))
+        await db.commit()
+
+
+async def test_only_added_hostnames_get_a_cname_and_one_put(project, tunnel):
+    assert await ingress.sync_tunnel_ingress(project.user_id)
+    project_host = f"{project.subdomain}.example.com"
+    assert FakeCloudflare.calls == [
+        ("cname", project_host),
+        ("put", ["dash.example.com", project_host]),
+    ]
+    cfg = await _config(project.user_id)
+    assert cfg.ingress_hostnames == ["dash.example.com", project_host]
+    assert cfg.ingress_version == 1
+
+    # Nothing changed: no calls at all
+    FakeCloudflare.calls.clear()
+    assert await ingress.sync_tunnel_ingress(project.user_id)
+    assert FakeCloudflare.calls == []
+
+    await _add_project(project.user_id, f"{project.subdomain}-two")
+    assert await ingress.sync_tunnel_ingress(project.user_id)
+    second_host = f"{project.subdomain}-two.example.com"
+    assert FakeCloudflare.calls == [
+        ("cname", second_host),
+        ("put", sorted(["dash.example.com", project_host, second_host])),
+    ]
+    assert (await _config(project.user_id)).ingress_version == 2
+    assert project.user_id not in ingress._states
+
+
+async def test_concurrent_write_makes_the_sync_resend_the_rule_set(project, tunnel, monkeypatch):
+    from database import AsyncSessionLocal
+    from models import CloudflareConfig
+
+    async def another_worker_writes():
+        monkeypatch.setattr(FakeCloudflare, "on_put", None)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(CloudflareConfig)
+                .where(CloudflareConfig.user_id == project.user_id)
+                .values(ingress_version=CloudflareConfig.ingress_version + 1)
+            )
+            await db.commit()
+
+    monkeypatch.setattr(FakeCloudflare, "on_put", staticmethod(another_worker_writes))
+    assert await ingress.sync_tunnel_ingress(project.user_id)
+
+    desired = ["dash.example.com", f"{project.subdomain}.example.com"]
+    # The other worker's write left the cache as it was, so the CNAME is
+    # created again (it already exists, which Cloudflare accepts)
+    assert [c for c in FakeCloudflare.calls if c[0] == "put"] == [("put", desired)] * 2
+    cfg = await _config(project.user_id)
+    assert cfg.ingress_hostnames == desired
+    assert cfg.ingress_version == 2
@@ -0,0 +1,64 @@
+import pytest
+from prometheus_client import REGISTRY
+
+pytestmark = pytest.mark.anyio
+
+
+def _sample(name: str) -> float:
+    return REGISTRY.get_sample_value(name) or 0.0
+
+
+async def test_pool_metrics_follow_the_pool_across_dispose(database):
+    pool = database.sync_engine.pool
+    await database.dispose()
+    assert database.sync_engine.pool is not pool
+
+    waits = _sample("deployx_db_pool_checkout_wait_seconds_count")
+    checkouts = _sample("deployx_db_pool_checkouts_total")
+    async with database.connect():
+        async with database.connect():
+            assert _sample("deployx_db_pool_checked_out") == 2
+    assert _sample("deployx_db_pool_checked_out") == 0
+    assert _sample("deployx_db_pool_checkouts_total") == checkouts + 2
+    assert _sample("deployx_db_pool_checkout_wait_seconds_count") == waits + 2
+
+
+async def test_overflow_is_counted_while_checked_out(database):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from database import DATABASE_URL, _async_url
+    from metrics import TimedQueuePool, instrument_pool
+
+    small = create_async_engine(_async_url(DATABASE_URL), pool_size=1, max_overflow=1, poolclass=TimedQueuePool)
+    instrument_pool(small)
+    try:
+        async with small.connect():
+            async with small.connect():
+                assert _sample("deployx_db_pool_overflow") == 1
+        # The second connection returned finds the pool full and is closed
+        assert _sample("deployx_db_pool_overflow") == 0
+    finally:
+        await small.dispose()
+
+
+async def test_pool_metrics_survive_the_post_fork_hook(database, monkeypatch):
+    import importlib.util
+    import os
+
+    # One worker: loading the config must not set up the multiprocess directory
+    monkeypatch.setenv("WEB_CONCURRENCY", "1")
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gunicorn.conf.py")
+    spec = importlib.util.spec_from_file_location("gunicorn_conf", path)
+    conf = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(conf)
+
+    await database.dispose()  # as at fork time: nothing pooled yet
+    pool = database.sync_engine.pool
+    conf.post_fork(server=None, worker=None)
+    assert database.sync_engine.pool is not pool
+
+    waits = _sample("deployx_db_pool_checkout_wait_seconds_count")
+    async with database.connect():
+        assert _sample("deployx_db_pool_checked_out") == 1
+    assert _sample("deployx_db_pool_checked_out") == 0
+    assert _sample("deployx_db_pool_checkout_wait_seconds_count") == waits + 1
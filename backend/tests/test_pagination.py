@@ -0,0 +1,112 @@
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+from sqlalchemy import delete
+
+from pagination import encode_cursor
+
+pytestmark = pytest.mark.anyio
+
+# Every row the tests add shares this timestamp, so only the id orders them
+TIE = datetime(2026, 10, 1, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+async def client(project):
+    """A client authenticated as the project's owner."""
+    import main
+    from auth import create_access_token
+    from database import AsyncSessionLocal
+    from models import User
+
+    async with AsyncSessionLocal() as db:
+        user = await db.get(User, project.user_id)
+    token = create_access_token({"sub": user.username, "uid": str(user.id)})
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://deployx.test", headers={"Authorization": f"Bearer {token}"},
+    ) as client:
+        yield client
+
+
+async def _pages(client, path: str, limit: int, **params):
+    """Every page of *path*; asserts that only the last one lacks a cursor."""
+    pages, cursor = [], None
+    while True:
+        query = {**params, "limit": limit, **({"cursor": cursor} if cursor else {})}
+        r = await client.get(path, params=query)
+        assert r.status_code == 200, r.text
+        pages.append([row["id"] for row in r.json()])
+        cursor = r.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages
+        assert len(pages[-1]) == limit
+
+
+async def test_projects_with_equal_timestamps_page_in_a_stable_order(client, project):
+    from database import AsyncSessionLocal
+    from models import Project
+
+    async with AsyncSessionLocal() as db:
+        tied = [
+            Project(user_id=project.user_id, name=f"tied-{i}", subdomain=f"{project.subdomain}-{i}", created_at=TIE)
+            for i in range(5)
+        ]
+        db.add_all(tied)
+        await db.commit()
+
+    pages = await _pages(client, "/api/projects", limit=2)
+    ids = [i for page in pages for i in page]
+    # Newest first, then id descending among the tied rows; none repeated or skipped
+    expected = [str(project.id)] + sorted((str(p.id) for p in tied), key=uuid.UUID, reverse=True)
+    assert ids == expected
+    assert [len(page) for page in pages] == [2, 2, 2]
+
+    pages = await _pages(client, "/api/projects", limit=4, sort="created_at")
+    assert [i for page in pages for i in page] == expected[::-1]
+
+
+async def test_audit_logs_with_equal_timestamps_page_in_a_stable_order(client, project):
+    from database import AsyncSessionLocal
+    from models import AuditLog
+
+    async with AsyncSessionLocal() as db:
+        rows = [
+            AuditLog(user_id=project.user_id, action="test", resource_id=str(i), created_at=TIE) for i in range(5)
+        ]
+        db.add_all(rows)
+        await db.commit()
+    try:
+        pages = await _pages(client, "/api/audit-logs", limit=2)
+        assert [i for page in pages for i in page] == sorted((str(r.id) for r in rows), key=uuid.UUID, reverse=True)
+        assert [len(page) for page in pages] == [2, 2, 1]
+    finally:
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(AuditLog).where(AuditLog.user_id == project.user_id))
+            await db.commit()
+
+
+async def test_last_page_has_no_cursor(client, project):
+    r = await client.get("/api/projects", params={"limit": 1})
+    assert [row["id"] for row in r.json()] == [str(project.id)]
+    assert "X-Next-Cursor" not in r.headers
+
+    r = await client.get("/api/audit-logs")
+    assert r.json() == []
+    assert "X-Next-Cursor" not in r.headers
+
+
+@pytest.mark.parametrize("path", ["/api/projects", "/api/audit-logs"])
+@pytest.mark.parametrize("cursor", [
+    "not-a-cursor",
+    encode_cursor(TIE.isoformat()),  # one value short
+    encode_cursor("yesterday", uuid.uuid4()),
+    encode_cursor(TIE.isoformat(), "not-a-uuid"),
+    encode_cursor(TIE.isoformat(), uuid.uuid4())[:-3],  # truncated
+])
+async def test_invalid_cursor_is_rejected(client, path, cursor):
+    r = await client.get(path, params={"cursor": cursor})
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Invalid cursor"
@@ -0,0 +1,80 @@
+"""
+Read routing between the primary and the read replica.
+
+Runs only when DATABASE_READ_URL is set.  It must name a separately
+migrated database rather than a streaming replica of DATABASE_URL: rows
+written through the API then exist only on the primary, so whether a read
+finds them shows which database served it.
+"""
+import os
+import uuid
+
+import httpx
+import pytest
+from sqlalchemy import delete
+
+pytestmark = [
+    pytest.mark.anyio,
+    pytest.mark.skipif(not os.getenv("DATABASE_READ_URL"), reason="DATABASE_READ_URL is not set"),
+]
+
+
+@pytest.fixture
+async def client(database):
+    import main
+    from database import read_engine
+
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://deployx.test") as client:
+            yield client
+    await read_engine.dispose()
+
+
+@pytest.fixture
+async def user(client):
+    """Register a user on the primary and return its auth headers; deleted afterwards."""
+    from database import AsyncSessionLocal
+    from models import User
+
+    tag = uuid.uuid4().hex[:12]
+    r = await client.post("/api/auth/register", json={
+        "email": f"reader-{tag}@example.com", "username": f"reader-{tag}", "password": "correct-horse",
+    })
+    assert r.status_code == 201, r.text
+    r = await client.post("/api/auth/token", data={"username": f"reader-{tag}", "password": "correct-horse"})
+    yield {"Authorization": f"Bearer {r.json()['access_token']}"}
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(User).where(User.username == f"reader-{tag}"))
+        await db.commit()
+
+
+async def test_reads_follow_the_cookie_and_fall_back_on_lag(client, user, monkeypatch):
+    from database import PRIMARY_COOKIE, replica_monitor
+
+    assert replica_monitor.healthy
+
+    r = await client.post("/api/projects", headers=user, json={"name": "routed"})
+    assert r.status_code == 201, r.text
+    assert PRIMARY_COOKIE in r.cookies
+    path = f"/api/projects/{r.json()['id']}"
+
+    # Within the read-after-write window the read goes to the primary
+    r = await client.get(path, headers=user)
+    assert r.status_code == 200
+
+    # Without the cookie it goes to the replica, which does not have the row
+    client.cookies.clear()
+    r = await client.get(path, headers=user)
+    assert r.status_code == 404
+
+    # A replica further behind than the limit is not used
+    monkeypatch.setattr(replica_monitor, "max_lag", -1.0)
+    assert not await replica_monitor.check()
+    r = await client.get(path, headers=user)
+    assert r.status_code == 200
+
+    monkeypatch.setattr(replica_monitor, "max_lag", 60.0)
+    assert await replica_monitor.check()
+    r = await client.get(path, headers=user)
+    assert r.status_code == 404
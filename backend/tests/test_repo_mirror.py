@@ -0,0 +1,94 @@
+import asyncio
+import os
+
+import pytest
+
+from conftest import Origin, git
+from repo_mirror import MirrorError, RepositoryMirrors
+
+pytestmark = pytest.mark.anyio
+
+
+def _mirrors(tmp_path, **kwargs) -> RepositoryMirrors:
+    return RepositoryMirrors(root=str(tmp_path / "mirrors"), allowed_schemes=("file",), **kwargs)
+
+
+async def test_fetch_picks_up_pushed_commits(tmp_path, origin):
+    first = origin.commit("first")
+    mirrors = _mirrors(tmp_path, refresh_interval=0)
+
+    assert await mirrors.resolve(origin.url, "main") == first
+    assert await mirrors.resolve(origin.url) == first
+    assert os.path.isdir(mirrors.path_for(origin.url))
+
+    second = origin.commit("second")
+    assert await mirrors.resolve(origin.url, "main") == second
+
+
+async def test_fresh_mirror_is_not_refetched_until_a_ref_is_missing(tmp_path, origin):
+    first = origin.commit("first")
+    mirrors = _mirrors(tmp_path, refresh_interval=3600)
+    assert await mirrors.resolve(origin.url, "main") == first
+
+    second = origin.commit("second")
+    # Within the refresh interval the branch resolves from the mirror as it is
+    assert await mirrors.resolve(origin.url, "main") == first
+    # An unknown commit forces one fetch, which also moves the branch
+    assert await mirrors.resolve(origin.url, second[:12]) == second
+    assert await mirrors.resolve(origin.url, "main") == second
+
+
+async def test_lease_yields_the_mirror(tmp_path, origin):
+    origin.commit("first")
+    mirrors = _mirrors(tmp_path)
+    path = await mirrors.fetch(origin.url)
+    async with mirrors.lease(origin.url) as leased:
+        assert leased == path
+        assert git("rev-parse", "--is-bare-repository", cwd=leased) == "true"
+
+
+async def test_unknown_ref_and_disallowed_scheme_are_rejected(tmp_path, origin):
+    origin.commit("first")
+    mirrors = _mirrors(tmp_path)
+    with pytest.raises(MirrorError, match="not found"):
+        await mirrors.resolve(origin.url, "no-such-branch")
+    with pytest.raises(MirrorError, match="scheme not allowed"):
+        await RepositoryMirrors(root=str(tmp_path / "other"), allowed_schemes=("https",)).fetch(origin.url)
+
+
+async def test_concurrent_fetches_share_one_git_run(tmp_path, origin, monkeypatch):
+    origin.commit("first")
+    mirrors = _mirrors(tmp_path, refresh_interval=3600)
+    runs = []
+    git_run = mirrors._git
+
+    async def counting_git(*args, cwd=None):
+        runs.append(args[0])
+        return await git_run(*args, cwd=cwd)
+
+    monkeypatch.setattr(mirrors, "_git", counting_git)
+
+    paths = await asyncio.gather(*(mirrors.fetch(origin.url) for _ in range(5)))
+    assert set(paths) == {mirrors.path_for(origin.url)}
+    assert runs == ["clone"]
+
+    runs.clear()
+    await asyncio.gather(*(mirrors.fetch(origin.url, force=True) for _ in range(5)))
+    assert runs == ["fetch"]
+
+
+async def test_eviction_skips_a_leased_mirror(tmp_path, origin):
+    origin.commit("first")
+    other = Origin(tmp_path / "other")
+    other.commit("other")
+    # Every mirror is over budget
+    mirrors = _mirrors(tmp_path, max_bytes=0)
+
+    async with mirrors.lease(origin.url) as leased:
+        # Fetching another mirror evicts what it can; the leased one stays
+        await mirrors.fetch(other.url)
+        assert os.path.isdir(leased)
+        assert git("rev-parse", "--is-bare-repository", cwd=leased) == "true"
+
+    assert await mirrors._evict(keep=mirrors.path_for(other.url)) == [leased]
+    assert not os.path.isdir(leased)
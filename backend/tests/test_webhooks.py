@@ -0,0 +1,116 @@
+import json
+import uuid
+
+import httpx
+import pytest
+from sqlalchemy import func, select, update
+
+from webhooks import WEBHOOK_MAX_BODY_BYTES, sign
+
+pytestmark = pytest.mark.anyio
+
+SECRET = "s" * 64
+
+
+@pytest.fixture
+async def client(database):
+    """A client for the app; the webhook endpoint needs none of the lifespan's background tasks."""
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://deployx.test") as client:
+        yield client
+
+
+@pytest.fixture
+async def hook(project):
+    """The project's push webhook URL, with a known secret."""
+    from database import AsyncSessionLocal
+    from models import Project
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(Project).where(Project.id == project.id).values(webhook_secret=SECRET))
+        await db.commit()
+    return f"/api/projects/{project.id}/webhooks/push"
+
+
+def _push(commit: str, delivery: str = None, secret: str = SECRET):
+    body = json.dumps({"ref": "refs/heads/main", "after": commit}).encode()
+    return dict(content=body, headers={
+        "X-Hub-Signature-256": sign(secret, body),
+        "X-GitHub-Event": "push",
+        "X-GitHub-Delivery": delivery or str(uuid.uuid4()),
+        "Content-Type": "application/json",
+    })
+
+
+async def _pending(project_id):
+    from database import AsyncSessionLocal
+    from models import Deployment, WebhookDelivery
+
+    async with AsyncSessionLocal() as db:
+        deployments = (
+            await db.execute(
+                select(Deployment.id, Deployment.commit_sha)
+                .where(Deployment.project_id == project_id, Deployment.status == "pending")
+            )
+        ).all()
+        deliveries = await db.scalar(
+            select(func.count()).select_from(WebhookDelivery).where(WebhookDelivery.project_id == project_id)
+        )
+    return deployments, deliveries
+
+
+async def test_redelivery_is_acknowledged_and_changes_nothing(client, project, hook):
+    r = await client.post(hook, **_push("a" * 40, delivery="delivery-1"))
+    assert r.status_code == 202, r.text
+    deployment_id = r.json()["deployment_id"]
+
+    # Same delivery id, even with another commit: the queued deployment keeps its target
+    r = await client.post(hook, **_push("b" * 40, delivery="delivery-1"))
+    assert r.status_code == 200
+    assert r.json()["status"] == "duplicate"
+
+    deployments, deliveries = await _pending(project.id)
+    assert [(str(d.id), d.commit_sha) for d in deployments] == [(deployment_id, "a" * 40)]
+    assert deliveries == 1
+
+
+async def test_pushes_coalesce_into_one_pending_deployment(client, project, hook):
+    ids = set()
+    for commit in ("a" * 40, "b" * 40, "c" * 40):
+        r = await client.post(hook, **_push(commit))
+        assert r.status_code == 202, r.text
+        ids.add(r.json()["deployment_id"])
+
+    deployments, deliveries = await _pending(project.id)
+    assert len(ids) == 1
+    assert [(str(d.id), d.commit_sha) for d in deployments] == [(ids.pop(), "c" * 40)]
+    assert deliveries == 3
+
+
+async def test_bad_signature_is_rejected(client, project, hook):
+    r = await client.post(hook, **_push("a" * 40, secret="not-the-secret"))
+    assert r.status_code == 401
+
+    push = _push("a" * 40)
+    del push["headers"]["X-Hub-Signature-256"]
+    r = await client.post(hook, **push)
+    assert r.status_code == 401
+
+    assert await _pending(project.id) == ([], 0)
+
+
+async def test_oversized_body_is_refused(client, project, hook):
+    body = b"x" * (WEBHOOK_MAX_BODY_BYTES + 1)
+    r = await client.post(hook, content=body, headers={"X-GitHub-Event": "push"})
+    assert r.status_code == 413
+
+    # Without a Content-Length the limit applies while reading
+    async def chunks():
+        for _ in range(WEBHOOK_MAX_BODY_BYTES // 65536 + 1):
+            yield b"x" * 65536
+
+    r = await client.post(hook, content=chunks(), headers={"X-GitHub-Event": "push"})
+    assert r.status_code == 413
+    assert await _pending(project.id) == ([], 0)
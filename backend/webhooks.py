@@ -0,0 +1,140 @@
+"""
+Push webhooks.
+
+``POST /api/projects/{id}/webhooks/push`` takes GitHub-style push events:
+the body is signed with the project's secret (``X-Hub-Signature-256``),
+``X-GitHub-Event`` names the event and ``X-GitHub-Delivery`` identifies the
+delivery.  The handler only does cheap work: an HMAC over the raw body, one
+primary-key lookup and one short transaction that records the delivery id
+and, unless it was seen before, queues the deployment.  Fetching and building happen later, in the
+deployment worker.
+
+A push queues its project's deployment WEBHOOK_COALESCE_SECONDS ahead;
+pushes arriving before it is claimed retarget the same row to their commit
+(see ``deploy_worker.queue_deployment``), so a burst of pushes builds once.
+Redelivered ids are acknowledged and ignored; ids are remembered for
+WEBHOOK_DELIVERY_RETENTION_HOURS.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import secrets
+from datetime import timedelta
+from typing import NamedTuple, Optional
+
+from fastapi import HTTPException, Request
+from sqlalchemy import delete, func, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from models import WebhookDelivery
+
+logger = logging.getLogger("deployx.webhooks")
+
+WEBHOOK_COALESCE_SECONDS = float(os.getenv("WEBHOOK_COALESCE_SECONDS", "10"))
+WEBHOOK_MAX_BODY_BYTES = int(os.getenv("WEBHOOK_MAX_BODY_BYTES", str(1024 * 1024)))
+WEBHOOK_DELIVERY_RETENTION_HOURS = float(os.getenv("WEBHOOK_DELIVERY_RETENTION_HOURS", "72"))
+WEBHOOK_MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("WEBHOOK_MAINTENANCE_INTERVAL_SECONDS", "3600"))
+
+_SHA = re.compile(r"^[0-9a-f]{40}$")
+_NULL_SHA = "0" * 40
+
+
+class PushEvent(NamedTuple):
+    branch: str
+    commit_sha: str
+
+
+def new_secret() -> str:
+    return secrets.token_hex(32)
+
+
+def sign(secret: str, body: bytes) -> str:
+    """The ``X-Hub-Signature-256`` value for *body*."""
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    return bool(signature) and hmac.compare_digest(sign(secret, body), signature)
+
+
+async def read_body(request: Request, limit: int = WEBHOOK_MAX_BODY_BYTES) -> bytes:
+    """The raw request body, refused with 413 past *limit* bytes."""
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > limit:
+        raise HTTPException(status_code=413, detail="Payload too large")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise HTTPException(status_code=413, detail="Payload too large")
+    return bytes(body)
+
+
+def parse_push(body: bytes) -> Optional[PushEvent]:
+    """Branch and head commit of a push; None for pushes that deploy nothing (tags, deletions)."""
+    try:
+        payload = json.loads(body)
+        ref, after = payload["ref"], payload["after"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid push payload")
+    if not isinstance(ref, str) or not isinstance(after, str) or not _SHA.match(after):
+        raise HTTPException(status_code=400, detail="Invalid push payload")
+    if not ref.startswith("refs/heads/") or after == _NULL_SHA or payload.get("deleted"):
+        return None
+    return PushEvent(branch=ref[len("refs/heads/"):], commit_sha=after)
+
+
+async def record_delivery(db: AsyncSession, project_id, delivery_id: str) -> bool:
+    """Remember a delivery in the caller's transaction; False if it was seen before.
+
+    A concurrent redelivery waits on the key until this transaction ends,
+    then sees it as seen before.
+    """
+    inserted = await db.scalar(
+        insert(WebhookDelivery)
+        .values(project_id=project_id, delivery_id=delivery_id)
+        .on_conflict_do_nothing()
+        .returning(WebhookDelivery.delivery_id)
+    )
+    return inserted is not None
+
+
+async def link_delivery(db: AsyncSession, project_id, delivery_id: str, deployment_id):
+    """Note the deployment a recorded delivery queued, in the caller's transaction."""
+    await db.execute(
+        update(WebhookDelivery)
+        .where(WebhookDelivery.project_id == project_id, WebhookDelivery.delivery_id == delivery_id)
+        .values(deployment_id=deployment_id)
+    )
+
+
+# ----------------------------------------------------------------------
+#  Delivery retention
+# ----------------------------------------------------------------------
+async def prune_deliveries(retention_hours: float = WEBHOOK_DELIVERY_RETENTION_HOURS) -> int:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            delete(WebhookDelivery).where(
+                WebhookDelivery.received_at < func.now() - timedelta(hours=retention_hours)
+            )
+        )
+        await db.commit()
+    return result.rowcount
+
+
+async def run_webhook_maintenance():
+    """Background loop: forget old delivery ids every interval."""
+    while True:
+        await asyncio.sleep(WEBHOOK_MAINTENANCE_INTERVAL_SECONDS)
+        try:
+            pruned = await prune_deliveries()
+            if pruned:
+                logger.info("Pruned %d webhook deliveries", pruned)
+        except Exception:
+            logger.exception("Webhook delivery pruning failed")
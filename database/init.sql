@@ -1,114 +1,14 @@
 -- ============================================================
--- DeployX Database Schema Initialization
+-- DeployX Database Initialization
 -- ============================================================
-
--- Enable UUID extension
+--
+-- Runs once, when the Postgres volume is first created.  The schema
+-- itself lives in Alembic migrations (backend/migrations/versions) and is
+-- applied by the backend container before its workers start:
+--
+--     alembic upgrade head
+--
+-- uuid-ossp is no longer required by the schema (it uses the built-in
+-- gen_random_uuid()); it is kept for existing installations whose column
+-- defaults still call uuid_generate_v4().
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
-
--- ----------------------------------------------------------
--- Users
--- ----------------------------------------------------------
-CREATE TABLE IF NOT EXISTS users (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    email VARCHAR(255) UNIQUE NOT NULL,
-    username VARCHAR(100) UNIQUE NOT NULL,
-    hashed_password VARCHAR(255) NOT NULL,
-    is_active BOOLEAN DEFAULT TRUE,
-    is_superuser BOOLEAN DEFAULT FALSE,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-);
-
--- ----------------------------------------------------------
--- Cloudflare tunnel configurations
--- ----------------------------------------------------------
-CREATE TABLE IF NOT EXISTS cloudflare_configs (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
-    api_token TEXT NOT NULL,
-    zone_id VARCHAR(255),
-    domain VARCHAR(255),
-    subdomain VARCHAR(255) NOT NULL,
-    tunnel_id VARCHAR(255),
-    tunnel_name VARCHAR(255),
-    tunnel_token TEXT,
-    is_active BOOLEAN DEFAULT TRUE,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    UNIQUE(user_id)
-);
-
--- ----------------------------------------------------------
--- Projects
--- ----------------------------------------------------------
-CREATE TABLE IF NOT EXISTS projects (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
-    name VARCHAR(255) NOT NULL,
-    description TEXT,
-    repository_url VARCHAR(500),
-    status VARCHAR(50) DEFAULT 'inactive',
-    last_deployed_at TIMESTAMP WITH TIME ZONE,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-);
-
--- ----------------------------------------------------------
--- Deployments
--- ----------------------------------------------------------
-CREATE TABLE IF NOT EXISTS deployments (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    project_id UUID REFERENCES projects(id) ON DELETE CASCADE,
-    user_id UUID REFERENCES users(id) ON DELETE SET NULL,
-    status VARCHAR(50) DEFAULT 'pending',
-    commit_sha VARCHAR(40),
-    log_output TEXT,
-    duration_seconds INTEGER,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    finished_at TIMESTAMP WITH TIME ZONE
-);
-
--- ----------------------------------------------------------
--- Audit logs
--- ----------------------------------------------------------
-CREATE TABLE IF NOT EXISTS audit_logs (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    user_id UUID REFERENCES users(id) ON DELETE SET NULL,
-    action VARCHAR(100) NOT NULL,
-    resource_type VARCHAR(100),
-    resource_id VARCHAR(255),
-    details JSONB,
-    ip_address VARCHAR(45),
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-);
-
--- ----------------------------------------------------------
--- Indexes
--- ----------------------------------------------------------
-CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
-CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
-CREATE INDEX IF NOT EXISTS idx_cloudflare_configs_user_id ON cloudflare_configs(user_id);
-CREATE INDEX IF NOT EXISTS idx_projects_user_id ON projects(user_id);
-CREATE INDEX IF NOT EXISTS idx_deployments_project_id ON deployments(project_id);
-CREATE INDEX IF NOT EXISTS idx_audit_logs_user_id ON audit_logs(user_id);
-CREATE INDEX IF NOT EXISTS idx_audit_logs_created_at ON audit_logs(created_at DESC);
-
--- ----------------------------------------------------------
--- Auto-update updated_at trigger
--- ----------------------------------------------------------
-CREATE OR REPLACE FUNCTION update_updated_at_column()
-RETURNS TRIGGER AS $$
-BEGIN
-    NEW.updated_at = CURRENT_TIMESTAMP;
-    RETURN NEW;
-END;
-$$ language 'plpgsql';
-
-CREATE TRIGGER update_users_updated_at BEFORE UPDATE ON users
-    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
-
-CREATE TRIGGER update_cloudflare_configs_updated_at BEFORE UPDATE ON cloudflare_configs
-    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
-
-CREATE TRIGGER update_projects_updated_at BEFORE UPDATE ON projects
-    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
@@ -31,6 +31,22 @@ interface ServiceInfo {
   port?: number;
 }
 
+/* ------------------------------------------------------------------ */
+/*  Helpers                                                            */
+/* ------------------------------------------------------------------ */
+// Tunnel setup runs as a background job; poll it until it settles.
+async function waitForProvisioning(token: string, jobId: string) {
+  for (;;) {
+    const res = await fetch(`/api/cloudflare/setup/${jobId}`, {
+      headers: { Authorization: `Bearer ${token}` },
+    });
+    const job = await res.json();
+    if (!res.ok) throw new Error(job.detail || "Tunnel setup failed");
+    if (job.status === "success" || job.status === "failed") return job;
+    await new Promise((r) => setTimeout(r, 1500));
+  }
+}
+
 /* ------------------------------------------------------------------ */
 /*  Component                                                          */
 /* ------------------------------------------------------------------ */
@@ -93,18 +109,23 @@ export default function DashboardPage() {
     setTunnelError("");
     setTunnelSuccess("");
     try {
-      const { data } = await setupTunnel(
+      const { data: started } = await setupTunnel(
         token,
         d.apiToken,
         d.domain,
         d.subdomain,
       );
+      const data = await waitForProvisioning(token, started.id);
+      if (data.status !== "success")
+        throw new Error(data.error || "Tunnel setup failed");
       setTunnelSuccess(`Tunnel live at ${data.public_url} — redirecting…`);
       setPublicUrl(data.public_url);
       setHasTunnel(true);
       setTimeout(() => (window.location.href = data.public_url), 3000);
     } catch (err: any) {
-      setTunnelError(err.response?.data?.detail || "Tunnel setup failed");
+      setTunnelError(
+        err.response?.data?.detail || err.message || "Tunnel setup failed",
+      );
     } finally {
       setTunnelLoading(false);
     }